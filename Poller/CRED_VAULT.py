@@ -0,0 +1,49 @@
+
+# CREDENTIAL VAULT FOR THE POLLER DAEMON ----------------------------------------
+# DECRYPTS THE SNMP SECRETS OF A DEVICE ONCE AND KEEPS THEM IN MEMORY UNTIL ITS
+# DATABASE ROW CHANGES (NEW USERNAME, NEW PASSWORD OR A RE-ENCRYPTION BY
+# manage.py rotate_fernet_key). THE SECRETS NEVER LEAVE THIS PROCESS.
+# -------------------------------------------------------------------------------
+
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+import threading
+
+
+class CRED_VAULT:
+    def __init__(self, KEYS):
+        # THE FIRST KEY IS THE CURRENT ONE, THE OTHERS ARE OLD KEYS STILL BEING ROTATED OUT
+        self.FERNET = MultiFernet([Fernet(KEY) for KEY in KEYS])
+        # DEVICE ID -> (FINGERPRINT OF THE ENCRYPTED ROW, (USERNAME, PASSWORD, AES PASSWORD))
+        self.CACHE = {}
+        self.LOCK = threading.Lock()
+        self.HITS = 0
+        self.MISSES = 0
+
+    # RETURNS (USERNAME, PASSWORD, AES PASSWORD) FOR A ROW OF DB_OIDS.DEVICES_LIST()
+    # OR None IF THE SECRETS CANNOT BE DECRYPTED WITH ANY KEY
+    def GET(self, ROW):
+        FINGERPRINT = (ROW['username'], bytes(ROW['snmp_password'] or b''), bytes(ROW['snmp_aes_passwd'] or b''))
+        with self.LOCK:
+            ENTRY = self.CACHE.get(ROW['id'])
+            if ENTRY is not None and ENTRY[0] == FINGERPRINT:
+                self.HITS += 1
+                return ENTRY[1]
+            self.MISSES += 1
+            try:
+                CREDS = (
+                    ROW['username'],
+                    self.FERNET.decrypt(FINGERPRINT[1]).decode(),
+                    self.FERNET.decrypt(FINGERPRINT[2]).decode(),
+                )
+            except (InvalidToken, UnicodeDecodeError):
+                self.CACHE.pop(ROW['id'], None)
+                return None
+            self.CACHE[ROW['id']] = (FINGERPRINT, CREDS)
+            return CREDS
+
+    # FORGET DEVICES THAT ARE NO LONGER POLLED (DELETED OR RETIRED)
+    def PRUNE(self, IDS):
+        IDS = set(IDS)
+        with self.LOCK:
+            for DEVICE_ID in [DEVICE_ID for DEVICE_ID in self.CACHE if DEVICE_ID not in IDS]:
+                del self.CACHE[DEVICE_ID]
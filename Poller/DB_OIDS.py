@@ -1,19 +1,132 @@
 import pymysql, subprocess, time
-from datetime import datetime
+from datetime import datetime, timezone
 
 #subprocess.run(['bash', '-c', 'clear'])
 
+# LOCAL SPOOL (SPOOL.SPOOL) FOR THE HISTORY ROWS THAT CANNOT BE INSERTED WHILE THE DATABASE IS DOWN
+# SET BY THE POLLER DAEMON; None (MANUAL RUN OF indexv3.py) = THOSE ROWS ARE LOST
+SPOOL = None
+
+# THE DATABASE DID NOT ANSWER (AS OPPOSED TO SOME INFORMATION MISSING IN ITS TABLES)
+DB_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+# SECONDS TO WAIT FOR A CONNECTION (OR AN ANSWER), AND BEFORE TRYING AGAIN ONCE THE DATABASE DID NOT
+# ANSWER (UNTIL THEN THE POLLS SPOOL RIGHT AWAY INSTEAD OF EACH WAITING FOR A TIMEOUT)
+CONNECT_TIMEOUT = 5
+QUERY_TIMEOUT = 30
+RETRY_AFTER = 30
+OFFLINE_UNTIL = 0.0
+
+# TIMES WRITTEN TO THE DATABASE ARE UTC WITHOUT A TIME ZONE (DJANGO READS THEM AS UTC, USE_TZ = True)
+def UTC_NOW():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+# OID MAP BY IP ADDRESS FROM THE LAST TIME THE DATABASE ANSWERED (USED WHILE IT IS DOWN)
+OID_CACHE = {}
+
+# HISTORY ROWS INSERTED PER TRANSACTION WHEN THE SPOOL IS REPLAYED
+REPLAY_BATCH = 1000
+
+# METRIC ID -> KEY OF OID_MASTER (OIDS TAKEN FROM THE monitoring_oidmap OF THE DEVICE MODEL)
+OID_KEYS = {
+    1: 'CPU',                                                                           # CPU
+    2: 'USED_MEM',                                                                      # USED MEM
+    3: 'FREE_MEM',                                                                      # FREE MEM
+    4: 'DESC',                                                                          # DESC
+    6: 'ADMIN',                                                                         # ADMIN
+    8: 'OPER',                                                                          # OPER
+    12: 'BW_IN',                                                                        # BW IN
+    13: 'BW_OUT',                                                                       # BW OUT
+    16: 'IP_ADD',                                                                       # IP ADD
+    17: 'SMASK',                                                                        # SUBNET MASK
+    18: 'HOSTNAME',                                                                     # HOSTNAME
+    19: 'PORT_N',                                                                       # PORT NAME
+    20: 'PORT_T',                                                                       # PORT TYPE
+}
+
+#METRIC ID
+METRIC_IDS = {
+    "CPU": 1,
+    "USED_MEM": 2,
+    "FREE_MEM": 3,
+    "DESC": 4,
+    "IP_ADD": 16,
+    "ADMIN": 6,
+    "SMASK": 17,
+    "OPER": 8,
+    "HOSTNAME": 18,
+    "PORT_N": 19,
+    "PORT_T": 20,
+    "BW_IN": 12,
+    "BW_OUT": 13, 
+    # NO FIXED ID: LOOKED UP BY NAME (CREATED BY MIGRATION 0014)
+    "ERR_IN": "(SELECT id FROM snmp_monitoring.monitoring_metric WHERE metric_name = 'Errors In')",
+    "ERR_OUT": "(SELECT id FROM snmp_monitoring.monitoring_metric WHERE metric_name = 'Errors Out')",
+
+    "TOTAL_PORT": 5,
+
+    "UP_TIME": 11
+}
+# METRIC_IDS WITH THE LOOKUPS BY NAME RESOLVED (FILLED BY OIDS.METRIC_ID)
+RESOLVED_METRICS = {}
+
+# HISTORY ROW: (VALUE, SLOT OF THE POLLING CYCLE, COLLECTION TIME, DEVICE ID, INTERFACE ID, METRIC ID)
+HISTORY_SQL = "INSERT INTO snmp_monitoring.monitoring_history (value, `timestamp`, collected_at, device_id, interface_id, metric_id) VALUES (%s, %s, %s, %s, %s, %s);"
+
+# INTERFACES OF A DEVICE: ROWS {id, ifIndex} (THE CALLERS MAP THEM TO {ifIndex: id}); RETIRED ROWS ARE LEFT OUT
+PORTS_SQL = "SELECT id, ifIndex FROM snmp_monitoring.monitoring_interface WHERE device_id = %s AND retired_at IS NULL;"
+
+# INTERFACE STATUS TRANSITION LOG: (INTERFACE ID, KIND "admin" / "oper", PREVIOUS, STATUS, TIMESTAMP)
+STATE_CHANGE_SQL = "INSERT INTO snmp_monitoring.monitoring_interfacestatechange (interface_id, kind, previous, status, changed_at) VALUES (%s, %s, %s, %s, %s);"
+
+
+# THE DATABASE IS UNREACHABLE: STOP CONNECTING FOR RETRY_AFTER SECONDS
+def GO_OFFLINE(ERROR):
+    global OFFLINE_UNTIL
+    if time.monotonic() >= OFFLINE_UNTIL:
+        print(" ERROR: Database unreachable (" + str(ERROR) + "), spooling the history for " + str(RETRY_AFTER) + " seconds")
+    OFFLINE_UNTIL = time.monotonic() + RETRY_AFTER
+
+
+# APPENDS A HISTORY ROW OF A DEVICE TO THE LOCAL SPOOL (SEE OIDS.REPLAY)
+# IDENTIFIER = ifIndex OF THE PORT (None = THE DEVICE ITSELF)
+# PREVIOUS = THE STATUS IT CHANGED FROM (THE REPLAY ALSO LOGS THE STATE CHANGE)
+# COLLECTED = WHEN THE DEVICE ANSWERED (TIMEDATE IS THE SLOT OF THE POLLING CYCLE)
+def SPOOL_ROW(IP, TIMEDATE, VAL, OID_TYPE, IDENTIFIER, PREVIOUS=None, COLLECTED=None):
+    RECORD = {"ts": str(TIMEDATE), "ip": IP, "ifindex": IDENTIFIER, "metric": OID_TYPE, "value": str(VAL)}
+    if PREVIOUS is not None:
+        RECORD["previous"] = str(PREVIOUS)
+    if COLLECTED is not None:
+        RECORD["collected"] = str(COLLECTED)
+    if SPOOL is None or not SPOOL.WRITE(RECORD):
+        print(" ERROR: Database unreachable, " + OID_TYPE + " sample of " + str(IP) + " lost", end="\r")
+
+
 class OIDS:
+    # ip = None: A CONNECTION ONLY (NO OID MAP), E.G. FOR THE HISTORY WRITERS OF THE POLLER
     def __init__(self, host_ip, user, passwd, db, ip):
         self.host = host_ip
         self.user = user
         self.passwd = passwd
         self.db = db
         self.ip = ip
-        self.conn = pymysql.connect(host=self.host, user=self.user, password=self.passwd, database=self.db, cursorclass=pymysql.cursors.DictCursor)
+        # conn IS None WHILE THE DATABASE IS DOWN
+        self.conn = None
+        if time.monotonic() >= OFFLINE_UNTIL:
+            try:
+                self.conn = pymysql.connect(host=self.host, user=self.user, password=self.passwd, database=self.db, cursorclass=pymysql.cursors.DictCursor, connect_timeout=CONNECT_TIMEOUT, read_timeout=QUERY_TIMEOUT, write_timeout=QUERY_TIMEOUT)
+            except DB_ERRORS as e:
+                GO_OFFLINE(e)
         
         self.OID_MASTER = {}
-        self.TIMEDATE = datetime.now()
+        self.TIMEDATE = UTC_NOW()
+
+        if self.conn is None:
+            # KEEP POLLING WITH THE OIDS OF THE LAST CYCLE
+            self.OID_MASTER = dict(OID_CACHE.get(self.ip, {}))
+            return
+        if self.ip is None:
+            return
 
 
         # GET ALL THE LIST OF OIDS FROM DATABASE OID TABLE
@@ -30,35 +143,10 @@ class OIDS:
 
                     
                 for OIDS in self.OID_LIST:
-                    
-                    if OIDS['metric_id'] == 1 :                                                 # CPU
-                        self.OID_MASTER['CPU'] = OIDS['oid']
-                    if OIDS['metric_id'] == 2:                                                # USED MEM
-                         self.OID_MASTER['USED_MEM'] = OIDS['oid']
-                    if OIDS['metric_id'] == 3:                                                # FREE MEM
-                         self.OID_MASTER['FREE_MEM'] = OIDS['oid']
-                    if OIDS['metric_id'] == 4:                                                # DESC
-                         self.OID_MASTER['DESC'] = OIDS['oid']
-                    if OIDS['metric_id'] == 6:                                                # ADMIN
-                         self.OID_MASTER['ADMIN'] = OIDS['oid']
-                    if OIDS['metric_id'] == 8:                                                # OPER
-                         self.OID_MASTER['OPER'] = OIDS['oid']
-                    if OIDS['metric_id'] == 12:                                               # BW IN
-                        self.OID_MASTER['BW_IN'] = OIDS['oid']
-                    if OIDS['metric_id'] == 13:                                               # BW OUT
-                        self.OID_MASTER['BW_OUT'] = OIDS['oid']
-                    if OIDS['metric_id'] == 16:                                               # IP ADD
-                        self.OID_MASTER['IP_ADD'] = OIDS['oid']
-                    if OIDS['metric_id'] == 17:                                               # SUBNET MASK
-                         self.OID_MASTER['SMASK'] = OIDS['oid']
-                    if OIDS['metric_id'] == 18:                                               # HOSTNAME
-                         self.OID_MASTER['HOSTNAME'] = OIDS['oid']
-                    if OIDS['metric_id'] == 19:                                               # PORT NAME
-                         self.OID_MASTER['PORT_N'] = OIDS['oid']
-                    if OIDS['metric_id'] == 20:                                               # PORT TYPE
-                         self.OID_MASTER['PORT_T'] = OIDS['oid']
-                    # else: 
-                    #     print("ERROR OID NOT VALID:" + OIDS['oid'])
+                    if OIDS['metric_id'] in OID_KEYS:
+                        self.OID_MASTER[OID_KEYS[OIDS['metric_id']]] = OIDS['oid']
+
+                OID_CACHE[self.ip] = dict(self.OID_MASTER)
 
         except:
              print(" No Device Detected!")       
@@ -67,75 +155,237 @@ class OIDS:
         # KEEP DATABASE OPEN!
 
 
-    # THIS FUNCTION IS RESPONSIBLE FOR INSERTING DATA INSIDE THE DATABASE HISTORY
-    def INSERT_NOW(self, VAL, OID_TYPE, IDENTIFIER,INT_TYPE="NULL"):
-      #  try:
+    # INSERTS THE HISTORY OF ONE POLL AT ONCE (ONE LOOKUP OF THE DEVICE AND ITS PORTS, ONE MULTI-ROW INSERT)
+    # ROWS = [(VAL, OID_TYPE, IDENTIFIER)] OF indexv3.HISTORY_ROWS (IDENTIFIER = PORT ifIndex, None = THE DEVICE ITSELF)
+    # TIMEDATE = WHEN THE DEVICE WAS POLLED
+    # CHANGES = {(OID_TYPE, IDENTIFIER): PREVIOUS VALUE} OF THE STATUS ROWS THAT ARE A TRANSITION
+    # (ALSO LOGGED IN monitoring_interfacestatechange, SEE STATUS_FILTER.py)
+    # COLLECTED = WHEN THE DEVICE ANSWERED, KEPT NEXT TO TIMEDATE WHEN THAT IS THE SLOT OF THE CYCLE
+    def INSERT_ROWS(self, ROWS, TIMEDATE=None, CHANGES=None, COLLECTED=None):
+        TIMEDATE = TIMEDATE or self.TIMEDATE
+        CHANGES = CHANGES or {}
+        if self.conn is None:
+            for VAL, OID_TYPE, IDENTIFIER in ROWS:
+                self.SPOOL_NOW(VAL, OID_TYPE, IDENTIFIER, TIMEDATE, CHANGES.get((OID_TYPE, IDENTIFIER)), COLLECTED)
+            return
+        try:
             with self.conn.cursor() as cursor:
-                #METRIC ID
-                OID_TYPE_TABLE = {
-                    "CPU": 1,
-                    "USED_MEM": 2,
-                    "FREE_MEM": 3,
-                    "DESC": 4,
-                    "IP_ADD": 16,
-                    "ADMIN": 6,
-                    "SMASK": 17,
-                    "OPER": 8,
-                    "HOSTNAME": 18,
-                    "PORT_N": 19,
-                    "PORT_T": 20,
-                    "BW_IN": 12,
-                    "BW_OUT": 13, 
-
-                    "TOTAL_PORT": 5,
-
-                    "UP_TIME": 11
-                }
-
-                # TRY 
-                try:
-                    sql = "SELECT model_id FROM snmp_monitoring.monitoring_device WHERE ip_address= '" + str(self.ip) + "';"
-                    cursor.execute(sql)
-                    self.INSERTER_MODEL_ID = cursor.fetchone()["model_id"]
-                    sql = "SELECT id FROM snmp_monitoring.monitoring_device WHERE model_id="+str(self.INSERTER_MODEL_ID)+";"
-                    cursor.execute(sql)
-                    self.INSERTER_DEVICE_ID = cursor.fetchone()["id"]
-                    
-                    if IDENTIFIER != 9999:
-                        sql = "SELECT id FROM snmp_monitoring.monitoring_interface WHERE device_id="+str(self.INSERTER_DEVICE_ID)+";"
-                        cursor.execute(sql)
-                        self.PORT_IDENTITY = cursor.fetchall()[IDENTIFIER]["id"]
-                        
-                        #print(self.PORT_IDENTITY)
-                        
-                        print(IDENTIFIER,"INTEFACE ID : " + str(self.PORT_IDENTITY) + " LOADED ...                                    ", end="\r")
-                    #    print(IDENTIFIER,"INTEFACE ID : " + str(self.PORT_IDENTITY) + " LOADED ...")
-                    else:
-                        self.PORT_IDENTITY = "NULL"
-                    
-                    sql = "INSERT INTO snmp_monitoring.monitoring_history (value, `timestamp`, device_id, interface_id, metric_id) VALUES('" + str(VAL) + "', '" + str(self.TIMEDATE) + "', "+ str(self.INSERTER_DEVICE_ID) + ", "+str(self.PORT_IDENTITY)+", "+ str(OID_TYPE_TABLE[OID_TYPE]) +");"
-                    stat = cursor.execute(sql)
+                cursor.execute("SELECT id FROM snmp_monitoring.monitoring_device WHERE ip_address = %s;", (self.ip,))
+                DEVICE = cursor.fetchone()
+                if DEVICE is None:
+                    print(" ERROR: Lack of information in Database Table", end="\r")
+                    return
+                PORTS = None
+                VALUES, STATE_CHANGES = [], []
+                for VAL, OID_TYPE, IDENTIFIER in ROWS:
+                    PORT_ID = None
+                    if IDENTIFIER is not None:
+                        # THE INTERFACE WITH THIS ifIndex (A PORT NOT SYNCED YET BY manage.py sync_interfaces IS SKIPPED)
+                        if PORTS is None:
+                            cursor.execute(PORTS_SQL, (DEVICE["id"],))
+                            PORTS = dict((ROW["ifIndex"], ROW["id"]) for ROW in cursor.fetchall())
+                        PORT_ID = PORTS.get(IDENTIFIER)
+                        if PORT_ID is None:
+                            continue
+                    METRIC_ID = self.METRIC_ID(cursor, OID_TYPE)
+                    if METRIC_ID is None:
+                        continue
+                    VALUES.append((str(VAL), str(TIMEDATE), None if COLLECTED is None else str(COLLECTED), DEVICE["id"], PORT_ID, METRIC_ID))
+                    if PORT_ID is not None and (OID_TYPE, IDENTIFIER) in CHANGES:
+                        STATE_CHANGES.append((PORT_ID, OID_TYPE.lower(), str(CHANGES[(OID_TYPE, IDENTIFIER)]), str(VAL), str(TIMEDATE)))
+                if VALUES:
+                    cursor.executemany(HISTORY_SQL, VALUES)
+                    if STATE_CHANGES:
+                        cursor.executemany(STATE_CHANGE_SQL, STATE_CHANGES)
                     self.conn.commit()
-                except:
-                     # IF THERE ARE SOME ERRORS OR LACK OF INFROMATION IN DATABASE
-                     # IT WONT INSERT SOME DATA IN DATABASE
+        except DB_ERRORS as e:
+            # NOTHING OF THIS POLL WAS COMMITTED: ALL OF IT GOES TO THE SPOOL
+            self.CLOSE()
+            GO_OFFLINE(e)
+            for VAL, OID_TYPE, IDENTIFIER in ROWS:
+                self.SPOOL_NOW(VAL, OID_TYPE, IDENTIFIER, TIMEDATE, CHANGES.get((OID_TYPE, IDENTIFIER)), COLLECTED)
+        except pymysql.err.Error as e:
+            print(" ERROR: Unable to insert the history of " + str(self.ip) + " (" + str(e) + ")")
+
+    # ID OF A METRIC (OID_TYPE AS IN METRIC_IDS), None IF THE DATABASE DOES NOT HAVE IT
+    def METRIC_ID(self, cursor, OID_TYPE):
+        if OID_TYPE not in METRIC_IDS:
+            return None
+        if OID_TYPE not in RESOLVED_METRICS:
+            cursor.execute("SELECT " + str(METRIC_IDS[OID_TYPE]) + " AS id;")
+            METRIC_ID = cursor.fetchone()["id"]
+            if METRIC_ID is None:
+                return None
+            RESOLVED_METRICS[OID_TYPE] = METRIC_ID
+        return RESOLVED_METRICS[OID_TYPE]
+
+    # OID MAPS OF EVERY DEVICE BEING POLLED, IN ONE QUERY: {IP ADDRESS: OID_MASTER} (ALSO KEPT IN OID_CACHE)
+    def OID_MAPS(self):
+        MAPS = {}
+        with self.conn.cursor() as cursor:
+            sql = "SELECT d.ip_address, m.oid, m.metric_id FROM snmp_monitoring.monitoring_device d JOIN snmp_monitoring.monitoring_oidmap m ON m.model_id = d.model_id WHERE d.retired_at IS NULL;"
+            cursor.execute(sql)
+            for ROW in cursor.fetchall():
+                if ROW['metric_id'] in OID_KEYS:
+                    MAPS.setdefault(ROW['ip_address'], {})[OID_KEYS[ROW['metric_id']]] = ROW['oid']
+        OID_CACHE.update(MAPS)
+        return MAPS
+
+    # APPENDS A HISTORY ROW TO THE LOCAL SPOOL (REPLAYED BY THE POLLER WHEN THE DATABASE IS BACK)
+    def SPOOL_NOW(self, VAL, OID_TYPE, IDENTIFIER, TIMEDATE=None, PREVIOUS=None, COLLECTED=None):
+        SPOOL_ROW(self.ip, TIMEDATE or self.TIMEDATE, VAL, OID_TYPE, IDENTIFIER, PREVIOUS, COLLECTED)
 
-                     print(" ERROR: Lack of information in Database Table", end="\r")
-                #print(stat)
+    # INSERTS SPOOLED HISTORY ROWS (ALREADY IN TIMESTAMP ORDER) IN BULK, REPLAY_BATCH ROWS PER TRANSACTION.
+    # DEVICES AND PORTS (BY ifIndex) ARE RESOLVED LIKE INSERT_ROWS DOES; ROWS OF DEVICES OR PORTS THAT ARE GONE ARE SKIPPED.
+    # RETURNS HOW MANY RECORDS ARE DONE WITH (THE REST MUST BE KEPT: THE DATABASE WENT DOWN AGAIN)
+    def REPLAY(self, RECORDS):
+        DONE = 0
+        DEVICES, PORTS = {}, {}
+        try:
+            with self.conn.cursor() as cursor:
+                while DONE < len(RECORDS):
+                    ROWS, STATE_CHANGES = [], []
+                    for RECORD in RECORDS[DONE:DONE + REPLAY_BATCH]:
+                        if RECORD["ip"] not in DEVICES:
+                            cursor.execute("SELECT id FROM snmp_monitoring.monitoring_device WHERE ip_address = %s AND retired_at IS NULL;", (RECORD["ip"],))
+                            ROW = cursor.fetchone()
+                            DEVICES[RECORD["ip"]] = ROW["id"] if ROW else None
+                        DEVICE_ID = DEVICES[RECORD["ip"]]
+                        METRIC_ID = self.METRIC_ID(cursor, RECORD["metric"])
+                        if DEVICE_ID is None or METRIC_ID is None:
+                            continue
+                        PORT_ID = None
+                        if RECORD["ifindex"] is not None:
+                            if DEVICE_ID not in PORTS:
+                                cursor.execute(PORTS_SQL, (DEVICE_ID,))
+                                PORTS[DEVICE_ID] = dict((ROW["ifIndex"], ROW["id"]) for ROW in cursor.fetchall())
+                            PORT_ID = PORTS[DEVICE_ID].get(RECORD["ifindex"])
+                            if PORT_ID is None:
+                                continue
+                        ROWS.append((RECORD["value"], RECORD["ts"], RECORD.get("collected"), DEVICE_ID, PORT_ID, METRIC_ID))
+                        if PORT_ID is not None and "previous" in RECORD:
+                            STATE_CHANGES.append((PORT_ID, RECORD["metric"].lower(), RECORD["previous"], RECORD["value"], RECORD["ts"]))
+                    if ROWS:
+                        sql = HISTORY_SQL
+                        try:
+                            cursor.executemany(sql, ROWS)
+                        except DB_ERRORS:
+                            raise
+                        except pymysql.err.Error:
+                            # A ROW THE DATABASE REJECTS MUST NOT HOLD BACK THE OTHERS: INSERT THIS BATCH ONE BY ONE
+                            self.conn.rollback()
+                            for ROW in ROWS:
+                                try:
+                                    cursor.execute(sql, ROW)
+                                except DB_ERRORS:
+                                    raise
+                                except pymysql.err.Error as e:
+                                    print(" ERROR: Spooled history row rejected " + str(ROW) + ": " + str(e))
+                        if STATE_CHANGES:
+                            try:
+                                cursor.executemany(STATE_CHANGE_SQL, STATE_CHANGES)
+                            except DB_ERRORS:
+                                raise
+                            except pymysql.err.Error as e:
+                                print(" ERROR: Spooled interface state changes rejected: " + str(e))
+                        self.conn.commit()
+                    DONE = min(DONE + REPLAY_BATCH, len(RECORDS))
+        except DB_ERRORS as e:
+            self.CLOSE()
+            GO_OFFLINE(e)
+        return DONE
+
+    # CLOSE THE DATABASE CONNECTION (IF THERE IS ONE)
+    def CLOSE(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except pymysql.err.Error:
+                pass
+            self.conn = None
 
-       # finally:
-           # print("DB STILL RUNNING")
-            #self.conn.close()
+    # THIS FUNCTION TELLS THE DASHBOARD (LIVE STREAM) THAT THIS DEVICE HAS NEW DATA
+    # BUMP = 0: THE CALLER BUMPS THE 'devices' VERSION ITSELF (THE POLLER DAEMON: ONCE PER CYCLE)
+    def RECORD_CHANGE(self, KIND="metrics", BUMP=1):
+        if self.conn is None:
+            return
+        try:
+            with self.conn.cursor() as cursor:
+                sql = "INSERT INTO snmp_monitoring.monitoring_devicechange (device_id, owner_id, kind, created_at) SELECT id, user_id, %s, %s FROM snmp_monitoring.monitoring_device WHERE ip_address = %s;"
+                cursor.execute(sql, (KIND, UTC_NOW(), self.ip))
+                self.conn.commit()
+        except:
+            print(" ERROR: Unable to record device change for " + str(self.ip), end="\r")
+            return
+        if BUMP:
+            self.BUMP_DEVICES()
+
+    # INVALIDATE THE API RESPONSE CACHE FOR DEVICE LISTS
+    def BUMP_DEVICES(self):
+        if self.conn is None:
+            return
+        try:
+            with self.conn.cursor() as cursor:
+                sql = "UPDATE snmp_monitoring.monitoring_dataversion SET version = version + 1, updated_at = %s WHERE name = 'devices';"
+                cursor.execute(sql, (UTC_NOW(),))
+                self.conn.commit()
+        except:
+            print(" ERROR: Unable to invalidate the device list cache", end="\r")
+
+    # THIS FUNCTION RECORDS THE REACHABILITY OF THE DEVICE (monitoring_devicestate)
+    # STATUS = "up" AFTER A SUCCESSFUL POLL, "down" WITH REASON "snmp_timeout" / "icmp_loss" WHEN IT FAILED
+    def RECORD_STATE(self, STATUS, REASON="", BUMP=1):
+        # THE DATABASE IS DOWN: THE NEXT POLL WILL RECORD THE STATE
+        if self.conn is None:
+            return
+        try:
+            with self.conn.cursor() as cursor:
+                NOW = UTC_NOW()
+                sql = "SELECT d.id, s.status FROM snmp_monitoring.monitoring_device d LEFT JOIN snmp_monitoring.monitoring_devicestate s ON s.device_id = d.id WHERE d.ip_address = %s;"
+                cursor.execute(sql, (self.ip,))
+                ROW = cursor.fetchone()
+                if ROW is None:
+                    return
+                UP = STATUS == "up"
+                if ROW["status"] is None:
+                    sql = "INSERT INTO snmp_monitoring.monitoring_devicestate (device_id, status, reason, last_success, last_checked, changed_at, failures) VALUES (%s, %s, %s, %s, %s, %s, %s);"
+                    cursor.execute(sql, (ROW["id"], STATUS, REASON, NOW if UP else None, NOW, NOW, 0 if UP else 1))
+                elif UP:
+                    sql = "UPDATE snmp_monitoring.monitoring_devicestate SET status = 'up', reason = '', last_success = %s, last_checked = %s, failures = 0, changed_at = IF(status = 'up', changed_at, %s) WHERE device_id = %s;"
+                    cursor.execute(sql, (NOW, NOW, NOW, ROW["id"]))
+                else:
+                    sql = "UPDATE snmp_monitoring.monitoring_devicestate SET status = 'down', reason = %s, last_checked = %s, failures = failures + 1, changed_at = IF(status = 'down', changed_at, %s) WHERE device_id = %s;"
+                    cursor.execute(sql, (REASON, NOW, NOW, ROW["id"]))
+                self.conn.commit()
+            # ONLY A TRANSITION NEEDS TO REACH THE DASHBOARD
+            if ROW["status"] != STATUS:
+                self.RECORD_CHANGE("metadata", BUMP)
+        except:
+            print(" ERROR: Unable to record device state for " + str(self.ip), end="\r")
 
     # DEVICE 
     def DEVICES_LIST(self):
         with self.conn.cursor() as cursor:
-            sql = "SELECT ip_address, snmp_aes_passwd, username, snmp_password FROM snmp_monitoring.monitoring_device;"        
+            # RETIRED (DELETED) DEVICES ARE NOT POLLED; THEIR DATA IS BEING PURGED BY THE WEB APP
+            # bulk_max_repetitions: GETBULK SIZE LEARNED FOR THE MODEL (SEE SAVE_BULK_SIZES)
+            sql = "SELECT d.id, d.ip_address, d.snmp_aes_passwd, d.username, d.snmp_password, d.model_id, m.bulk_max_repetitions FROM snmp_monitoring.monitoring_device d LEFT JOIN snmp_monitoring.monitoring_devicemodel m ON m.id = d.model_id WHERE d.retired_at IS NULL;"
             cursor.execute(sql)
 
             self.DEVICES_MOD = cursor.fetchall()
             return self.DEVICES_MOD
             #print(self.DEVICES_MOD)
+
+    # STORES THE GETBULK SIZE LEARNED FOR EACH DEVICE MODEL: SIZES = {MODEL ID: MAX REPETITIONS}
+    def SAVE_BULK_SIZES(self, SIZES):
+        if self.conn is None or not SIZES:
+            return
+        try:
+            with self.conn.cursor() as cursor:
+                sql = "UPDATE snmp_monitoring.monitoring_devicemodel SET bulk_max_repetitions = %s WHERE id = %s;"
+                cursor.executemany(sql, [(SIZE, MODEL_ID) for MODEL_ID, SIZE in SIZES.items()])
+                self.conn.commit()
+        except pymysql.err.Error as e:
+            print(" ERROR: Unable to save the GETBULK sizes (" + str(e) + ")")
         
 
 
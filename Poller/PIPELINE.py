@@ -0,0 +1,105 @@
+
+# PIPELINE STAGES FOR THE POLLER DAEMON -----------------------------------------
+# A STAGE IS A POOL OF WORKER THREADS READING A BOUNDED QUEUE. EACH ITEM IS
+# PASSED TO HANDLER(ITEM, LOCAL) (LOCAL = A DICT OWNED BY THE WORKER, E.G. FOR
+# ITS DATABASE CONNECTION); WHAT THE HANDLER RETURNS (IF NOT None) GOES TO THE
+# NEXT STAGE.
+#
+# BACKPRESSURE: PUTTING INTO A FULL QUEUE WAITS, SO A SLOW STAGE SLOWS THE ONE
+# BEFORE IT INSTEAD OF MEMORY GROWING. A STAGE WITH AN OVERFLOW FUNCTION NEVER
+# MAKES THE PREVIOUS STAGE WAIT: AN ITEM THAT DOES NOT FIT IS HANDED TO
+# OVERFLOW(ITEM) INSTEAD (E.G. WRITTEN TO THE LOCAL SPOOL).
+#
+# EVERY STAGE COUNTS ITS ITEMS, ITS BUSY TIME, THE DEEPEST ITS QUEUE GOT AND THE
+# TIME IT SPENT WAITING FOR THE NEXT STAGE (STATS()).
+# -------------------------------------------------------------------------------
+
+import queue, threading, time
+
+# TELLS A WORKER TO STOP
+STOP = object()
+
+
+class STAGE:
+    def __init__(self, NAME, HANDLER, WORKERS, QUEUE_SIZE, NEXT=None, OVERFLOW=None, FINISH=None):
+        self.NAME = NAME
+        self.HANDLER = HANDLER
+        self.WORKERS = WORKERS
+        self.QUEUE = queue.Queue(QUEUE_SIZE)
+        self.NEXT = NEXT
+        self.OVERFLOW = OVERFLOW
+        # FINISH(LOCAL) RUNS WHEN A WORKER STOPS (E.G. TO CLOSE ITS CONNECTION)
+        self.FINISH = FINISH
+        self.THREADS = []
+        self.LOCK = threading.Lock()
+        self.DONE = 0
+        self.FAILED = 0
+        self.SPILLED = 0
+        self.BUSY = 0.0
+        self.BLOCKED = 0.0
+        self.MAX_DEPTH = 0
+
+    def START(self):
+        for NUMBER in range(self.WORKERS):
+            THREAD = threading.Thread(target=self.RUN, name=self.NAME + "-" + str(NUMBER), daemon=True)
+            THREAD.start()
+            self.THREADS.append(THREAD)
+        return self
+
+    # QUEUES AN ITEM (WAITS WHILE THE QUEUE IS FULL, UNLESS THE STAGE HAS AN OVERFLOW)
+    def PUT(self, ITEM):
+        if self.OVERFLOW is None:
+            self.QUEUE.put(ITEM)
+        else:
+            try:
+                self.QUEUE.put_nowait(ITEM)
+            except queue.Full:
+                with self.LOCK:
+                    self.SPILLED += 1
+                self.OVERFLOW(ITEM)
+                return
+        DEPTH = self.QUEUE.qsize()
+        if DEPTH > self.MAX_DEPTH:
+            self.MAX_DEPTH = DEPTH
+
+    def RUN(self):
+        LOCAL = {}
+        try:
+            while True:
+                ITEM = self.QUEUE.get()
+                if ITEM is STOP:
+                    return
+                STARTED = time.monotonic()
+                try:
+                    RESULT = self.HANDLER(ITEM, LOCAL)
+                    FAILED = 0
+                except Exception as e:
+                    print("PIPELINE: " + self.NAME + " failed: " + type(e).__name__ + ": " + str(e))
+                    RESULT, FAILED = None, 1
+                FINISHED = time.monotonic()
+                if RESULT is not None and self.NEXT is not None:
+                    self.NEXT.PUT(RESULT)
+                with self.LOCK:
+                    self.DONE += 1
+                    self.FAILED += FAILED
+                    self.BUSY += FINISHED - STARTED
+                    self.BLOCKED += time.monotonic() - FINISHED
+        finally:
+            if self.FINISH is not None:
+                self.FINISH(LOCAL)
+
+    # WAITS FOR THE QUEUED ITEMS TO BE HANDLED AND STOPS THE WORKERS
+    def CLOSE(self):
+        for THREAD in self.THREADS:
+            self.QUEUE.put(STOP)
+        for THREAD in self.THREADS:
+            THREAD.join()
+        self.THREADS = []
+
+    # ONE LINE OF METRICS FOR THE LOG
+    def STATS(self):
+        return (self.NAME.upper() + ": " + str(self.DONE) + " DONE, " + str(self.FAILED) + " FAILED"
+                + (", " + str(self.SPILLED) + " SPILLED" if self.OVERFLOW is not None else "")
+                + " - " + str(self.WORKERS) + " WORKERS BUSY " + str(round(self.BUSY, 1)) + "s"
+                + (", WAITED " + str(round(self.BLOCKED, 1)) + "s FOR " + self.NEXT.NAME if self.NEXT is not None else "")
+                + " - QUEUE MAX " + str(self.MAX_DEPTH) + "/" + str(self.QUEUE.maxsize))
@@ -0,0 +1,156 @@
+
+# LOCAL SPOOL FOR THE HISTORY WRITER --------------------------------------------
+# WHEN THE DATABASE CANNOT BE REACHED (OR THE POLLER'S WRITERS ARE BEHIND), THE
+# HISTORY ROWS OF A POLL ARE APPENDED HERE (DB_OIDS.SPOOL_ROW) INSTEAD OF BEING
+# LOST. THE POLLER REPLAYS THE SPOOL INTO monitoring_history, IN TIMESTAMP ORDER,
+# AS SOON AS THE DATABASE ANSWERS AGAIN.
+#
+# FILE FORMAT: APPEND-ONLY RECORDS, EACH A 4-BYTE BIG-ENDIAN LENGTH FOLLOWED BY A
+# JSON OBJECT. A RECORD CUT SHORT BY A CRASH IS DETECTED BY ITS LENGTH AND
+# IGNORED. EVERY RECORD IS HANDED TO THE OS RIGHT AWAY (A CRASH OF THE POLLER
+# LOSES NOTHING); fsync IS BATCHED (EVERY FSYNC_EVERY RECORDS AND AT THE END OF A
+# CYCLE). THE FILE NEVER GROWS PAST MAX_BYTES: SAMPLES ARE DROPPED (AND COUNTED)
+# ONCE IT IS FULL.
+#
+# REPLAY: TAKE() MOVES THE SPOOL TO <PATH>.replay (NEW SAMPLES GO TO A FRESH
+# SPOOL) AND RETURNS ITS RECORDS; KEEP() WRITES BACK THE ONES THE DATABASE DID
+# NOT ACCEPT. A CRASH DURING A REPLAY CAN INSERT SOME SAMPLES TWICE, NEVER LOSE THEM.
+# -------------------------------------------------------------------------------
+
+import json, os, struct, threading
+
+# LENGTH PREFIX OF A RECORD
+HEADER = struct.Struct(">I")
+
+
+class SPOOL:
+    def __init__(self, PATH, MAX_BYTES=64*1024*1024, FSYNC_EVERY=500):
+        self.PATH = PATH
+        self.REPLAY_PATH = PATH + ".replay"
+        self.MAX_BYTES = MAX_BYTES
+        self.FSYNC_EVERY = FSYNC_EVERY
+        self.LOCK = threading.Lock()
+        self.FILE = None
+        self.SIZE = 0
+        # RECORDS WRITTEN SINCE THE LAST fsync
+        self.PENDING = 0
+        self.WRITTEN = 0
+        self.DROPPED = 0
+
+    # APPENDS ONE SAMPLE (A JSON-SERIALIZABLE DICT). RETURNS False WHEN THE SPOOL IS FULL
+    def WRITE(self, RECORD):
+        DATA = json.dumps(RECORD, separators=(",", ":")).encode()
+        with self.LOCK:
+            if self.FILE is None:
+                self.TRIM(self.PATH)
+                self.FILE = open(self.PATH, "ab")
+                self.SIZE = self.FILE.tell()
+            if self.SIZE + HEADER.size + len(DATA) > self.MAX_BYTES:
+                if not self.DROPPED:
+                    print("SPOOL: " + self.PATH + " IS FULL (" + str(self.MAX_BYTES) + " BYTES), NEW SAMPLES ARE DROPPED")
+                self.DROPPED += 1
+                return False
+            self.FILE.write(HEADER.pack(len(DATA)) + DATA)
+            self.FILE.flush()
+            self.SIZE += HEADER.size + len(DATA)
+            self.WRITTEN += 1
+            self.PENDING += 1
+            if self.PENDING >= self.FSYNC_EVERY:
+                self._SYNC()
+        return True
+
+    # fsync THE RECORDS WRITTEN SO FAR
+    def SYNC(self):
+        with self.LOCK:
+            self._SYNC()
+
+    def _SYNC(self):
+        if self.FILE is not None and self.PENDING:
+            os.fsync(self.FILE.fileno())
+            self.PENDING = 0
+
+    # RETURNS THE SPOOLED RECORDS (IN WRITE ORDER) AND STARTS A FRESH SPOOL FOR NEW SAMPLES
+    def TAKE(self):
+        with self.LOCK:
+            if self.FILE is not None:
+                self._SYNC()
+                self.FILE.close()
+                self.FILE = None
+            if os.path.exists(self.PATH):
+                if not os.path.exists(self.REPLAY_PATH):
+                    os.replace(self.PATH, self.REPLAY_PATH)
+                else:
+                    # RECORDS LEFT BY AN UNFINISHED REPLAY: ADD THE NEW ONES AFTER THEM
+                    self.TRIM(self.REPLAY_PATH)
+                    with open(self.PATH, "rb") as SOURCE, open(self.REPLAY_PATH, "ab") as TARGET:
+                        TARGET.write(SOURCE.read())
+                        TARGET.flush()
+                        os.fsync(TARGET.fileno())
+                    os.unlink(self.PATH)
+            self.WRITTEN = self.DROPPED = 0
+        return self.READ(self.REPLAY_PATH)
+
+    # WRITES BACK THE RECORDS THAT WERE NOT REPLAYED ([] = THE REPLAY IS COMPLETE)
+    def KEEP(self, RECORDS):
+        if not RECORDS:
+            if os.path.exists(self.REPLAY_PATH):
+                os.unlink(self.REPLAY_PATH)
+            return
+        TEMP = self.REPLAY_PATH + ".tmp"
+        with open(TEMP, "wb") as FILE:
+            for RECORD in RECORDS:
+                DATA = json.dumps(RECORD, separators=(",", ":")).encode()
+                FILE.write(HEADER.pack(len(DATA)) + DATA)
+            FILE.flush()
+            os.fsync(FILE.fileno())
+        os.replace(TEMP, self.REPLAY_PATH)
+
+    # READS EVERY COMPLETE RECORD OF A SPOOL FILE
+    @staticmethod
+    def READ(PATH):
+        RECORDS = []
+        try:
+            with open(PATH, "rb") as FILE:
+                DATA = FILE.read()
+        except FileNotFoundError:
+            return RECORDS
+        OFFSET = 0
+        while OFFSET + HEADER.size <= len(DATA):
+            (LENGTH,) = HEADER.unpack_from(DATA, OFFSET)
+            START = OFFSET + HEADER.size
+            if START + LENGTH > len(DATA):
+                break
+            try:
+                RECORDS.append(json.loads(DATA[START:START + LENGTH]))
+            except ValueError:
+                print("SPOOL: Skipping an unreadable record in " + PATH)
+            OFFSET = START + LENGTH
+        if OFFSET < len(DATA):
+            print("SPOOL: Ignoring " + str(len(DATA) - OFFSET) + " bytes of an incomplete record at the end of " + PATH)
+        return RECORDS
+
+    # CUTS AN INCOMPLETE RECORD (LEFT BY A CRASH) OFF THE END OF A SPOOL FILE
+    # SO THE RECORDS APPENDED AFTER IT CAN BE READ
+    @staticmethod
+    def TRIM(PATH):
+        try:
+            with open(PATH, "r+b") as FILE:
+                SIZE = os.fstat(FILE.fileno()).st_size
+                OFFSET = 0
+                while OFFSET + HEADER.size <= SIZE:
+                    FILE.seek(OFFSET)
+                    (LENGTH,) = HEADER.unpack(FILE.read(HEADER.size))
+                    if OFFSET + HEADER.size + LENGTH > SIZE:
+                        break
+                    OFFSET += HEADER.size + LENGTH
+                if OFFSET < SIZE:
+                    FILE.truncate(OFFSET)
+        except FileNotFoundError:
+            pass
+
+    def CLOSE(self):
+        with self.LOCK:
+            if self.FILE is not None:
+                self._SYNC()
+                self.FILE.close()
+                self.FILE = None
@@ -0,0 +1,74 @@
+
+# SKIP-UNCHANGED FILTER FOR THE INTERFACE STATUS HISTORY ------------------------
+# ADMIN AND OPER STATUS (ENUMERATIONS LIKE "up(1)") ALMOST NEVER CHANGE, SO THEIR
+# HISTORY ROWS ARE ONLY WRITTEN WHEN THE VALUE CHANGES, PLUS ONE KEEP-ALIVE ROW
+# EVERY KEEPALIVE SECONDS. THE STATUS AT A TIME T IS THE NEWEST ROW AT OR BEFORE T.
+#
+# THE BASELINE (LAST VALUE WRITTEN AND WHEN) IS KEPT BY IP ADDRESS AND PORT
+# ifIndex, WITH THE PORT NAME: AN ifIndex THAT NOW HOLDS ANOTHER PORT (THE
+# DEVICE RENUMBERED ITS INTERFACES) STARTS A NEW BASELINE INSTEAD OF LOGGING A CHANGE.
+# IT IS SAVED IN THE WARM-START STATE FILE, SO A RESTART DOES NOT REWRITE EVERY
+# STATUS (A CHANGE WHILE THE POLLER WAS STOPPED IS STILL DETECTED).
+#
+# FILTER() IS NOT THREAD SAFE: THE POLLER CALLS IT FROM ITS SINGLE NORMALIZE WORKER.
+# -------------------------------------------------------------------------------
+
+from datetime import timezone
+
+# HISTORY ROWS (OID_TYPE OF indexv3.HISTORY_ROWS) THAT ARE ONLY WRITTEN WHEN THEY CHANGE
+STATUS_TYPES = ("ADMIN", "OPER")
+
+
+class STATUS_FILTER:
+    def __init__(self, KEEPALIVE=24*60*60):
+        self.KEEPALIVE = KEEPALIVE
+        # {IP ADDRESS: {PORT ifIndex (STR): {"name": PORT NAME, OID_TYPE: [VALUE, EPOCH WRITTEN]}}}
+        self.BASELINE = {}
+        self.WRITTEN = 0
+        self.SKIPPED = 0
+
+    # ROWS = [(VAL, OID_TYPE, IDENTIFIER)] OF ONE POLL. RETURNS (THE ROWS TO WRITE,
+    # {(OID_TYPE, IDENTIFIER): PREVIOUS VALUE} FOR THE STATUS ROWS THAT ARE A CHANGE)
+    def FILTER(self, IP, TIMEDATE, ROWS):
+        # TIMEDATE IS UTC WITHOUT A TIME ZONE (DB_OIDS.UTC_NOW)
+        NOW = TIMEDATE.replace(tzinfo=timezone.utc).timestamp()
+        NAMES = dict((IDENTIFIER, str(VAL)) for VAL, OID_TYPE, IDENTIFIER in ROWS if OID_TYPE == "PORT_N")
+        OLD = self.BASELINE.get(IP, {})
+        NEW = {}
+        KEPT, CHANGES = [], {}
+        for ROW in ROWS:
+            VAL, OID_TYPE, IDENTIFIER = ROW
+            if OID_TYPE not in STATUS_TYPES:
+                KEPT.append(ROW)
+                continue
+            IFINDEX = str(IDENTIFIER)
+            PORT = NEW.get(IFINDEX)
+            if PORT is None:
+                PORT = OLD.get(IFINDEX)
+                if PORT is None or PORT.get("name") != NAMES.get(IDENTIFIER):
+                    PORT = {"name": NAMES.get(IDENTIFIER)}
+                NEW[IFINDEX] = PORT
+            LAST = PORT.get(OID_TYPE)
+            VAL = str(VAL)
+            if LAST is not None and LAST[0] == VAL and NOW - LAST[1] < self.KEEPALIVE:
+                self.SKIPPED += 1
+                continue
+            if LAST is not None and LAST[0] != VAL:
+                CHANGES[(OID_TYPE, IDENTIFIER)] = LAST[0]
+            PORT[OID_TYPE] = [VAL, NOW]
+            self.WRITTEN += 1
+            KEPT.append(ROW)
+        # PORTS THAT ARE GONE ARE DROPPED FROM THE BASELINE
+        self.BASELINE[IP] = NEW
+        return KEPT, CHANGES
+
+    # THE DEVICE IS NO LONGER POLLED
+    def FORGET(self, IP):
+        self.BASELINE.pop(IP, None)
+
+    # BASELINE OF THE GIVEN DEVICES, FOR THE WARM-START STATE FILE
+    def STATE(self, IPS):
+        return dict((IP, PORTS) for IP, PORTS in self.BASELINE.items() if IP in IPS)
+
+    def RESTORE(self, STATE):
+        self.BASELINE.update(STATE)
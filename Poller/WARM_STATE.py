@@ -0,0 +1,56 @@
+
+# WARM-START STATE FILE FOR THE POLLER DAEMON -----------------------------------
+# THE DAEMON CHECKPOINTS ITS PER-DEVICE STATE HERE AFTER EVERY CYCLE (AND WHEN IT
+# IS STOPPED) AND RELOADS IT AT STARTUP, SO A RESTART DOES NOT START EVERY
+# DEVICE COLD AGAIN.
+#
+# THE FILE IS ONE SNAPSHOT: A JSON DOCUMENT {SECTION: {DEVICE: STATE}}, ZLIB
+# COMPRESSED AND FERNET ENCRYPTED WITH THE POLLER KEY (IT HOLDS LOCALIZED SNMP
+# KEYS). IT IS WRITTEN TO A TEMPORARY FILE AND RENAMED, SO A CRASH WHILE SAVING
+# LEAVES THE PREVIOUS SNAPSHOT. A MISSING, CORRUPT OR UNREADABLE FILE MEANS A
+# COLD START, NEVER AN ERROR.
+# -------------------------------------------------------------------------------
+
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+import json, os, zlib
+
+# FORMAT VERSION (A FILE WITH ANOTHER VERSION IS IGNORED)
+VERSION = 1
+
+
+class WARM_STATE:
+    def __init__(self, PATH, KEYS):
+        self.PATH = PATH
+        # THE FIRST KEY ENCRYPTS, OLD KEYS STILL DECRYPT A FILE SAVED BEFORE A KEY ROTATION
+        self.FERNET = MultiFernet([Fernet(KEY) for KEY in KEYS])
+
+    # RETURNS {SECTION: {DEVICE: STATE}} ({} WHEN THERE IS NOTHING TO RESUME)
+    def LOAD(self):
+        try:
+            with open(self.PATH, "rb") as FILE:
+                DATA = json.loads(zlib.decompress(self.FERNET.decrypt(FILE.read())))
+        except FileNotFoundError:
+            return {}
+        except (OSError, InvalidToken, zlib.error, ValueError) as e:
+            print("WARM START: Ignoring unreadable state file " + self.PATH + " (" + type(e).__name__ + ")")
+            return {}
+        if DATA.get("version") != VERSION:
+            return {}
+        return DATA.get("sections", {})
+
+    # WRITES THE WHOLE SNAPSHOT (ATOMIC REPLACE, READABLE BY THE OWNER ONLY)
+    def SAVE(self, SECTIONS):
+        DATA = self.FERNET.encrypt(zlib.compress(json.dumps({"version": VERSION, "sections": SECTIONS}, separators=(",", ":")).encode()))
+        TEMP = self.PATH + ".tmp"
+        try:
+            with os.fdopen(os.open(TEMP, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as FILE:
+                FILE.write(DATA)
+                FILE.flush()
+                os.fsync(FILE.fileno())
+            os.replace(TEMP, self.PATH)
+        except OSError as e:
+            print("WARM START: Unable to save state file " + self.PATH + " (" + str(e) + ")")
+            try:
+                os.unlink(TEMP)
+            except OSError:
+                pass
@@ -11,31 +11,52 @@
 #   MODE: 
 #   0 - Insert and show only Basic System Desc (CPU, Memory, IP Address etc.)
 #   1 - Insert complete Data (Basic System Desc and Interfaces Status)
+#
+#   THE POLLER DAEMON (poller.py) DOES NOT RUN THIS SCRIPT: IT USES SNMP_GET_DAT AND
+#   HISTORY_ROWS IN-PROCESS (COLLECT -> NORMALIZE -> WRITE STAGES, ROWS INSERTED BY
+#   DB_OIDS.INSERT_ROWS), SO THE SNMP PASSWORDS NEVER APPEAR ON A COMMAND LINE.
+#   POLL_DEVICE() IS THE SAME FLOW FOR ONE DEVICE, FOR THIS SCRIPT.
+#   SNMP REQUESTS ARE MADE IN-PROCESS BY snmpv3.py (NO snmpwalk / indexv2.sh);
+#   COPY monitoring/snmpv3.py NEXT TO THESE SCRIPTS WHEN DEPLOYING TO /var/scripts.
 #------------------------------------------------------------------------------
 
 
 # LIBRARIES AND FRAMEWORKS
-import subprocess, time, sys
-from datetime import datetime
+import subprocess, time, sys, os
 import DB_OIDS as dbs
+try:
+    import snmpv3
+except ImportError:
+    # RUNNING FROM THE REPOSITORY: USE THE COPY IN THE DJANGO APP
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "monitoring"))
+    import snmpv3
 
 
 
-# 1ST COUNTER TO MEASURE TOTAL THE TOTAL TIME FOR PROCCESING
-t1 = time.perf_counter()
-
-
 
 class SNMP_GET_DAT:
-    def __init__(self, IP_ADD_, USERNAMES_, PASSWORD_, AES_PASS_, BASICS_ONLY=0):
+    # SLOT = SCHEDULED TIME OF THE POLLING CYCLE (GIVEN BY THE POLLER DAEMON, ALIGNED TO ITS INTERVAL)
+    def __init__(self, IP_ADD_, USERNAMES_, PASSWORD_, AES_PASS_, BASICS_ONLY=0, SESSION=None, OID_MASTER=None, SLOT=None):
        
-        
+        # 1ST COUNTER TO MEASURE TOTAL THE TOTAL TIME FOR PROCCESING
+        self.t1 = time.perf_counter()
+        # TIMESTAMP OF THE HISTORY ROWS OF THIS POLL: THE SLOT (THE SAME FOR EVERY DEVICE OF A CYCLE),
+        # OR THE COLLECTION TIME FOR A MANUAL RUN (BOTH IN UTC). COLLECTED = WHEN THE DEVICE ANSWERED (SET BY COLLECT)
+        self.SLOT = SLOT
+        self.TIMEDATE = SLOT or dbs.UTC_NOW()
+        self.COLLECTED = None
+
         self.priv_ip      =   IP_ADD_               
         self.priv_user    =   USERNAMES_
         self.priv_pass    =   PASSWORD_
         self.priv_passAES =   AES_PASS_
         self.BASIC_DAT    =   BASICS_ONLY
 
+        # SNMPv3 SESSION (ENGINE ID, BOOTS / TIME AND LOCALIZED KEYS), SHARED ACROSS POLLS OF THIS DEVICE
+        self.SESSION      =   SESSION or snmpv3.session(self.priv_ip, self.priv_user, self.priv_pass, self.priv_passAES)
+        # WALK RESULTS OF THIS POLL BY OID (THE PORT NAMES AND PORT TYPE SHARE ONE OID)
+        self.WALKS        =   {}
+
         
 
 
@@ -71,12 +92,20 @@ class SNMP_GET_DAT:
             "1.3.6.1.2.1.2.2.1.7 ",                #ADMIN STATS            9
             "1.3.6.1.2.1.2.2.1.8 ",                #OPER STATS             10
             "1.3.6.1.2.1.2.2.1.10",                #BW IN                  11
-            "1.3.6.1.2.1.2.2.1.16"                 #BW OUT                 12
+            "1.3.6.1.2.1.2.2.1.16",                #BW OUT                 12
+            "1.3.6.1.2.1.2.2.1.14",                #ERRORS IN              13
+            "1.3.6.1.2.1.2.2.1.20",                #ERRORS OUT             14
+
+            "1.3.6.1.2.1.1.3.0"                    #SYSTEM UP TIME         15 (sysUpTime, NOT IN THE OID MAP)
                     
         ]
 
-        # CONNECT TO DATABASE
-        self.db_connect = dbs.OIDS("192.168.33.1", "lemon", "frqAIRNAV", "snmp_monitoring", self.priv_ip)
+        # OID MAP: GIVEN BY THE POLLER DAEMON (NO DATABASE ACCESS WHILE COLLECTING) OR READ FROM THE DATABASE
+        self.db_connect = None
+        if OID_MASTER is None:
+            # CONNECT TO DATABASE
+            self.db_connect = dbs.OIDS("192.168.33.1", "lemon", "frqAIRNAV", "snmp_monitoring", self.priv_ip)
+            OID_MASTER = self.db_connect.OID_MASTER
         try:
             # OIDS LIST 
             print(" OID ARE AVAILABLE AT " + self.priv_ip + " \n" )
@@ -102,8 +131,9 @@ class SNMP_GET_DAT:
             OID_LIST_DC = ["CPU", "USED_MEM", "FREE_MEM", "IP_ADD", "SMASK", "HOSTNAME", "DESC", "PORT_N", "PORT_T", "ADMIN", "OPER", "BW_IN", "BW_OUT"]
 
             # REPLACING THE DEFAULT OID FROM  DATABASE OID TABLES 
-            for x in range(len(self.D_ARR)):
-                res = str(self.db_connect.OID_MASTER[str(OID_LIST_DC[x])])
+            # (ERRORS IN / OUT HAVE NO FIXED METRIC ID, THEY ALWAYS USE THE DEFAULT OIDS)
+            for x in range(len(OID_LIST_DC)):
+                res = str(OID_MASTER[str(OID_LIST_DC[x])])
                 self.D_ARR[x] = res
         
 
@@ -112,11 +142,22 @@ class SNMP_GET_DAT:
             print("\nWARNING: Some OIDs are missing at IP: "+str(self.priv_ip)+". Please complete them for the device.\n")        
             
 
-        # GET THE TOTAL PORT FROM INDEXV2.SH
-        self.TOTAL_PORTS =    int(self.BASH_Proccessor(1, self.priv_user, self.priv_pass, self.priv_passAES, self.priv_ip, self.D_ARR[7]).decode('utf-8'))   
+        # COLLECT ALL THE DATA; DO NOT LEAK THE DATABASE CONNECTION WHEN THE DEVICE FAILS
+        try:
+            self.COLLECT()
+        except Exception:
+            if self.db_connect is not None:
+                self.db_connect.CLOSE()
+            raise
+
+    # FETCH THE BASIC SYSTEM DESC AND THE INTERFACES STATUS
+    def COLLECT(self):
+        # THE PORTS ARE THE ifIndexes THAT HAVE A PORT NAME (IN ifIndex ORDER); TOTAL PORT = HOW MANY
+        self.PORT_INDEXES =   list(self.SNMP_TABLE(self.D_ARR[7]))
+        self.TOTAL_PORTS =    len(self.PORT_INDEXES)
         
         # IDENTIFIER FOR DICTIONARY
-        self.dat_int_pointer_name = ["INT_NAME", "INT_TYPE", "INT_ADMIN", "INT_OPER", "INT_BW_IN", "INT_BW_OUT"]
+        self.dat_int_pointer_name = ["INT_NAME", "INT_TYPE", "INT_ADMIN", "INT_OPER", "INT_BW_IN", "INT_BW_OUT", "INT_ERR_IN", "INT_ERR_OUT"]
         
 
         # EMPTY ARRAY (THIS IS WHERE WE STORE ALL THE BASIC SYSTEM DESC AND INTERFACE STATUS)
@@ -124,17 +165,22 @@ class SNMP_GET_DAT:
 
         # GET THE BASIC SYSTEM DESC BY CALLING THIS FUNCTION.
         self.SIMPLE_DESC()
+
+        # sysUpTime IS IN HUNDREDTHS OF A SECOND: STORED IN SECONDS (None IF THE AGENT DOES NOT GIVE IT)
+        UPTIME = self.SNMP_WALK(self.D_ARR[15])
+        UPTIME = int(UPTIME[0]) // 100 if UPTIME and UPTIME[0].isdigit() else None
         
         # DICTIONARY FOR THE DATA GATHERED
         self.dat = {
-            "CPU": int(self.SYSDESC_ARR[0]),                            # CPU
-            "USED_MEM": int(self.SYSDESC_ARR[1]),                       # USED MEMORY
-            "FREE_MEM": int(self.SYSDESC_ARR[2]),                       # FREE MEMORY
+            "CPU": int(self.SYSDESC_ARR[0].split("\n")[0]),              # CPU (FIRST CPU)
+            "USED_MEM": int(self.SYSDESC_ARR[1].split("\n")[0]),         # USED MEMORY
+            "FREE_MEM": int(self.SYSDESC_ARR[2].split("\n")[0]),         # FREE MEMORY
             "IP_ADD": str(self.SYSDESC_ARR[3]).replace("\n"," "),        # IP ADDRESS
             "MASK": str(self.SYSDESC_ARR[4]).replace("\n"," "),          # SUBNET MASK
             "HOST": str(self.SYSDESC_ARR[5]).replace("\n"," "),          # HOSTNAME
             "DESC": str(self.SYSDESC_ARR[6]).replace("\n",""),          # COMPLETE DESCRIPTION
-            "TOTAL_PORT": int(self.TOTAL_PORTS)                         # TOTAL NUMBER OF INTERFACE
+            "TOTAL_PORT": int(self.TOTAL_PORTS),                        # TOTAL NUMBER OF INTERFACE
+            "UP_TIME": UPTIME                                           # SECONDS SINCE THE AGENT STARTED
             #"TIMESTAMP": str(datetime.now())
         }, {            
             "INT_NAME": [                                               # NAME OF INTERFACE
@@ -148,127 +194,186 @@ class SNMP_GET_DAT:
             "INT_BW_IN": [                                              # BANDWIDTH IN
             ],
             "INT_BW_OUT": [                                             # BANDWIDTH OUT
+            ],
+            "INT_ERR_IN": [                                             # ERRORS IN (COUNTER)
+            ],
+            "INT_ERR_OUT": [                                            # ERRORS OUT (COUNTER)
+            ],
+            "INT_INDEX": [                                              # ifIndex OF EACH PORT ABOVE
             ]
         }
     
         # SETTER IF WE ONLY WANT TO SHOW BASIC SYSTEM DESC OR (SYSTEM DESC WITH INTERFACES STATUS)
         if self.BASIC_DAT != 0:                                         
-           self.PORT_FUNC(self.TOTAL_PORTS)
+           self.PORT_FUNC()
         
        #/var/scripts/indexv2.sh 0 ADMIN '!frqAIRNAV' '!frqAIRNAV' 192.168.34.1 .1.3.6.1.2.1.1.1.0
 
+        # THE DEVICE HAS ANSWERED EVERYTHING
+        self.COLLECTED = dbs.UTC_NOW()
+        if self.SLOT is None:
+            self.TIMEDATE = self.COLLECTED
+
         # 2ND COUNTER TO MEASURE TOTAL THE TOTAL TIME FOR PROCCESING
         t2 = time.perf_counter()
         print(str(self.SYSDESC_ARR[5]).replace("\n","") + ": Total Fetch Data 100 % ")
-        print(str(self.SYSDESC_ARR[5]).replace("\n","") + ": Total time to complete: " + str(t2 - t1) + " seconds")
-
-    # A FUNCTION WHICH CALLS THE BASH SCRIPT    
-    def BASH_Proccessor(self, MODE_INT, USER_INT, PASS_INT, AES_PASS_INT, IP_ADD_INT, POS, INDEXED = ''):
-        SCRIPT_INT  = str('/var/scripts/indexv2.sh '+ str(MODE_INT) + ' ' + USER_INT + ' ' + PASS_INT + ' ' + AES_PASS_INT + ' ' + IP_ADD_INT) 
-        return subprocess.check_output(['bash', '-c', SCRIPT_INT + ' ' + POS + ' ' + INDEXED + ' &'])
-
-    # FUNCTION - FETCH TO DATA FROM INTERFACES
-    def PORT_FUNC(self, TOTAL_P):
-        for PORTS_POS in range(int(TOTAL_P)):
-            for HANDLER in range(7, 13):
-                PORT_ = str(self.BASH_Proccessor(1, self.priv_user, self.priv_pass, self.priv_passAES, self.priv_ip, str(self.D_ARR[HANDLER]), str(PORTS_POS)).decode('utf-8')).replace("\n", "")
-                self.dat[1][self.dat_int_pointer_name[HANDLER-7]].append(PORT_)
-            print(str(self.SYSDESC_ARR[5]).replace("\n","")  +  ": Total Fetch Data " + str( int(float(float(PORTS_POS) / float(self.TOTAL_PORTS)) * 100) ) + " " + str() + " %                                      ", end="\r")
+        print(str(self.SYSDESC_ARR[5]).replace("\n","") + ": Total time to complete: " + str(t2 - self.t1) + " seconds")
+        # GETBULK ROUND TRIPS OF EACH TABLE (THE SESSION TUNES THE ROWS PER REQUEST FOR THIS DEVICE)
+        self.ROUND_TRIPS = {OID: self.SESSION.table_round_trips.get(OID, 0) for OID in self.WALKS}
+        print(str(self.SYSDESC_ARR[5]).replace("\n","") + ": Round trips per table (max-repetitions " + str(self.SESSION.max_repetitions) + "): "
+              + ", ".join(OID + " " + str(TRIPS) for OID, TRIPS in self.ROUND_TRIPS.items()))
+
+    # WALK ONE OID (GETBULK) AND RETURN ITS VALUES AS TEXT, IN ifIndex ORDER
+    # RAISES snmpv3.SnmpTimeout / snmpv3.SnmpError WHEN THE DEVICE DOES NOT ANSWER
+    def SNMP_WALK(self, OID, LABELS=None):
+        OID = snmpv3.normalize_oid(OID)
+        if OID not in self.WALKS:
+            self.WALKS[OID] = self.SESSION.walk(OID)
+        return [snmpv3.text(VALUE, LABELS) for NAME, VALUE in self.WALKS[OID]]
+
+    # WALK ONE TABLE COLUMN AND RETURN {ifIndex: VALUE AS TEXT}; THE ifIndex IS THE LAST ARC OF EACH OID
+    def SNMP_TABLE(self, OID, LABELS=None):
+        OID = snmpv3.normalize_oid(OID)
+        if OID not in self.WALKS:
+            self.WALKS[OID] = self.SESSION.walk(OID)
+        return dict((int(NAME.rsplit(".", 1)[-1]), snmpv3.text(VALUE, LABELS)) for NAME, VALUE in self.WALKS[OID])
+
+    # FUNCTION - FETCH TO DATA FROM INTERFACES (ONE WALK PER COLUMN FOR ALL THE PORTS)
+    def PORT_FUNC(self):
+        self.dat[1]["INT_INDEX"].extend(self.PORT_INDEXES)
+        for HANDLER in range(7, 15):
+            COLUMN = self.SNMP_TABLE(self.D_ARR[HANDLER], snmpv3.IF_STATUS if HANDLER in (9, 10) else None)
+            # EACH VALUE GOES TO THE PORT OF ITS OWN ifIndex: A ROW MISSING FROM A COLUMN IS None FOR THAT PORT ONLY
+            self.dat[1][self.dat_int_pointer_name[HANDLER-7]].extend(COLUMN.get(IFINDEX) for IFINDEX in self.PORT_INDEXES)
+            print(str(self.SYSDESC_ARR[5]).replace("\n","")  +  ": Total Fetch Data " + str( int(float(HANDLER - 7) / 8.0 * 100) ) + " " + str() + " %                                      ", end="\r")
             
-    #  GETTING FOF THE BASIC SYSTEM DESC. FROM BASH SCRIPT
+    #  GETTING FOF THE BASIC SYSTEM DESC. (ONE LINE PER VALUE)
     def SIMPLE_DESC(self):
         for i in range(7):
-            self.SYSDESC_ARR.append(self.BASH_Proccessor(0, self.priv_user, self.priv_pass, self.priv_passAES, self.priv_ip, self.D_ARR[i]).decode('utf-8'))
+            self.SYSDESC_ARR.append("\n".join(self.SNMP_WALK(self.D_ARR[i])))
       
 
 #print(hello.OID_MASTER['DESC'])
 
 
-# CHECK IF THERE IS AN ARGUMENTS
-if len(sys.argv) > 1:
-        CMD_IP          = sys.argv[1]
-        CMD_USER        = sys.argv[2]
-        CMD_PASS        = sys.argv[3]
-        CMD_PASS_AES    = sys.argv[4]
-        CMD_MODES       = int(sys.argv[5])         
-          #SNMP_GET_DAT("10.11.1.1",  "admin", "frqAIRNAV", "frqAIRNAV")
-        CALLER = SNMP_GET_DAT(CMD_IP, CMD_USER,CMD_PASS, CMD_PASS_AES, CMD_MODES)
-        
-        TIME_DELIVER = str(datetime.now().time())[:5]
-
-        
-
-        DEV_OWNER = str(CALLER.dat[0]["HOST"])
-        print("\n\n")
-
-        print(DEV_OWNER + " - Connection:")
-        print(DEV_OWNER + " - UP TIME:         " + str(TIME_DELIVER))
+# POLL ONE DEVICE AND INSERT ITS DATA. RETURNS True ON SUCCESS.
+# SESSION = AN snmpv3.Session TO USE INSTEAD OF THE SHARED ONE (OPTIONAL)
+def POLL_DEVICE(IP, USER, PASS, AES_PASS, MODE=1, SESSION=None):
+    OWN_SESSION = SESSION is None
+    if OWN_SESSION:
+        # SHARED SESSION: ENGINE DISCOVERY AND KEY LOCALIZATION ONLY HAPPEN ON THE FIRST POLL
+        SESSION = snmpv3.session(IP, USER, PASS, AES_PASS)
+    try:
+        CALLER = SNMP_GET_DAT(IP, USER, PASS, AES_PASS, MODE, SESSION)
+    except snmpv3.SnmpError as e:
+        # NO (OR REJECTED) SNMP ANSWER: RECORD THE DEVICE AS DOWN INSTEAD OF WAITING FOR ITS HISTORY TO GO STALE
+        print(" ERROR: No SNMP answer from " + IP + " (" + str(e) + ")")
+        DB_DOWN = dbs.OIDS("192.168.33.1", "lemon", "frqAIRNAV", "snmp_monitoring", IP)
+        DB_DOWN.RECORD_STATE("down", "snmp_timeout")
+        DB_DOWN.CLOSE()
+        return False
+    except Exception as e:
+        # THE DEVICE ANSWERED BUT SOME DATA IS MISSING (E.G. AN OID THE MODEL DOES NOT SUPPORT)
+        print(" ERROR: Incomplete SNMP data from " + IP + " (" + str(e) + ")")
+        return False
+    finally:
+        # RELEASE THE SOCKET; THE SESSION STATE IS KEPT FOR THE NEXT CYCLE
+        if OWN_SESSION:
+            SESSION.close()
+    try:
+        SHOW(CALLER, IP, USER, PASS, AES_PASS)
+        # THE WHOLE POLL IN ONE MULTI-ROW INSERT
+        CALLER.db_connect.INSERT_ROWS(HISTORY_ROWS(CALLER, MODE), CALLER.TIMEDATE, COLLECTED=CALLER.COLLECTED)
+
+        # NOTIFY THE LIVE DASHBOARD STREAM THAT THIS DEVICE HAS NEW DATA
+        CALLER.db_connect.RECORD_CHANGE("metrics")
+        CALLER.db_connect.RECORD_STATE("up")
+        return True
+    finally:
+        # THE DATABASE CONNECTION IS OPENED PER POLL
+        CALLER.db_connect.CLOSE()
+
+
+# PRINT THE BASIC SYSTEM DESC OF A POLLED DEVICE
+def SHOW(CALLER, IP, USER, PASS, AES_PASS):
+    DEV_OWNER = str(CALLER.dat[0]["HOST"])
+    print("\n\n")
+
+    print(DEV_OWNER + " - Connection:")
+    print(DEV_OWNER + " - UP TIME:         " + UPTIME_TEXT(CALLER.dat[0]["UP_TIME"]))
+
+    print(DEV_OWNER + " - IP:              " + IP)
+    print(DEV_OWNER + " - USERNAME:        " + USER)
+    print(DEV_OWNER + " - PASSWORD:        " + len(PASS)*"*")
+    print(DEV_OWNER + " - AES PASSWORD:    " + len(AES_PASS)*"*")
+
+  #  print("---------------------------------------------------------------------------")
+    print(DEV_OWNER + " - CPU Usage:       " + str(CALLER.dat[0]["CPU"]))
+    print(DEV_OWNER + " - Uses Memory:     " + str(CALLER.dat[0]["USED_MEM"]))
+    print(DEV_OWNER + " - Free Memory:     " + str(CALLER.dat[0]["FREE_MEM"]))
+    print(DEV_OWNER + " - IP Address:      " + str(CALLER.dat[0]["IP_ADD"]))
+    print(DEV_OWNER + " - Subnet Mask:     " + str(CALLER.dat[0]["MASK"]))
+    print(DEV_OWNER + " - Hostname:        " + str(CALLER.dat[0]["HOST"]))
+    print(DEV_OWNER + " - Total Interface: " + str(CALLER.dat[0]["TOTAL_PORT"]))
+    print(DEV_OWNER + " - Description:     " + str(CALLER.dat[0]["DESC"]))
+    print("\n\n")
+
+
+# UP TIME IN SECONDS AS TEXT, E.G. "10d 4h 15m"
+def UPTIME_TEXT(SECONDS):
+    if SECONDS is None:
+        return "N/A"
+    return str(SECONDS // 86400) + "d " + str(SECONDS % 86400 // 3600) + "h " + str(SECONDS % 3600 // 60) + "m"
+
+
+# HISTORY ROWS OF A POLL FOR OIDS.INSERT_ROWS: [(VALUE, OID_TYPE, IDENTIFIER)]
+# IDENTIFIER = ifIndex OF THE PORT (None = THE DEVICE ITSELF)
+def HISTORY_ROWS(CALLER, MODE=1):
+    ROWS = [
+        (CALLER.dat[0]["CPU"], "CPU", None),
+        (CALLER.dat[0]["USED_MEM"], "USED_MEM", None),
+        (CALLER.dat[0]["FREE_MEM"], "FREE_MEM", None),
+        (CALLER.dat[0]["IP_ADD"], "IP_ADD", None),
+        (CALLER.dat[0]["MASK"], "SMASK", None),
+        (CALLER.dat[0]["HOST"], "HOSTNAME", None),
+        (str(CALLER.dat[0]["TOTAL_PORT"]), "TOTAL_PORT", None),
+        (CALLER.dat[0]["DESC"], "DESC", None),
+    ]
+    if CALLER.dat[0]["UP_TIME"] is not None:
+        ROWS.append((CALLER.dat[0]["UP_TIME"], "UP_TIME", None))
+    # INTERFACES DATA (A VALUE THE DEVICE DID NOT GIVE FOR A PORT IS LEFT OUT)
+    if MODE == 1:
+        for x in range(CALLER.TOTAL_PORTS):
+            IFINDEX = CALLER.dat[1]["INT_INDEX"][x]
+            PORT_TYPE = CALLER.dat[1]["INT_TYPE"][x]
+            ROWS += [ROW for ROW in [
+                (None if PORT_TYPE is None else PORT_TYPE[:4], "PORT_T", IFINDEX),
+                (CALLER.dat[1]["INT_ADMIN"][x], "ADMIN", IFINDEX),
+                (CALLER.dat[1]["INT_OPER"][x], "OPER", IFINDEX),
+                (CALLER.dat[1]["INT_NAME"][x], "PORT_N", IFINDEX),
+                (CALLER.dat[1]["INT_BW_IN"][x], "BW_IN", IFINDEX),
+                (CALLER.dat[1]["INT_BW_OUT"][x], "BW_OUT", IFINDEX),
+                (CALLER.dat[1]["INT_ERR_IN"][x], "ERR_IN", IFINDEX),
+                (CALLER.dat[1]["INT_ERR_OUT"][x], "ERR_OUT", IFINDEX),
+            ] if ROW[0] is not None]
+    return ROWS
 
-        print(DEV_OWNER + " - IP:              " + CMD_IP)
-        print(DEV_OWNER + " - USERNAME:        " + CMD_USER)
-        print(DEV_OWNER + " - PASSWORD:        " + len(CMD_PASS)*"*")
-        print(DEV_OWNER + " - AES PASSWORD:    " + len(CMD_PASS_AES)*"*")
-      
-        CALLER.db_connect.INSERT_NOW(str(TIME_DELIVER), "UP_TIME", 9999)
-
-        # PRINT AND INSERT INTO DATABASE (SYSTEM DESC)
-      #  print("---------------------------------------------------------------------------")
-        print(DEV_OWNER + " - CPU Usage:       " + str(CALLER.dat[0]["CPU"]))
-        CALLER.db_connect.INSERT_NOW(CALLER.dat[0]["CPU"], "CPU", 9999)
 
-        print(DEV_OWNER + " - Uses Memory:     " + str(CALLER.dat[0]["USED_MEM"]))
-        CALLER.db_connect.INSERT_NOW(CALLER.dat[0]["USED_MEM"], "USED_MEM", 9999)
-        
-        print(DEV_OWNER + " - Free Memory:     " + str(CALLER.dat[0]["FREE_MEM"]))
-        CALLER.db_connect.INSERT_NOW(CALLER.dat[0]["FREE_MEM"], "FREE_MEM", 9999)
-        
-        print(DEV_OWNER + " - IP Address:      " + str(CALLER.dat[0]["IP_ADD"]))
-        CALLER.db_connect.INSERT_NOW(CALLER.dat[0]["IP_ADD"], "IP_ADD", 9999)
-        
-        print(DEV_OWNER + " - Subnet Mask:     " + str(CALLER.dat[0]["MASK"]))
-        CALLER.db_connect.INSERT_NOW(CALLER.dat[0]["MASK"], "SMASK", 9999)
-        
-        print(DEV_OWNER + " - Hostname:        " + str(CALLER.dat[0]["HOST"]))
-        CALLER.db_connect.INSERT_NOW(CALLER.dat[0]["HOST"], "HOSTNAME", 9999)
-        
-        print(DEV_OWNER + " - Total Interface: " + str(CALLER.dat[0]["TOTAL_PORT"]))
-        CALLER.db_connect.INSERT_NOW(str(CALLER.dat[0]["TOTAL_PORT"]), "TOTAL_PORT", 9999)
-        
-        print(DEV_OWNER + " - Description:     " + str(CALLER.dat[0]["DESC"]))
-        CALLER.db_connect.INSERT_NOW(CALLER.dat[0]["DESC"], "DESC", 9999)
-        print("\n\n")
-     #   print("---------------------------------------------------------------------------")
-        
-        # PRINT AND INSERT INTO DATABASE (INTERFACES DATA)
-        #print(DEV_OWNER + " - INTERFACES: ")
-        if CMD_MODES == 1:
-            for x in range(CALLER.TOTAL_PORTS):
-                interface_name      = CALLER.dat[1]["INT_NAME"][x]
-                interface_type      = CALLER.dat[1]["INT_TYPE"][x][:4]
-                interface_admin     = CALLER.dat[1]["INT_ADMIN"][x]
-                interface_OPER      = CALLER.dat[1]["INT_OPER"][x]
-                interface_BW_IN     = CALLER.dat[1]["INT_BW_IN"][x]
-                interface_BW_OUT    = CALLER.dat[1]["INT_BW_OUT"][x]
-                CALLER.db_connect.INSERT_NOW(interface_type, "PORT_T", x)
-                CALLER.db_connect.INSERT_NOW(interface_admin, "ADMIN", x)
-                CALLER.db_connect.INSERT_NOW(interface_OPER, "OPER", x)
-                CALLER.db_connect.INSERT_NOW(interface_name, "PORT_N", x)
-                CALLER.db_connect.INSERT_NOW(interface_BW_IN, "BW_IN", x)
-                CALLER.db_connect.INSERT_NOW(interface_BW_OUT, "BW_OUT", x)
-                
-       
-                #print(DEV_OWNER + " - " + interface_name, interface_type, interface_admin, interface_OPER, interface_BW_IN, interface_BW_OUT, " -- PORT : " + str(x))
-         #   print("---------------------------------------------------------------------------")
-else:
-    #/usr/bin/python /var/scripts/indexv3.py 'IP ADDRESS' 'USERNAME' 'PASSWORD' 'AES PASSWORD' 'MODE (0 = BASIC | 1 = COMPLETE)'
-    subprocess.run(['bash', '-c', 'clear'])
-    print("\n\n\n ERROR: Please Complete the prompt: ")        
-    print(" SAMPLE: /usr/bin/python /var/scripts/indexv3.py ARG1 ARG2 ARG3 ARG4 ARG5\n")       
-    print(" ARG1 = IP address of Device")
-    print(" ARG2 = SNMP Username")
-    print(" ARG3 = SNMP Password")
-    print(" ARG4 = SNMPv3 AES Password")
-    print(" ARG5 = Mode 0 | 1")
-    print("\n MODE: ")
-    print(" 0 - Insert and show only Basic System Desc (CPU, Memory, IP Address etc.)")
-    print(" 1 - Insert complete Data (Basic System Desc and Interfaces Status)\n\n\n")
\ No newline at end of file
+# CHECK IF THERE IS AN ARGUMENTS
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # MANUAL RUN (FOR TESTING A DEVICE)
+        sys.exit(0 if POLL_DEVICE(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5])) else 1)
+    else:
+        #/usr/bin/python /var/scripts/indexv3.py 'IP ADDRESS' 'USERNAME' 'PASSWORD' 'AES PASSWORD' 'MODE (0 = BASIC | 1 = COMPLETE)'
+        subprocess.run(['bash', '-c', 'clear'])
+        print("\n\n\n ERROR: Please Complete the prompt: ")        
+        print(" SAMPLE: /usr/bin/python /var/scripts/indexv3.py ARG1 ARG2 ARG3 ARG4 ARG5\n")       
+        print(" ARG1 = IP address of Device")
+        print(" ARG2 = SNMP Username")
+        print(" ARG3 = SNMP Password")
+        print(" ARG4 = SNMPv3 AES Password")
+        print(" ARG5 = Mode 0 | 1")
+        print("\n MODE: ")
+        print(" 0 - Insert and show only Basic System Desc (CPU, Memory, IP Address etc.)")
+        print(" 1 - Insert complete Data (Basic System Desc and Interfaces Status)\n\n\n")
\ No newline at end of file
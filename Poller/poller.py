@@ -1,53 +1,323 @@
 
-# CRON SAMPLE ------------------------------------------------------------------- 
-# /usr/bin/python /var/scripts/poller.py                            
 # CRON SAMPLE -------------------------------------------------------------------
+# /usr/bin/python /var/scripts/poller.py
+# CRON SAMPLE -------------------------------------------------------------------
+#
+# ENVIRONMENT:
+#   FERNET_KEY        KEY OF THE WEB APP (network_monitor/settings.py)
+#   FERNET_OLD_KEYS   OLD KEYS STILL ACCEPTED WHILE manage.py rotate_fernet_key RUNS (COMMA SEPARATED)
+#   POLLER_WORKERS    DEVICES POLLED AT THE SAME TIME (DEFAULT 32)
+#   POLLER_STATE_FILE WARM-START STATE FILE (DEFAULT poller.state NEXT TO THIS SCRIPT)
+#   POLLER_SPOOL_FILE HISTORY KEPT WHILE THE DATABASE IS DOWN (DEFAULT poller.spool NEXT TO THIS SCRIPT)
+#   POLLER_SPOOL_MAX_MB SIZE LIMIT OF THE SPOOL FILE (DEFAULT 64)
+#   POLLER_WRITERS    DATABASE CONNECTIONS WRITING THE HISTORY (DEFAULT 2)
+#   POLLER_WRITE_QUEUE POLLED DEVICES WAITING FOR A WRITER BEFORE THEY ARE SPOOLED (DEFAULT 256)
+#   POLLER_STATUS_KEEPALIVE SECONDS BETWEEN TWO HISTORY ROWS OF AN UNCHANGED ADMIN / OPER STATUS (DEFAULT 86400)
 
 
 # LIBRARIES
 import DB_OIDS as dev_list
-import subprocess,time
-from datetime import datetime
-from cryptography.fernet import Fernet
+import indexv3
+from indexv3 import snmpv3
+from CRED_VAULT import CRED_VAULT
+from WARM_STATE import WARM_STATE
+from SPOOL import SPOOL
+from PIPELINE import STAGE
+from STATUS_FILTER import STATUS_FILTER
+import os, signal, statistics, sys, threading, time
+from datetime import datetime, timezone
+
+# POLLING INTERVAL (SECONDS) AND PARALLEL POLLS
+# THE CYCLES START ON THE SLOTS OF THE INTERVAL (00:00, 00:05, ...); THE HISTORY OF A CYCLE IS
+# TIMESTAMPED WITH ITS SLOT (THE SAME FOR EVERY DEVICE), THE ACTUAL COLLECTION TIME IS KEPT NEXT TO IT
+INTERVAL = 60*5
+WORKERS = int(os.environ.get("POLLER_WORKERS", 32))
+# 1 - COMPLETE DATA (BASIC SYSTEM DESC AND INTERFACES STATUS), SEE indexv3.py
+MODE = 1
+
+# DATABASE WRITERS, AND POLLED DEVICES THAT MAY WAIT FOR THEM BEFORE BEING SPOOLED INSTEAD
+WRITERS = int(os.environ.get("POLLER_WRITERS", 2))
+WRITE_QUEUE = int(os.environ.get("POLLER_WRITE_QUEUE", 256))
+
+# OUTCOME OF THE POLLS OF THE CURRENT CYCLE ("polled", "down", "incomplete")
+OUTCOMES = {}
+OUTCOMES_LOCK = threading.Lock()
+
+# ENCRYPTION KEYS (THE FIRST ONE IS THE CURRENT KEY)
+FERNET_KEY = os.environ.get("FERNET_KEY", "dzi31zMj3HqfNuHYW2a8rU8g66Ahtzno-Lc6BZweTpg=")
+FERNET_OLD_KEYS = [KEY.strip() for KEY in os.environ.get("FERNET_OLD_KEYS", "").split(",") if KEY.strip()]
+
+# DECRYPTED CREDENTIALS, KEPT IN MEMORY UNTIL THE DEVICE ROW CHANGES
+VAULT = CRED_VAULT([FERNET_KEY] + FERNET_OLD_KEYS)
+
+# IP ADDRESSES POLLED IN THE LAST CYCLE (THEIR SNMP SESSIONS ARE KEPT BETWEEN CYCLES)
+POLLED_IPS = set()
+
+# WARM START: SESSION STATE (ENGINE ID, BOOTS / TIME, LOCALIZED KEYS) SURVIVES A RESTART
+STATE_FILE = os.environ.get("POLLER_STATE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "poller.state"))
+WARM = WARM_STATE(STATE_FILE, [FERNET_KEY] + FERNET_OLD_KEYS)
+# SAVED SESSION STATE BY IP ADDRESS, NOT YET HANDED TO A SESSION SINCE THE RESTART
+RESUME = {}
+
+# DATABASE DOWN: THE HISTORY IS SPOOLED TO A LOCAL FILE AND REPLAYED WHEN IT IS BACK,
+# AND THE DEVICES OF THE LAST CYCLE KEEP BEING POLLED
+SPOOL_FILE = os.environ.get("POLLER_SPOOL_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "poller.spool"))
+HISTORY_SPOOL = SPOOL(SPOOL_FILE, int(os.environ.get("POLLER_SPOOL_MAX_MB", 64))*1024*1024)
+dev_list.SPOOL = HISTORY_SPOOL
+LAST_DEVICES = []
+
+# IP ADDRESS -> (DEVICE MODEL ID, GETBULK MAX-REPETITIONS LEARNED FOR THE MODEL) OF THE CURRENT CYCLE
+DEVICE_MODELS = {}
+
+# SLOT OF THE CURRENT CYCLE
+SLOT = None
+
+# ADMIN / OPER STATUS: HISTORY ROWS ONLY ON A CHANGE (LOGGED AS AN INTERFACE STATE CHANGE) OR AS A KEEP-ALIVE
+STATUSES = STATUS_FILTER(int(os.environ.get("POLLER_STATUS_KEEPALIVE", 24*60*60)))
+
+
+# PIPELINE STAGE 1 - COLLECT: SNMP ONLY (THE OID MAPS ARE LOADED AT THE START OF THE CYCLE)
+def collect_device(JOB, LOCAL):
+    # STORE DEVICE CREDENTIALS
+    IP_ADD, (USERNAME, PASSWORD, AES_PASSWORD) = JOB
+    SESSION = snmpv3.session(IP_ADD, USERNAME, PASSWORD, AES_PASSWORD)
+    # NEW SESSION: START THE GETBULK TUNING FROM WHAT WAS LEARNED FOR THE DEVICE MODEL
+    MODEL_ID, BULK_SIZE = DEVICE_MODELS.get(IP_ADD, (None, None))
+    if SESSION.round_trips == 0 and BULK_SIZE:
+        SESSION.tune(BULK_SIZE)
+    # FIRST POLL SINCE THE RESTART: RESUME THE SAVED SESSION (NO ENGINE DISCOVERY, NO KEY DERIVATION)
+    SAVED = RESUME.pop(IP_ADD, None)
+    if SAVED is not None and SESSION.engine_id is None:
+        SESSION.restore(SAVED)
+    try:
+        # SNMP RUNS IN THIS PROCESS: THE PASSWORDS ARE NEVER PASSED ON A COMMAND LINE
+        CALLER = indexv3.SNMP_GET_DAT(IP_ADD, USERNAME, PASSWORD, AES_PASSWORD, MODE, SESSION, dev_list.OID_CACHE.get(IP_ADD, {}), SLOT)
+    except snmpv3.SnmpError as e:
+        # NO (OR REJECTED) SNMP ANSWER: THE WRITER RECORDS THE DEVICE AS DOWN
+        print(" ERROR: No SNMP answer from " + IP_ADD + " (" + str(e) + ")")
+        return (IP_ADD, JOB[1], None)
+    except Exception as e:
+        # THE DEVICE ANSWERED BUT SOME DATA IS MISSING (E.G. AN OID THE MODEL DOES NOT SUPPORT)
+        print(" ERROR: Incomplete SNMP data from " + IP_ADD + " (" + str(e) + ")")
+        COUNT("incomplete")
+        return None
+    finally:
+        # RELEASE THE SOCKET; THE SESSION STATE IS KEPT FOR THE NEXT CYCLE
+        SESSION.close()
+    COUNT("tables", len(CALLER.ROUND_TRIPS))
+    COUNT("round trips", sum(CALLER.ROUND_TRIPS.values()))
+    return (IP_ADD, JOB[1], CALLER)
+
+
+# PIPELINE STAGE 2 - NORMALIZE: SNMP DATA -> HISTORY ROWS (THE SNMP WALKS ARE RELEASED HERE)
+# UNCHANGED ADMIN / OPER STATUSES ARE DROPPED (ONE WORKER: STATUSES IS NOT SHARED)
+def normalize_device(SAMPLE, LOCAL):
+    IP_ADD, (USERNAME, PASSWORD, AES_PASSWORD), CALLER = SAMPLE
+    if CALLER is None:
+        return (IP_ADD, SLOT, None, None, None)
+    indexv3.SHOW(CALLER, IP_ADD, USERNAME, PASSWORD, AES_PASSWORD)
+    ROWS, CHANGES = STATUSES.FILTER(IP_ADD, CALLER.TIMEDATE, indexv3.HISTORY_ROWS(CALLER, MODE))
+    return (IP_ADD, CALLER.TIMEDATE, ROWS, CHANGES, CALLER.COLLECTED)
+
+
+# PIPELINE STAGE 3 - WRITE: ONE MULTI-ROW INSERT PER DEVICE, ON A CONNECTION KEPT BY EACH WRITER
+# (SPOOLED LOCALLY WHILE THE DATABASE IS DOWN)
+def write_device(ROWS_OF_DEVICE, LOCAL):
+    IP_ADD, TIMEDATE, ROWS, CHANGES, COLLECTED = ROWS_OF_DEVICE
+    DB = LOCAL.get("DB")
+    if DB is None or DB.conn is None:
+        DB = LOCAL["DB"] = dev_list.OIDS("192.168.33.1", "lemon", "frqAIRNAV", "snmp_monitoring", None)
+    # THE CONNECTION SERVES EVERY DEVICE: POINT IT AT THIS ONE
+    DB.ip = IP_ADD
+    # THE 'devices' CACHE VERSION IS BUMPED ONCE AT THE END OF THE CYCLE, NOT PER DEVICE
+    if ROWS is None:
+        DB.RECORD_STATE("down", "snmp_timeout", BUMP=0)
+        COUNT("down")
+        return None
+    DB.INSERT_ROWS(ROWS, TIMEDATE, CHANGES, COLLECTED)
+    # NOTIFY THE LIVE DASHBOARD STREAM THAT THIS DEVICE HAS NEW DATA
+    DB.RECORD_CHANGE("metrics", BUMP=0)
+    DB.RECORD_STATE("up", BUMP=0)
+    COUNT("polled")
+    return None
+
+
+def close_writer(LOCAL):
+    if LOCAL.get("DB") is not None:
+        LOCAL["DB"].CLOSE()
+
+
+# THE WRITERS ARE BEHIND (WRITE QUEUE FULL): THE ROWS GO STRAIGHT TO THE SPOOL, THE COLLECTORS KEEP THEIR PACE
+def spill_device(ROWS_OF_DEVICE):
+    IP_ADD, TIMEDATE, ROWS, CHANGES, COLLECTED = ROWS_OF_DEVICE
+    for VAL, OID_TYPE, IDENTIFIER in ROWS or []:
+        dev_list.SPOOL_ROW(IP_ADD, TIMEDATE, VAL, OID_TYPE, IDENTIFIER, CHANGES.get((OID_TYPE, IDENTIFIER)), COLLECTED)
+    COUNT("polled" if ROWS is not None else "down")
+
+
+def COUNT(OUTCOME, N=1):
+    with OUTCOMES_LOCK:
+        OUTCOMES[OUTCOME] = OUTCOMES.get(OUTCOME, 0) + N
+
+
+# GETBULK SIZE TO STORE FOR EACH DEVICE MODEL: THE MEDIAN OF WHAT ITS DEVICES' SESSIONS LEARNED
+# (ONLY THE MODELS WHERE IT CHANGED)
+def learned_bulk_sizes():
+    LEARNED = {}
+    for SESSION in snmpv3.shared_sessions():
+        MODEL_ID, BULK_SIZE = DEVICE_MODELS.get(SESSION.host, (None, None))
+        if MODEL_ID is not None and SESSION.table_round_trips:
+            LEARNED.setdefault(MODEL_ID, []).append(SESSION.max_repetitions)
+    STORED = dict(DEVICE_MODELS.values())
+    SIZES = {}
+    for MODEL_ID, VALUES in LEARNED.items():
+        SIZE = statistics.median_low(VALUES)
+        if SIZE != STORED.get(MODEL_ID):
+            SIZES[MODEL_ID] = SIZE
+    return SIZES
+
+
+# INSERT THE SPOOLED HISTORY (OLDEST FIRST) NOW THAT THE DATABASE ANSWERS AGAIN
+def replay_spool(DB):
+    RECORDS = HISTORY_SPOOL.TAKE()
+    if not RECORDS:
+        return
+    RECORDS.sort(key=lambda RECORD: RECORD["ts"])
+    DONE = DB.REPLAY(RECORDS)
+    HISTORY_SPOOL.KEEP(RECORDS[DONE:])
+    print("SPOOL: REPLAYED "+str(DONE)+"/"+str(len(RECORDS))+" HISTORY ROWS")
+
+
+# START OF THE SLOT OF THE INTERVAL THAT CONTAINS THE EPOCH TIME NOW
+def slot_of(NOW):
+    return NOW // INTERVAL * INTERVAL
+
 
 def run_service():
-    # ENCRYPTION KEY
-    fernet = Fernet(b'dzi31zMj3HqfNuHYW2a8rU8g66Ahtzno-Lc6BZweTpg=')
-    # CLEAR THE CMD
-    #subprocess.run(['bash', '-c', 'clear'])
-    # DATABASE 
-    
-    DB_ORG = dev_list.OIDS("192.168.33.1", "lemon", "frqAIRNAV", "snmp_monitoring", '0.0.0.0')
-    for x in range(len(DB_ORG.DEVICES_LIST())):
-        print("STARTS AT: "+str(datetime.now()))
-        # THIS IS WHERE WE STORE THE LIST OF DEVICES
-        DB_LISTER =     DB_ORG.DEVICES_LIST()[x]
-        # STORE DEVICE CREDENTIALS 
-        MODE = 1
-        IP_ADD          = DB_LISTER['ip_address']
-        USERNAME        = DB_LISTER['username']
-        try:   # DECRYPT PASSWORD
-            PASSWORD        = str(fernet.decrypt(DB_LISTER['snmp_password']).decode())
-            AES_PASSWORD    = str(fernet.decrypt(DB_LISTER['snmp_aes_passwd']).decode())
-            subprocess.run(['bash', '-c', "/usr/bin/python /var/scripts/indexv3.py '"+IP_ADD+"' '"+USERNAME+"' '"+PASSWORD+"' '"+AES_PASSWORD+"' "+str(MODE)+" &"])
-        except:
+    global SLOT
+    SLOT = datetime.fromtimestamp(slot_of(time.time()), tz=timezone.utc).replace(tzinfo=None)
+    # DATABASE
+    DB_ORG = dev_list.OIDS("192.168.33.1", "lemon", "frqAIRNAV", "snmp_monitoring", None)
+    # THIS IS WHERE WE STORE THE LIST OF DEVICES AND THEIR OIDS (ONE QUERY EACH PER CYCLE)
+    global LAST_DEVICES
+    if DB_ORG.conn is not None:
+        try:
+            LAST_DEVICES = DB_ORG.DEVICES_LIST()
+            DB_ORG.OID_MAPS()
+        except dev_list.DB_ERRORS as e:
+            DB_ORG.CLOSE()
+            dev_list.GO_OFFLINE(e)
+    if DB_ORG.conn is None:
+        print("DATABASE UNREACHABLE: POLLING THE "+str(len(LAST_DEVICES))+" DEVICES OF THE LAST CYCLE, HISTORY GOES TO "+SPOOL_FILE)
+    DEVICES = LAST_DEVICES
+
+    JOBS = []
+    for DB_LISTER in DEVICES:
+        IP_ADD = DB_LISTER['ip_address']
+        # DECRYPT PASSWORD (ONLY WHEN THE ROW CHANGED SINCE THE LAST CYCLE)
+        CREDS = VAULT.GET(DB_LISTER)
+        if CREDS is None:
             # PRINT IF THERE IS AN ERROR IN DECRYPTION PROCESS
             # DO NOTING
             print("Encryption ERROR for a Device with an IP Address of "+IP_ADD+"! Please Check the Database if there is a data that wasn't encrypted")
-    
-   
-
-while True:
-    print("--------------------------------------------------------------------")
-    print("                         SESSION START CRON                         ")
-    print("                         START: "+str(datetime.now())+"             ")
-    print("--------------------------------------------------------------------")
-    
-    run_service()
-    time.sleep(60*5)
-    
-
-    print("--------------------------------------------------------------------")
-    print("                         SESSION ENDS CRON                          ")
-    print("                         ENDS: "+str(datetime.now())+"              ")
-    print("--------------------------------------------------------------------\n\n")
+            continue
+        JOBS.append((IP_ADD, CREDS))
+    VAULT.PRUNE([DB_LISTER['id'] for DB_LISTER in DEVICES])
+    # FORGET THE SNMP SESSIONS OF DEVICES THAT ARE NO LONGER POLLED
+    global POLLED_IPS
+    for IP_ADD in POLLED_IPS - set(JOB[0] for JOB in JOBS):
+        snmpv3.forget(IP_ADD)
+        STATUSES.FORGET(IP_ADD)
+    POLLED_IPS = set(JOB[0] for JOB in JOBS)
+    DEVICE_MODELS.clear()
+    DEVICE_MODELS.update((DB_LISTER['ip_address'], (DB_LISTER.get('model_id'), DB_LISTER.get('bulk_max_repetitions'))) for DB_LISTER in DEVICES)
+
+    # THE SPOOL IS REPLAYED ON ITS OWN CONNECTION WHILE THE DEVICES ARE POLLED
+    REPLAYER = None
+    if DB_ORG.conn is not None:
+        REPLAYER = threading.Thread(target=replay_spool, args=(DB_ORG,))
+        REPLAYER.start()
+
+    print("STARTS AT: "+str(datetime.now())+" - SLOT "+str(SLOT)+" - "+str(len(JOBS))+" DEVICES")
+    if JOBS:
+        OUTCOMES.clear()
+        STATUSES.WRITTEN = STATUSES.SKIPPED = 0
+        # COLLECT -> NORMALIZE -> WRITE, EACH STAGE WITH ITS OWN THREADS AND A BOUNDED QUEUE
+        WRITE = STAGE("write", write_device, WRITERS, WRITE_QUEUE, OVERFLOW=spill_device, FINISH=close_writer).START()
+        NORMALIZE = STAGE("normalize", normalize_device, 1, WORKERS, NEXT=WRITE).START()
+        COLLECT = STAGE("collect", collect_device, min(WORKERS, len(JOBS)), WORKERS, NEXT=NORMALIZE).START()
+        for JOB in JOBS:
+            COLLECT.PUT(JOB)
+        for PART in (COLLECT, NORMALIZE, WRITE):
+            PART.CLOSE()
+        print("POLLED: "+str(OUTCOMES.get("polled", 0))+"/"+str(len(JOBS))+" - DOWN: "+str(OUTCOMES.get("down", 0))+" - INCOMPLETE: "+str(OUTCOMES.get("incomplete", 0))+" - CREDENTIAL CACHE HITS: "+str(VAULT.HITS)+" MISSES: "+str(VAULT.MISSES))
+        print("GETBULK: "+str(OUTCOMES.get("tables", 0))+" TABLES WALKED IN "+str(OUTCOMES.get("round trips", 0))+" ROUND TRIPS")
+        print("STATUS: "+str(STATUSES.WRITTEN)+" ADMIN / OPER ROWS WRITTEN, "+str(STATUSES.SKIPPED)+" UNCHANGED SKIPPED")
+        for PART in (COLLECT, NORMALIZE, WRITE):
+            print("PIPELINE "+PART.STATS())
+    if REPLAYER is not None:
+        REPLAYER.join()
+    # ONE INVALIDATION OF THE DEVICE LIST CACHE FOR ALL THE DEVICES WRITTEN THIS CYCLE
+    # (AFTER THE REPLAY: IT SHARES THE CONNECTION)
+    if JOBS and (OUTCOMES.get("polled") or OUTCOMES.get("down")):
+        DB_ORG.BUMP_DEVICES()
+    # REMEMBER THE GETBULK SIZES LEARNED THIS CYCLE (NEW DEVICES AND RESTARTS START FROM THEM)
+    SIZES = learned_bulk_sizes()
+    if SIZES and DB_ORG.conn is not None:
+        DB_ORG.SAVE_BULK_SIZES(SIZES)
+        for DB_LISTER in LAST_DEVICES:
+            if DB_LISTER.get('model_id') in SIZES:
+                DB_LISTER['bulk_max_repetitions'] = SIZES[DB_LISTER['model_id']]
+        print("GETBULK: MAX-REPETITIONS SAVED FOR "+str(len(SIZES))+" DEVICE MODELS")
+    DB_ORG.CLOSE()
+    HISTORY_SPOOL.SYNC()
+    if HISTORY_SPOOL.WRITTEN or HISTORY_SPOOL.DROPPED:
+        print("SPOOL: "+str(HISTORY_SPOOL.WRITTEN)+" HISTORY ROWS WAITING FOR THE DATABASE, "+str(HISTORY_SPOOL.DROPPED)+" DROPPED (SPOOL FULL)")
+
+
+# CHECKPOINT THE STATE OF THE DEVICES BEING POLLED
+def save_state():
+    # STOPPED BEFORE THE FIRST CYCLE LISTED THE DEVICES: KEEP THE FILE AS IT IS
+    if not POLLED_IPS:
+        return
+    SESSIONS = {}
+    for SESSION in snmpv3.shared_sessions():
+        STATE = SESSION.state()
+        if STATE is not None and SESSION.host in POLLED_IPS:
+            SESSIONS[SESSION.host] = STATE
+    # DEVICES THAT HAVE NOT BEEN POLLED SINCE THE RESTART KEEP THEIR SAVED STATE
+    for IP_ADD, STATE in list(RESUME.items()):
+        if IP_ADD in POLLED_IPS:
+            SESSIONS.setdefault(IP_ADD, STATE)
+    WARM.SAVE({"sessions": SESSIONS, "statuses": STATUSES.STATE(POLLED_IPS)})
+
+
+if __name__ == "__main__":
+    # RESUME WHERE THE LAST RUN STOPPED
+    SAVED = WARM.LOAD()
+    RESUME.update(SAVED.get("sessions", {}))
+    STATUSES.RESTORE(SAVED.get("statuses", {}))
+    print("WARM START: "+str(len(RESUME))+" DEVICE SESSIONS AND "+str(len(STATUSES.BASELINE))+" STATUS BASELINES LOADED FROM "+STATE_FILE)
+    # systemctl stop / kill: LEAVE THROUGH THE finally BELOW SO THE STATE IS SAVED
+    signal.signal(signal.SIGTERM, lambda SIGNUM, FRAME: sys.exit(0))
+    try:
+        while True:
+            print("--------------------------------------------------------------------")
+            print("                         SESSION START CRON                         ")
+            print("                         START: "+str(datetime.now())+"             ")
+            print("--------------------------------------------------------------------")
+
+            STARTED = time.time()
+            run_service()
+            save_state()
+
+
+            print("--------------------------------------------------------------------")
+            print("                         SESSION ENDS CRON                          ")
+            print("                         ENDS: "+str(datetime.now())+"              ")
+            print("--------------------------------------------------------------------\n\n")
+            # THE NEXT CYCLE STARTS ON THE NEXT SLOT (RIGHT AWAY, ON THE CURRENT SLOT, IF THIS ONE RAN OVER IT)
+            time.sleep(max(0, slot_of(STARTED) + INTERVAL - time.time()))
+    finally:
+        save_state()
+        HISTORY_SPOOL.CLOSE()
@@ -86,7 +86,8 @@ Features:
 - BaseIconAdmin: reusable admin base that adds an "Actions" column with Edit/Delete links.
 - Each model keeps its original list_display fields + actions column.
 - DeviceAdmin: custom device permissions (non-superusers only see own devices).
-- HistoryAdmin: read-only history view (no add/change/delete).
+- HistoryAdmin: read-only history view (no add/change/delete) with keyset
+  pagination and estimated counts, so it stays fast on a very large table.
 - MonitoringAdminSite: custom AdminSite with grouped sidebar.
 - All models are registered to the custom admin site (custom_admin_site).
 """
@@ -104,10 +105,15 @@ from django.core.exceptions import PermissionDenied
 from django.contrib import messages
 from django.template.response import TemplateResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.contrib.admin.views.main import ChangeList
+from django.db import connections
+from django.db.models import Q
+from datetime import datetime, timedelta, timezone as dt_timezone
 from .models import (
     Brand, DeviceType, Metric, DeviceModel,
     Device, Interface, OidMap, History, Threshold
 )
+from .jobs import retire_device, retire_interface
 
 
 # ----------------------------------------------------
@@ -307,10 +313,10 @@ class UserDeviceFilter(admin.SimpleListFilter):
         """
         if request.user.is_superuser:
             # Superusers see all devices
-            devices = Device.objects.all()
+            devices = Device.objects.filter(retired_at__isnull=True)
         else:
             # Normal users see only their own devices
-            devices = Device.objects.filter(user=request.user)
+            devices = Device.objects.filter(user=request.user, retired_at__isnull=True)
             
         # Return the (id, hostname) pairs for the dropdown
         return [(d.id, d.hostname) for d in devices]
@@ -502,7 +508,7 @@ class DeviceAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         """Filter queryset for non-superusers to only show their devices."""
         self.request = request  # store the request so action_buttons() can access it
-        qs = super().get_queryset(request)
+        qs = super().get_queryset(request).filter(retired_at__isnull=True)  # Deleted, still being purged
         if request.user.is_superuser:
             return qs
         return qs.filter(user=request.user)
@@ -553,7 +559,7 @@ class DeviceAdmin(admin.ModelAdmin):
         """
         
         # Get the object to be deleted
-        obj = get_object_or_404(self.model, pk=object_id)
+        obj = get_object_or_404(self.model, pk=object_id, retired_at__isnull=True)
         
         # Check permissions using YOUR existing method
         if not self.has_delete_permission(request, obj):
@@ -561,8 +567,10 @@ class DeviceAdmin(admin.ModelAdmin):
 
         if request.method == 'POST':
             # This is the user clicking 'Yes, I'm sure'
-            obj.delete()
-            self.message_user(request, _(f'The device "{obj}" was deleted successfully.'), messages.SUCCESS)
+            # The device is retired at once; its history is purged by a background job
+            retire_device(obj, request.user)
+            self.message_user(request, _(f'The device "{obj}" was deleted successfully. '
+                                         'Its history is being removed in the background.'), messages.SUCCESS)
             
             # Redirect back to the changelist
             return redirect(reverse(f'admin:{self.opts.app_label}_{self.opts.model_name}_changelist'))
@@ -640,6 +648,131 @@ class DeviceAdmin(admin.ModelAdmin):
 custom_admin_site.register(Device, DeviceAdmin)
 
 
+# ----------------------------------------------------
+# History browser helpers (keyset pagination, estimated counts)
+# ----------------------------------------------------
+OLDER_VAR = 'older'          # ?older=<cursor>: rows after this one (older)
+NEWER_VAR = 'newer'          # ?newer=<cursor>: rows before this one (newer)
+COUNT_LIMIT = 10000          # Filtered counts stop here ("more than 10,000")
+SEARCH_MAX_DEVICES = 500     # Devices a search term may expand to
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(obj):
+    """(timestamp, id) of a row as '<epoch microseconds>_<id>'."""
+    return f"{(obj.timestamp - EPOCH) // timedelta(microseconds=1)}_{obj.pk}"
+
+
+def decode_cursor(raw):
+    """Inverse of encode_cursor. Returns (timestamp, id) or None when malformed or out of range."""
+    try:
+        micros, pk = (int(part) for part in (raw or '').split('_'))
+        return EPOCH + timedelta(microseconds=micros), pk
+    except (ValueError, OverflowError):
+        return None
+
+
+def table_estimate(model, using='default'):
+    """Row count from the database statistics (no table scan). None when unavailable."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = ("SELECT TABLE_ROWS FROM information_schema.TABLES "
+               "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s")
+    elif connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    # reltuples is -1 until the table has been analyzed
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+def estimated_count(queryset):
+    """
+    Returns (count, label). Unfiltered: table statistics ("about N");
+    filtered: an exact count that stops at COUNT_LIMIT.
+    """
+    if not queryset.query.where:
+        estimate = table_estimate(queryset.model, queryset.db)
+        if estimate is not None:
+            return estimate, f"about {estimate:,}"
+    count = queryset.order_by()[:COUNT_LIMIT + 1].count()
+    if count > COUNT_LIMIT:
+        return COUNT_LIMIT, f"more than {COUNT_LIMIT:,}"
+    return count, f"{count:,}"
+
+
+class KeysetChangeList(ChangeList):
+    """
+    ChangeList ordered by (timestamp, id), newest first, that pages with
+    ?older= / ?newer= cursors instead of OFFSET and never runs COUNT(*)
+    over the whole table. Each page is one indexed range query.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.older = decode_cursor(request.GET.get(OLDER_VAR))
+        self.newer = decode_cursor(request.GET.get(NEWER_VAR))
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(OLDER_VAR, None)
+        lookup_params.pop(NEWER_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Changing a filter or the search starts again from the newest rows
+        return super().get_query_string(new_params, list(remove or []) + [OLDER_VAR, NEWER_VAR])
+
+    def get_results(self, request):
+        per_page = self.list_per_page
+        queryset = self.queryset.order_by('-timestamp', '-id')
+
+        if self.newer:
+            timestamp, pk = self.newer
+            rows = list(queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+                        .order_by('timestamp', 'id')[:per_page + 1])
+            has_newer, has_older = len(rows) > per_page, True
+            rows = rows[:per_page][::-1]
+        else:
+            if self.older:
+                timestamp, pk = self.older
+                queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+            rows = list(queryset[:per_page + 1])
+            has_newer, has_older = self.older is not None, len(rows) > per_page
+            rows = rows[:per_page]
+
+        self.result_count, self.count_label = estimated_count(self.queryset)
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = False
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = has_newer or has_older
+        self.paginator = None
+        self.newest_url = self.get_query_string() if has_newer else None
+        self.newer_url = self.get_query_string({NEWER_VAR: encode_cursor(rows[0])}) if has_newer and rows else None
+        self.older_url = self.get_query_string({OLDER_VAR: encode_cursor(rows[-1])}) if has_older and rows else None
+
+
+class RecentFilter(admin.SimpleListFilter):
+    """Time window on History.timestamp (combines with the device / metric indexes)."""
+    title = _('time window')
+    parameter_name = 'window'
+    WINDOWS = {'1h': timedelta(hours=1), '24h': timedelta(hours=24), '7d': timedelta(days=7), '30d': timedelta(days=30)}
+
+    def lookups(self, request, model_admin):
+        return [('1h', _('Last hour')), ('24h', _('Last 24 hours')), ('7d', _('Last 7 days')), ('30d', _('Last 30 days'))]
+
+    def queryset(self, request, queryset):
+        if self.value() in self.WINDOWS:
+            return queryset.filter(timestamp__gte=timezone.now() - self.WINDOWS[self.value()])
+        return queryset
+
+
 # ----------------------------------------------------
 # HistoryAdmin: read-only
 # ----------------------------------------------------
@@ -647,13 +780,37 @@ class HistoryAdmin(admin.ModelAdmin):
     """
     Admin for History model.
     Read-only view: no add/change/delete allowed.
+    Built for a table with hundreds of millions of rows:
+    - keyset pagination on (timestamp, id) and estimated counts (KeysetChangeList);
+    - filters on device, metric and a time window only, which map onto the
+      (device, metric, timestamp) and (timestamp, id) indexes;
+    - search resolves hostnames / IPs to device ids first (no LIKE over the join);
+    - device, metric and interface are joined into the page query.
     """
-    list_display = ('timestamp', 'device', 'metric', 'interface', 'value')
-    list_filter = ('timestamp', UserDeviceFilter, 'metric')
-    search_fields = ('device__hostname', 'metric__metric_name')
+    list_display = ('timestamp', 'collected_at', 'device', 'metric', 'interface', 'value')
+    list_filter = (RecentFilter, UserDeviceFilter, 'metric')
+    list_select_related = ('device', 'metric', 'interface__device')
+    search_fields = ('device__hostname', 'device__ip_address')
+    search_help_text = _('Device hostname or IP address')
+    ordering = ('-timestamp', '-id')
+    sortable_by = ()
+    show_full_result_count = False
+    change_list_template = 'admin/monitoring/history/change_list.html'
 
     actions = None  # remove "delete selected"
 
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        device_ids = Device.objects.filter(
+            Q(hostname__icontains=term) | Q(ip_address__icontains=term)
+        ).values_list('id', flat=True)[:SEARCH_MAX_DEVICES]
+        return queryset.filter(device_id__in=list(device_ids)), False
+
     def has_add_permission(self, request):
         return False
 
@@ -697,7 +854,7 @@ class DeviceModelAdmin(BaseIconAdmin):
     """
     Admin for DeviceModel.
     """
-    list_display = ('model_name', 'brand', 'type', 'action_buttons')
+    list_display = ('model_name', 'brand', 'type', 'bulk_max_repetitions', 'action_buttons')
     list_filter = ('brand', 'type')
     search_fields = ('model_name', 'brand__brand_name', 'type__type_name')
     
@@ -712,8 +869,8 @@ class InterfaceAdmin(BaseIconAdmin):
     """
     Admin for Interface.
     """
-    list_display = ('device', 'ifIndex', 'ifName', 'ifDescr', 'ifAlias', 'action_buttons')
-    list_filter = (UserDeviceFilter,)
+    list_display = ('device', 'ifIndex', 'ifName', 'ifDescr', 'ifAlias', 'is_active', 'action_buttons')
+    list_filter = (UserDeviceFilter, 'is_active')
     search_fields = ('device__hostname', 'ifName', 'ifDescr', 'ifAlias')
 
     delete_confirmation_template = "admin/monitoring/interface/delete_confirmation.html"
@@ -726,8 +883,8 @@ class InterfaceAdmin(BaseIconAdmin):
         # Store the request for BaseIconAdmin's action_buttons
         self.request = request 
         
-        # Get the base queryset
-        qs = super().get_queryset(request)
+        # Get the base queryset (without deleted interfaces/devices that are still being purged)
+        qs = super().get_queryset(request).filter(retired_at__isnull=True, device__retired_at__isnull=True)
         
         # If superuser, show everything
         if request.user.is_superuser:
@@ -744,7 +901,7 @@ class InterfaceAdmin(BaseIconAdmin):
         """
         
         # Get the object to be deleted
-        obj = get_object_or_404(self.model, pk=object_id)
+        obj = get_object_or_404(self.model, pk=object_id, retired_at__isnull=True)
         
         # Check permissions using existing method
         if not self.has_delete_permission(request, obj):
@@ -752,8 +909,10 @@ class InterfaceAdmin(BaseIconAdmin):
 
         if request.method == 'POST':
             # This is the user clicking 'Yes, I'm sure'
-            obj.delete()
-            self.message_user(request, _(f'The interface "{obj}" was deleted successfully.'), messages.SUCCESS)
+            # The interface is retired at once; its history is purged by a background job
+            retire_interface(obj, request.user)
+            self.message_user(request, _(f'The interface "{obj}" was deleted successfully. '
+                                         'Its history is being removed in the background.'), messages.SUCCESS)
             
             # Redirect back to the changelist
             return redirect(reverse(f'admin:{self.opts.app_label}_{self.opts.model_name}_changelist'))
@@ -798,7 +957,7 @@ class ThresholdAdmin(BaseIconAdmin):
     """
     Admin for Threshold rules.
     """
-    list_display = ('device', 'metric', 'interface', 'condition', 'value', 'alert_level', 'action_buttons')
+    list_display = ('device', 'metric', 'interface', 'condition', 'value', 'clear_value', 'min_duration', 'alert_level', 'action_buttons')
     list_filter = (UserDeviceFilter, 'metric', 'interface', 'condition', 'value', 'alert_level')
     search_fields = ('device__hostname', 'metric__metric_name', 'interface__ifName', 'interface__ifDescr', 'interface__ifAlias', 'condition', 'value', 'alert_level')
 
@@ -810,8 +969,11 @@ class ThresholdAdmin(BaseIconAdmin):
         # Store the request for BaseIconAdmin's action_buttons
         self.request = request 
         
-        # Get the base queryset
-        qs = super().get_queryset(request)
+        # Get the base queryset (without rules of deleted devices/interfaces that are still being purged)
+        qs = super().get_queryset(request).filter(
+            Q(interface__isnull=True) | Q(interface__retired_at__isnull=True),
+            device__retired_at__isnull=True,
+        )
         
         # If superuser, show everything
         if request.user.is_superuser:
@@ -0,0 +1,391 @@
+""" Ingest-time threshold evaluation (`manage.py evaluate_alerts`).
+
+    The evaluator tails History by id, so every sample is checked once as it
+    arrives instead of on every dashboard load. Each Threshold has one
+    AlertState row (ok / warning / critical) that moves only after the
+    condition held for `min_duration` seconds, and clears against
+    `clear_value` (hysteresis). Every state change is written to AlertEvent;
+    the API only reads the stored states.
+
+    The consumed position is kept in IngestCheckpoint('alerts'), so a restart
+    resumes where it stopped. Several writers (POLLER_WRITERS, spool replay)
+    can commit History ids out of order, so the checkpoint stays below any
+    id that is still missing (HistoryTail) until it shows up or SETTLE_SECONDS
+    pass; rows above it are re-scanned and each is applied once. Threshold edits bump the 'thresholds' data
+    version, which makes the evaluator reload its rules. New events are
+    handed to an optional `notify` callable (notifications.Dispatcher.enqueue)
+    after they are committed.
+
+    Interface rules (Threshold.interface set) are evaluated in the same pass.
+    Counter metrics are turned into rates first, only for interfaces that
+    have a rule on them: 'Utilization In/Out' (%) is derived from the
+    Bandwidth counters and Interface.speed, and rules on 'Errors In/Out'
+    compare errors per minute. Status rules use '=' / '!=' with the state
+    name ('down') or number ('2'); the poller writes status rows only on a
+    change, so their min_duration is confirmed by the clock (promote): the
+    poller's clock, taken from the newest sample read, so a skewed or
+    differently zoned app server clock does not confirm them early or late. """
+
+import logging
+import math
+import re
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Q
+
+from .models import AlertEvent, AlertState, DeviceChange, History, IngestCheckpoint, Interface, Metric, Threshold
+from .notifications import notification
+from .response_cache import bump_version, get_version, DEVICES, THRESHOLDS
+from .timeseries import STATUS_METRICS, to_float
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+CHECKPOINT = 'alerts'      # IngestCheckpoint name
+BATCH_SIZE = 5000          # History rows read per pass
+UTILIZATION = {'Bandwidth In': 'Utilization In', 'Bandwidth Out': 'Utilization Out'}  # counter -> derived %
+ERROR_COUNTERS = ('Errors In', 'Errors Out')   # Rules on these compare errors per minute
+COUNTER_WRAP = 2 ** 32     # ifInOctets / ifInErrors are Counter32
+WRAP_MARGIN = 1.2          # A wrapped delta above line rate x this is a counter reset (e.g., reboot)
+MIN_FRAME = 64             # Octets per frame: bounds the errors an interface can count per second
+SPEED_REFRESH = 300        # Seconds between re-reads of Interface.speed
+SETTLE_SECONDS = 60        # How long a missing History id may still commit (concurrent writers, spool replay)
+# ---------------------------------------------------------------------------------
+
+SEVERITY = {AlertState.STATE_OK: 0, AlertState.STATE_WARNING: 1, AlertState.STATE_CRITICAL: 2}
+
+CHANGE_ONLY_METRICS = frozenset(STATUS_METRICS.values())   # Metrics the poller writes only on change
+
+_STATUS_NUMBER = re.compile(r'\(\s*-?\d+\s*\)\s*$')
+
+
+def level_state(alert_level):
+    """Maps a Threshold.alert_level ('Warning', 'Critical', ...) to an AlertState state."""
+    return AlertState.STATE_CRITICAL if (alert_level or '').lower().startswith('crit') else AlertState.STATE_WARNING
+
+
+def _strip_percent(raw):
+    text = str(raw).strip()
+    return text[:-1].strip() if text.endswith('%') else raw
+
+
+def condition_met(condition, value, limit):
+    """
+    True/False if `value <condition> limit` holds, None if it cannot be evaluated.
+    '=' and '!=' fall back to text comparison for non-numeric values (e.g., 'up(1)').
+    A trailing '%' is ignored on either side, so a limit stored as '80%' compares as 80.
+    """
+    number, bound = to_float(_strip_percent(value)), to_float(_strip_percent(limit))
+    numeric = not math.isnan(number) and not math.isnan(bound)
+    condition = (condition or '').strip()
+    if condition in ('=', '==', '!='):
+        if numeric:
+            equal = number == bound
+        else:
+            # 'down(2)' matches 'down(2)' and 'down'
+            text, expected = str(value).strip().lower(), str(limit).strip().lower()
+            equal = text == expected or _STATUS_NUMBER.sub('', text).strip() == _STATUS_NUMBER.sub('', expected).strip()
+        return not equal if condition == '!=' else equal
+    if not numeric:
+        return None
+    if condition == '>':
+        return number > bound
+    if condition == '>=':
+        return number >= bound
+    if condition == '<':
+        return number < bound
+    if condition == '<=':
+        return number <= bound
+    return None
+
+
+def step(state, threshold, value, at):
+    """
+    Advances `state` (AlertState) with one sample of the threshold's series.
+    Returns the previous state when `state.state` changed, else None.
+    """
+    if state.last_sample_at is not None and at < state.last_sample_at:
+        # Late row (committed out of order / replayed from the spool): the state already moved past it
+        return None
+    state.last_value, state.last_sample_at = str(value), at
+    alerting = state.state != AlertState.STATE_OK
+    # Hysteresis: while alerting, the condition is checked against the clear value
+    limit = threshold.clear_value if alerting and threshold.clear_value else threshold.value
+    met = condition_met(threshold.condition, value, limit)
+    if met is None:
+        return None
+
+    target = level_state(threshold.alert_level) if met else AlertState.STATE_OK
+    if target == state.state:
+        state.pending_state, state.pending_since = '', None
+        return None
+    if state.pending_state != target or state.pending_since is None:
+        state.pending_state, state.pending_since = target, at
+    if (at - state.pending_since).total_seconds() < threshold.min_duration:
+        return None
+
+    previous = state.state
+    state.state, state.changed_at = target, at
+    state.pending_state, state.pending_since = '', None
+    return previous
+
+
+class HistoryTail:
+    """
+    Reads History rows after an IngestCheckpoint id without losing rows that commit out of id order.
+    Ids missing between rows already read stay open gaps: the checkpoint does not move past the
+    first one, and each pass re-reads the open gaps for late rows. A gap closes once its row was
+    read or after `settle` seconds (a rolled-back insert). Rows are returned once per process;
+    after a restart the rows above the checkpoint are read again.
+    """
+
+    def __init__(self, settle=SETTLE_SECONDS):
+        self.settle = settle
+        self.seen = set()     # Ids above the checkpoint already returned
+        self.gaps = []        # [first id, last id, monotonic time noticed] of ids not read yet
+
+    def read(self, queryset, last_id, batch_size):
+        """
+        Returns (rows in id order, new checkpoint id). `queryset` is a History .values() or
+        .values_list() queryset whose first field is 'id'.
+        """
+        now = time.monotonic()
+        self.seen = {i for i in self.seen if i > last_id}
+        self.gaps = [gap for gap in self.gaps if gap[1] > last_id and now - gap[2] < self.settle]
+        high = max(self.seen, default=last_id)
+
+        rows = []
+        if self.gaps:
+            ranges = Q()
+            for first, last, _ in self.gaps:
+                ranges |= Q(id__range=(first, last))
+            rows = [row for row in queryset.filter(ranges) if _row_id(row) not in self.seen]
+        fresh = list(queryset.filter(id__gt=high).order_by('id')[:batch_size])
+        for row in fresh:
+            row_id = _row_id(row)
+            if row_id > high + 1:
+                self.gaps.append([high + 1, row_id - 1, now])
+            high = row_id
+        rows.extend(fresh)
+        rows.sort(key=_row_id)
+        self.seen.update(_row_id(row) for row in rows)
+
+        # Checkpoint: below the first gap that may still fill
+        for gap in self.gaps:
+            while gap[0] <= gap[1] and gap[0] in self.seen:
+                gap[0] += 1
+        self.gaps = [gap for gap in self.gaps if gap[0] <= gap[1]]
+        checkpoint = min(gap[0] for gap in self.gaps) - 1 if self.gaps else high
+        self.seen = {i for i in self.seen if i > checkpoint}
+        return rows, checkpoint
+
+
+def _row_id(row):
+    return row['id'] if isinstance(row, dict) else row[0]
+
+
+class Evaluator:
+    """Keeps the rules and their states in memory and applies History batches to them."""
+
+    STATE_FIELDS = ['state', 'pending_state', 'pending_since', 'last_value', 'last_sample_at', 'changed_at']
+
+    def __init__(self, notify=None):
+        self.notify = notify  # callable(list of notification dicts); must not block
+        self.tail = HistoryTail()
+        self.rules = {}       # (device_id, metric_id, interface_id) -> [Threshold]
+        self.states = {}      # threshold_id -> AlertState
+        self.version = None
+        self.derived = {}     # raw counter metric_id -> (evaluated metric_id, 'utilization' | 'per_minute')
+        self.counters = {}    # (interface_id, raw metric_id) -> (previous value, previous collection time)
+        self.speeds = {}      # interface_id -> bits per second
+        self.speeds_at = 0.0
+        self.clock = None     # (newest sample time read, monotonic time it was read)
+
+    def load_rules(self):
+        thresholds = list(Threshold.objects.filter(device__retired_at__isnull=True, interface__retired_at__isnull=True)
+                          .select_related('device__user', 'metric', 'interface'))
+        states = AlertState.objects.in_bulk([t.id for t in thresholds])
+        missing = [
+            AlertState(threshold=t, device_id=t.device_id, metric_id=t.metric_id, interface_id=t.interface_id)
+            for t in thresholds if t.id not in states
+        ]
+        AlertState.objects.bulk_create(missing)
+        states.update({state.threshold_id: state for state in missing})
+
+        self.rules = {}
+        for threshold in thresholds:
+            self.rules.setdefault((threshold.device_id, threshold.metric_id, threshold.interface_id), []).append(threshold)
+        self.states = {threshold.id: states[threshold.id] for threshold in thresholds}
+
+        metrics = dict(Metric.objects.filter(metric_name__in=[*UTILIZATION, *UTILIZATION.values(), *ERROR_COUNTERS])
+                       .values_list('metric_name', 'id'))
+        self.derived = {metrics[raw]: (metrics[target], 'utilization')
+                        for raw, target in UTILIZATION.items() if raw in metrics and target in metrics}
+        self.derived.update({metrics[name]: (metrics[name], 'per_minute') for name in ERROR_COUNTERS if name in metrics})
+        self.speeds_at = 0.0
+        logger.info(f"Alert evaluator loaded {len(thresholds)} threshold rule(s).")
+
+    def refresh(self):
+        """Reloads the rules when a Threshold was added, edited or removed."""
+        version, _ = get_version(THRESHOLDS)
+        if version != self.version:
+            self.load_rules()
+            self.version = version
+
+    def refresh_speeds(self):
+        """Re-reads Interface.speed for interfaces with utilization rules (kept fresh by sync_interfaces)."""
+        if time.monotonic() - self.speeds_at < SPEED_REFRESH:
+            return
+        targets = {target for target, kind in self.derived.values()}
+        ids = {interface_id for _, metric_id, interface_id in self.rules if metric_id in targets and interface_id}
+        self.speeds = dict(Interface.objects.filter(id__in=ids).values_list('id', 'speed'))
+        self.speeds_at = time.monotonic()
+
+    def derive(self, sample, target, kind):
+        """
+        Rate-based value of a counter sample, or None (first sample, counter reset, unknown speed).
+        Elapsed time is measured between collection times (History.collected_at); `timestamp` is the
+        poller's cycle slot and is only used for rows written without a collection time.
+        """
+        key = (sample['interface_id'], sample['metric_id'])
+        current = to_float(sample['value'])
+        at = sample['collected_at'] or sample['timestamp']
+        previous = self.counters.get(key)
+        if math.isnan(current) or (previous is not None and at <= previous[1]):
+            return None
+        self.counters[key] = (current, at)
+        if previous is None:
+            return None
+        elapsed = (at - previous[1]).total_seconds()
+        delta = current - previous[0]
+        speed = self.speeds.get(sample['interface_id'])
+        if delta < 0 and previous[0] < COUNTER_WRAP and elapsed > 0:
+            delta += COUNTER_WRAP
+            # A Counter32 wrap only explains the drop if the interface could have counted that much
+            if delta > self.max_delta(kind, speed, elapsed):
+                return None
+        if elapsed <= 0 or delta < 0:
+            return None
+        if kind == 'per_minute':
+            return round(delta / elapsed * 60, 2)
+        return round(delta * 8 / elapsed / speed * 100, 2) if speed else None
+
+    @staticmethod
+    def max_delta(kind, speed, elapsed):
+        """Largest counter increase the interface can make in `elapsed` seconds at line rate."""
+        if not speed:
+            # Unknown speed: only a counter that was in its upper half can have wrapped
+            return COUNTER_WRAP / 2
+        octets = speed / 8 * elapsed * WRAP_MARGIN
+        return octets if kind == 'utilization' else octets / MIN_FRAME
+
+    def sample_now(self):
+        """Current time on the poller's clock (the sample times), or None before any sample was read."""
+        if self.clock is None:
+            return None
+        newest, read_at = self.clock
+        return newest + timedelta(seconds=time.monotonic() - read_at)
+
+    def process(self, samples):
+        """Applies samples (History.values() dicts, in id order). Returns (touched states, new events)."""
+        touched, events = {}, []
+        newest = max((sample.get('collected_at') or sample['timestamp'] for sample in samples), default=None)
+        if newest is not None and (self.clock is None or newest > self.sample_now()):
+            self.clock = (newest, time.monotonic())
+        for sample in samples:
+            derived = self.derived.get(sample['metric_id']) if sample['interface_id'] else None
+            if derived and (sample['device_id'], derived[0], sample['interface_id']) in self.rules:
+                value = self.derive(sample, *derived)
+                if value is None:
+                    continue
+                sample = {**sample, 'metric_id': derived[0], 'value': value}
+            for threshold in self.rules.get((sample['device_id'], sample['metric_id'], sample['interface_id']), ()):
+                state = self.states[threshold.id]
+                previous = step(state, threshold, sample['value'], sample['timestamp'])
+                touched[threshold.id] = state
+                if previous is not None:
+                    events.append(self.event(threshold, state, previous, sample['value'], sample['timestamp']))
+        return list(touched.values()), events
+
+    def promote(self, now):
+        """
+        Applies pending status transitions whose min_duration has passed by `now` (sample_now(),
+        the clock the pending times come from). The poller writes ifAdminStatus / ifOperStatus rows
+        only on a change (and a daily keep-alive), so no new sample would arrive to confirm them.
+        Returns (touched states, new events).
+        """
+        touched, events = [], []
+        if now is None:
+            return touched, events
+        for rules in self.rules.values():
+            for threshold in rules:
+                state = self.states[threshold.id]
+                if not state.pending_state or state.pending_since is None or threshold.metric.metric_name not in CHANGE_ONLY_METRICS:
+                    continue
+                held = state.pending_since + timedelta(seconds=threshold.min_duration)
+                if held > now:
+                    continue
+                previous = state.state
+                state.state, state.changed_at = state.pending_state, held
+                state.pending_state, state.pending_since = '', None
+                touched.append(state)
+                events.append(self.event(threshold, state, previous, state.last_value, held))
+        return touched, events
+
+    @staticmethod
+    def event(threshold, state, previous, value, at):
+        return AlertEvent(
+            kind=AlertEvent.KIND_THRESHOLD, threshold=threshold, device_id=threshold.device_id,
+            metric_id=threshold.metric_id, interface_id=threshold.interface_id,
+            from_state=previous, to_state=state.state, value=str(value), sample_at=at,
+            message=f"{threshold.device.hostname}"
+                    f"{' ' + (threshold.interface.ifName or str(threshold.interface.ifIndex)) if threshold.interface_id else ''} "
+                    f"{threshold.metric.metric_name} "
+                    f"{value} {threshold.condition} {threshold.value}: {previous} -> {state.state}",
+        )
+
+    def checkpoint(self):
+        checkpoint = IngestCheckpoint.objects.filter(name=CHECKPOINT).first()
+        if checkpoint is None:
+            # First run: start from the newest sample instead of replaying all history
+            start = History.objects.aggregate(last=Max('id'))['last'] or 0
+            checkpoint = IngestCheckpoint.objects.create(name=CHECKPOINT, last_id=start)
+        return checkpoint
+
+    def run_once(self, batch_size=BATCH_SIZE):
+        """Evaluates the next batch of samples. Returns (samples read, events written)."""
+        self.refresh()
+        self.refresh_speeds()
+        checkpoint = self.checkpoint()
+        samples, last_id = self.tail.read(
+            History.objects.values('id', 'device_id', 'metric_id', 'interface_id', 'value', 'timestamp', 'collected_at'),
+            checkpoint.last_id, batch_size,
+        )
+        states, events = self.process(samples)
+        promoted, promoted_events = self.promote(self.sample_now())
+        states, events = list({state.threshold_id: state for state in states + promoted}.values()), events + promoted_events
+        if not states and last_id == checkpoint.last_id:
+            return len(samples), []
+
+        with transaction.atomic():
+            AlertState.objects.bulk_update(states, self.STATE_FIELDS, batch_size=500)
+            AlertEvent.objects.bulk_create(events)
+            IngestCheckpoint.objects.filter(pk=checkpoint.pk).update(last_id=last_id)
+            # Dashboards show the new status through the live stream and device list
+            # (interface rule changes are sent as 'metrics' so the stream includes the interfaces)
+            changes = {}
+            for event in events:
+                kind = DeviceChange.KIND_METRICS if event.interface_id else DeviceChange.KIND_METADATA
+                if changes.get(event.device_id, (None, None))[1] != DeviceChange.KIND_METRICS:
+                    changes[event.device_id] = (event.threshold.device.user_id, kind)
+            DeviceChange.objects.bulk_create([
+                DeviceChange(device_id=device_id, owner_id=owner_id, kind=kind)
+                for device_id, (owner_id, kind) in changes.items()
+            ])
+        if events:
+            bump_version(DEVICES)
+            if self.notify is not None:
+                self.notify([notification(event, event.threshold) for event in events])
+        return len(samples), events
@@ -0,0 +1,288 @@
+""" Fleet-wide anomaly detection (`manage.py detect_anomalies`).
+
+    Every numeric (device, metric, interface) series keeps a rolling
+    baseline: an EWMA level and an EWMA of the absolute deviation (a
+    streaming MAD), plus the same pair per local hour of day so "CPU at 14:00
+    on this router" is compared with earlier afternoons. Counter metrics
+    (Bandwidth In/Out) are scored as per-second rates.
+
+    All baselines live in one set of NumPy arrays (one row per series) saved
+    as a compact .npz file, so each cycle scores the whole fleet with a few
+    vectorized operations: robust z = (x - expected) / (1.2533 * MAD). A
+    series enters the anomalous state at |z| >= Z_ENTER and leaves it below
+    Z_EXIT; both transitions are written as AlertEvent(kind='anomaly').
+
+    New samples are read by History id from IngestCheckpoint('anomaly'),
+    through the same out-of-order-safe tail as the alert evaluator. """
+
+import logging
+import math
+import os
+import tempfile
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .alerting import HistoryTail
+from .models import AlertEvent, AlertState, Device, History, IngestCheckpoint, Interface, Metric
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+CHECKPOINT = 'anomaly'          # IngestCheckpoint name
+BATCH_SIZE = 200000             # History rows read per pass
+BASELINE_PATH = getattr(settings, 'ANOMALY_BASELINE_PATH', 'anomaly_baselines.npz')
+COUNTER_METRICS = ('Bandwidth In', 'Bandwidth Out')   # Scored as per-second rates
+ALPHA = 0.05                    # EWMA weight of a new sample (overall baseline)
+SEASON_ALPHA = 0.2              # EWMA weight within one hour-of-day slot
+ANOMALY_WEIGHT = 0.1            # Anomalous samples move the baseline this much slower
+WARMUP = 30                     # Samples before a series is scored
+SEASON_MIN = 5                  # Samples in an hour slot before it replaces the overall baseline
+Z_ENTER = 4.0                   # |z| that starts an anomaly
+Z_EXIT = 3.0                    # |z| below which it ends (hysteresis)
+MIN_SCALE = 0.02                # Spread floor, relative to the expected value (flat series)
+# ---------------------------------------------------------------------------------
+
+MAD_TO_SIGMA = math.sqrt(math.pi / 2)   # Mean absolute deviation -> standard deviation (normal data)
+HOURS = 24
+
+
+class Baselines:
+    """Per-series baseline arrays; row i belongs to keys[i] = (device_id, metric_id, interface_id or 0)."""
+
+    FIELDS = {
+        'keys': (np.int64, (3,)),
+        'count': (np.uint32, ()),
+        'level': (np.float64, ()),
+        'spread': (np.float64, ()),
+        'season': (np.float32, (HOURS,)),
+        'season_spread': (np.float32, (HOURS,)),
+        'season_count': (np.uint16, (HOURS,)),
+        'last_raw': (np.float64, ()),     # Counter series: previous raw value and its time
+        'last_at': (np.float64, ()),
+        'anomalous': (np.bool_, ()),
+    }
+
+    def __init__(self, arrays=None):
+        arrays = arrays or {}
+        for name, (dtype, shape) in self.FIELDS.items():
+            setattr(self, name, np.asarray(arrays[name], dtype=dtype) if name in arrays
+                    else np.zeros((0,) + shape, dtype=dtype))
+        self.index = {tuple(key): row for row, key in enumerate(self.keys.tolist())}
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def load(cls, path=BASELINE_PATH):
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def save(self, path=BASELINE_PATH):
+        """Writes all arrays to `path` atomically (temporary file + rename)."""
+        directory = os.path.dirname(os.path.abspath(path))
+        handle, temp = tempfile.mkstemp(dir=directory, suffix='.npz')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.savez(f, **{name: getattr(self, name) for name in self.FIELDS})
+            os.replace(temp, path)
+        except Exception:
+            os.unlink(temp)
+            raise
+
+    def rows(self, keys):
+        """Row numbers for a list of key tuples; unknown series get new, empty rows."""
+        new = [key for key in dict.fromkeys(keys) if key not in self.index]
+        if new:
+            start = len(self)
+            for name, (dtype, shape) in self.FIELDS.items():
+                fill = np.zeros((len(new),) + shape, dtype=dtype)
+                if name in ('last_raw', 'last_at'):
+                    fill[:] = np.nan
+                setattr(self, name, np.concatenate([getattr(self, name), fill]))
+            self.keys[start:] = new
+            self.index.update({key: start + i for i, key in enumerate(new)})
+        return np.fromiter((self.index[key] for key in keys), dtype=np.int64, count=len(keys))
+
+    def keep_devices(self, device_ids):
+        """Drops the series of devices that no longer exist."""
+        keep = np.isin(self.keys[:, 0], np.fromiter(device_ids, dtype=np.int64)) if len(self) else np.zeros(0, bool)
+        if not keep.all():
+            for name in self.FIELDS:
+                setattr(self, name, getattr(self, name)[keep])
+            self.index = {tuple(key): row for row, key in enumerate(self.keys.tolist())}
+
+    def score(self, rows, values, at, hours, counter):
+        """
+        Scores and learns one sample per row (rows must be unique). Returns arrays aligned
+        with `rows`: (z, entered, cleared, expected, sigma, scored values: the rate for counters);
+        z is NaN where nothing was scored.
+        """
+        # Counters: convert to a rate against the previous raw value (resets and wraps are skipped)
+        if counter.any():
+            raw = values.copy()
+            elapsed = at - self.last_at[rows]
+            rate = (values - self.last_raw[rows]) / np.where(elapsed > 0, elapsed, np.nan)
+            values = np.where(counter, rate, values)
+            # A late (older) sample must not replace the newer reference value
+            late = counter & (elapsed <= 0)
+            self.last_raw[rows] = np.where(late, self.last_raw[rows], np.where(counter, raw, np.nan))
+            self.last_at[rows] = np.where(late, self.last_at[rows], np.where(counter, at, np.nan))
+        usable = ~np.isnan(values) & ~(counter & (values < 0))
+
+        level, spread, count = self.level[rows], self.spread[rows], self.count[rows]
+        season = self.season[rows, hours].astype(np.float64)
+        season_spread = self.season_spread[rows, hours].astype(np.float64)
+        season_count = self.season_count[rows, hours]
+
+        seasonal = season_count >= SEASON_MIN
+        expected = np.where(seasonal, season, level)
+        scale = MAD_TO_SIGMA * np.where(seasonal, season_spread, spread)
+        scale = np.maximum(scale, MIN_SCALE * np.abs(expected) + 1e-6)
+        with np.errstate(invalid='ignore'):
+            z = np.where(usable & (count >= WARMUP), (values - expected) / scale, np.nan)
+        distance = np.abs(z)
+
+        was = self.anomalous[rows]
+        with np.errstate(invalid='ignore'):
+            now = np.where(np.isnan(z), was, (distance >= Z_ENTER) | (was & (distance >= Z_EXIT)))
+        self.anomalous[rows] = now
+
+        # Learn: first sample seeds the level, anomalous samples count for less
+        weight = np.where(now, ANOMALY_WEIGHT, 1.0)
+        first = count == 0
+        alpha = np.where(first, 1.0, ALPHA * weight)
+        deviation = np.where(first, 0.0, np.abs(values - level))
+        new_level = np.where(usable, level + alpha * (values - level), level)
+        new_spread = np.where(usable & ~first, spread + ALPHA * weight * (deviation - spread), spread)
+
+        season_first = season_count == 0
+        season_alpha = np.where(season_first, 1.0, SEASON_ALPHA * weight)
+        season_deviation = np.where(season_first, np.abs(values - new_level), np.abs(values - season))
+        new_season = np.where(usable, season + season_alpha * (values - season), season)
+        new_season_spread = np.where(usable, season_spread + season_alpha * (season_deviation - season_spread),
+                                     season_spread)
+
+        self.level[rows], self.spread[rows] = new_level, new_spread
+        self.count[rows] = count + usable
+        self.season[rows, hours] = new_season
+        self.season_spread[rows, hours] = new_season_spread
+        self.season_count[rows, hours] = np.minimum(season_count.astype(np.int64) + usable, np.iinfo(np.uint16).max)
+
+        return z, now & ~was, was & ~now, expected, scale, values
+
+
+def _plain_float(raw):
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class Detector:
+    """Reads new History rows, scores them against the baselines and writes anomaly events."""
+
+    def __init__(self, path=BASELINE_PATH):
+        self.path = path
+        self.baselines = Baselines.load(path)
+        self.baselines.keep_devices(Device.objects.filter(retired_at__isnull=True).values_list('id', flat=True))
+        self.counter_metrics = set()
+        self.tail = HistoryTail()
+
+    def checkpoint(self):
+        checkpoint = IngestCheckpoint.objects.filter(name=CHECKPOINT).first()
+        if checkpoint is None:
+            # First run: learn from new samples only
+            start = History.objects.aggregate(last=Max('id'))['last'] or 0
+            checkpoint = IngestCheckpoint.objects.create(name=CHECKPOINT, last_id=start)
+        return checkpoint
+
+    def run_once(self, batch_size=BATCH_SIZE):
+        """Scores the next batch of samples. Returns (samples read, events written)."""
+        self.counter_metrics = set(Metric.objects.filter(metric_name__in=COUNTER_METRICS).values_list('id', flat=True))
+        checkpoint = self.checkpoint()
+        samples, last_id = self.tail.read(
+            History.objects.values_list('id', 'device_id', 'metric_id', 'interface_id', 'value', 'timestamp',
+                                        'collected_at'),
+            checkpoint.last_id, batch_size,
+        )
+        if not samples:
+            if last_id != checkpoint.last_id:
+                IngestCheckpoint.objects.filter(pk=checkpoint.pk).update(last_id=last_id)
+            return 0, []
+
+        values = np.fromiter((_plain_float(s[4]) for s in samples), dtype=np.float64, count=len(samples))
+        numeric = np.flatnonzero(~np.isnan(values))
+        events = self.process([samples[i] for i in numeric], values[numeric])
+
+        self.baselines.save(self.path)
+        with transaction.atomic():
+            AlertEvent.objects.bulk_create(events)
+            IngestCheckpoint.objects.filter(pk=checkpoint.pk).update(last_id=last_id)
+        if events:
+            logger.info(f"Anomaly detection: {len(events)} event(s) from {len(samples)} sample(s).")
+        return len(samples), events
+
+    def process(self, samples, values):
+        """Scores numeric samples (History value tuples in id order). Returns unsaved AlertEvents."""
+        if not samples:
+            return []
+        keys = [(s[1], s[2], s[3] or 0) for s in samples]
+        rows = self.baselines.rows(keys)
+        # Rates are measured between collection times; the slot `timestamp` only for rows without one
+        at = np.fromiter(((s[6] or s[5]).timestamp() for s in samples), dtype=np.float64, count=len(samples))
+        offset = timezone.localtime(timezone.now()).utcoffset().total_seconds()
+        hours = ((at + offset) // 3600 % HOURS).astype(np.int64)
+        counter = np.fromiter((s[2] in self.counter_metrics for s in samples), dtype=np.bool_, count=len(samples))
+
+        # A series may have several samples in one batch: score them in rounds,
+        # round k holding the k-th sample of every series (one vectorized pass each)
+        order = np.argsort(rows, kind='stable')
+        sorted_rows = rows[order]
+        starts = np.flatnonzero(np.r_[True, sorted_rows[1:] != sorted_rows[:-1]])
+        rank = np.empty(len(rows), dtype=np.int64)
+        rank[order] = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+
+        found = []
+        for k in range(int(rank.max()) + 1):
+            pick = np.flatnonzero(rank == k)
+            z, entered, cleared, expected, sigma, scored = self.baselines.score(
+                rows[pick], values[pick], at[pick], hours[pick], counter[pick])
+            for i in np.flatnonzero(entered | cleared):
+                found.append((pick[i], bool(entered[i]), z[i], expected[i], sigma[i], scored[i]))
+        return self._events(samples, found, hours)
+
+    def _events(self, samples, found, hours):
+        if not found:
+            return []
+        devices = Device.objects.in_bulk({samples[i][1] for i, *_ in found})
+        metrics = Metric.objects.in_bulk({samples[i][2] for i, *_ in found})
+        interfaces = Interface.objects.in_bulk({samples[i][3] for i, *_ in found if samples[i][3]})
+        events = []
+        for i, entered, z, expected, sigma, value in found:
+            _, device_id, metric_id, interface_id, raw, at, _ = samples[i]
+            if device_id not in devices or metric_id not in metrics:
+                continue
+            target = devices[device_id].hostname
+            if interface_id in interfaces:
+                target += f" {interfaces[interface_id].ifName}"
+            counter = metric_id in self.counter_metrics
+            metric = metrics[metric_id].metric_name + (' rate' if counter else '')
+            if entered:
+                message = (f"{target} {metric} {value:.4g} is unusual for {int(hours[i]):02d}:00 "
+                           f"(expected {expected:.4g} ± {sigma:.2g}, z={z:+.1f})")
+            else:
+                message = f"{target} {metric} {value:.4g} is back to normal (expected {expected:.4g})"
+            normal, unusual = AlertState.STATE_OK, AlertState.STATE_WARNING
+            events.append(AlertEvent(
+                kind=AlertEvent.KIND_ANOMALY, device_id=device_id, metric_id=metric_id,
+                interface_id=interface_id if interface_id in interfaces else None,
+                from_state=normal if entered else unusual, to_state=unusual if entered else normal,
+                value=f"{value:.6g}" if counter else str(raw), sample_at=at, message=message[:255],
+            ))
+        return events
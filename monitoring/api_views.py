@@ -8,6 +8,10 @@ from rest_framework import status
 
 from .models import Device, DeviceModel, Interface, Brand, DeviceType
 from .serializers import DeviceRegistrationSerializer, BrandSerializer, DeviceTypeSerializer, DeviceModelSimpleSerializer
+from . import response_cache
+from .response_cache import cached_json_response
+from . import bulk_register
+from . import jobs
 
 # @csrf_exempt # Allows POST requests from the React frontend without a CSRF token
 @api_view(['GET'])
@@ -17,17 +21,20 @@ def get_device_metadata(request):
     API endpoint to fetch all pre-filled data (Brands, Types, Models)
     needed for the frontend dropdowns.
     """
-    try:
+    def build():
         brands = Brand.objects.all()
         types = DeviceType.objects.all()
-        models = DeviceModel.objects.all()
+        models = DeviceModel.objects.select_related('brand', 'type')
 
-        data = {
+        return {
             'brands': BrandSerializer(brands, many=True).data,
             'types': DeviceTypeSerializer(types, many=True).data,
             'models': DeviceModelSimpleSerializer(models, many=True).data,
         }
-        return Response(data, status=status.HTTP_200_OK)
+
+    try:
+        # Served from the versioned cache until a Brand/Type/Model changes
+        return cached_json_response(request, 'metadata', response_cache.METADATA, build)
         
     except Exception as e:
         return Response(
@@ -62,9 +69,18 @@ def confirm_add_device(request):
     # snmp_user = snmpv3_credentials.get('snmp_user', '')
     # auth_pass = snmpv3_credentials.get('auth_pass', '')
     # priv_pass = snmpv3_credentials.get('priv_pass', '')
-    snmp_user = raw_data['data']['snmpv3_credentials'].get('snmp_user', '')
-    auth_pass = raw_data['data']['snmpv3_credentials'].get('auth_pass', '')
-    priv_pass = raw_data['data']['snmpv3_credentials'].get('priv_pass', '')
+    # A background discovery keeps them on its job (never sent to the client)
+    discovery_job = raw_data['data'].get('discovery_job')
+    credentials = raw_data['data'].get('snmpv3_credentials')
+    if credentials is None:
+        credentials = jobs.discovery_credentials(request.user, discovery_job, ip_address) if discovery_job else None
+        if credentials is None:
+            return Response({
+                'detail': 'The discovery of this device has expired or was already used. Please discover it again.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    snmp_user = credentials.get('snmp_user', '')
+    auth_pass = credentials.get('auth_pass', '')
+    priv_pass = credentials.get('priv_pass', '')
     
     # --- EXTRACT INTERFACE DATA ---
     # Extract the three lists: indexes, names, and statuses (assuming they are all the same length)
@@ -140,6 +156,10 @@ def confirm_add_device(request):
             # 2.3 Bulk create interfaces
             Interface.objects.bulk_create(interface_objects)
 
+            # 2.4 The credentials now live (encrypted) on the device only
+            if discovery_job and 'snmpv3_credentials' not in raw_data['data']:
+                jobs.forget_credentials(discovery_job)
+
         return Response({
             'detail': 'Device and interfaces successfully registered.',
             'device_id': new_device.id,
@@ -159,4 +179,47 @@ def confirm_add_device(request):
         print(f"Unexpected Error: {e}")
         return Response({
             'detail': 'An unexpected error occurred during device registration.'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_register_devices(request):
+    """
+    API endpoint to register many devices at once.
+    Accepts a JSON list (or {"devices": [...]}), a `text/csv` body, or a CSV/JSON
+    upload in the multipart field `file`. Add `?dry_run=1` to only validate.
+
+    Rows that fail validation or insertion are reported individually; all
+    other rows are still registered.
+    """
+    try:
+        # Checked first: a raw CSV body has no DRF parser, so request.data must not be touched
+        if request.content_type.startswith('text/csv'):
+            rows = bulk_register.parse_rows(request.body, 'text/csv')
+        elif 'file' in request.FILES:
+            upload = request.FILES['file']
+            rows = bulk_register.parse_rows(upload.read(), upload.content_type or '')
+        else:
+            rows = request.data.get('devices', []) if isinstance(request.data, dict) else request.data
+    except (ValueError, UnicodeDecodeError) as e:
+        return Response({'detail': f'Could not parse the device list: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not isinstance(rows, list) or not rows:
+        return Response({'detail': 'Expected a non-empty list of devices.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    dry_run = request.query_params.get('dry_run') in ('1', 'true')
+    outcome = bulk_register.register_devices(rows, user=request.user, dry_run=dry_run)
+
+    if not outcome['errors']:
+        response_status = status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED
+    elif outcome['created']:
+        response_status = status.HTTP_207_MULTI_STATUS  # Partial success
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response({
+        'detail': f"{len(outcome['created'])} device(s) {'valid' if dry_run else 'registered'}, "
+                  f"{len(outcome['errors'])} row(s) rejected.",
+        'dry_run': dry_run,
+        **outcome,
+    }, status=response_status)
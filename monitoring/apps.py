@@ -4,3 +4,7 @@ class MonitoringConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'monitoring'
     verbose_name = "Monitoring System"
+
+    def ready(self):
+        # Connect model signal handlers (change feed)
+        from . import signals  # noqa: F401
@@ -0,0 +1,183 @@
+""" Bulk device registration (`POST /api/device/bulk-register/` and `manage.py import_devices`).
+
+    All rows are validated up front with a handful of queries (existing IPs,
+    model lookup), credentials are encrypted before any transaction opens,
+    and Device / Interface rows are written with bulk_create in chunked
+    transactions. A row that fails never aborts the batch: it is reported
+    with its row number and the remaining rows are still registered. """
+
+import csv
+import io
+import json
+
+from django.db import IntegrityError, transaction
+
+from .models import Device, DeviceModel, Interface, DeviceChange
+from .serializers import BulkDeviceRowSerializer
+from .response_cache import bump_version, DEVICES
+
+# --- CONFIGURATION ---
+CHUNK_SIZE = 200       # Devices written per transaction
+MAX_ROWS = 5000        # Rows accepted per import
+LOOKUP_BATCH = 1000    # Values per `IN (...)` lookup
+# ---------------------------------------------------------------------------------
+
+
+def parse_csv(text):
+    """CSV with a header row (ip_address, hostname, model_id or model_name, snmp_user, ...) -> list of dicts."""
+    reader = csv.DictReader(io.StringIO(text.lstrip('\ufeff')))
+    return [
+        {key.strip(): (value or '').strip() for key, value in row.items() if key and value not in (None, '')}
+        for row in reader
+    ]
+
+
+def parse_rows(content, content_type=''):
+    """Reads a CSV or JSON document (a list, or {"devices": [...]}) into a list of row dicts."""
+    text = content.decode('utf-8-sig') if isinstance(content, bytes) else content
+    if 'json' in content_type or text.lstrip()[:1] in ('[', '{'):
+        data = json.loads(text)
+        return data.get('devices', []) if isinstance(data, dict) else data
+    return parse_csv(text)
+
+
+def _in_batches(values):
+    values = list(values)
+    for start in range(0, len(values), LOOKUP_BATCH):
+        yield values[start:start + LOOKUP_BATCH]
+
+
+def validate_rows(rows):
+    """
+    Returns (valid, errors). Each valid row is the cleaned data plus 'row' (1-based
+    position) and the resolved 'model'; each error is {'row', 'ip_address', 'errors'}.
+    """
+    valid, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        serializer = BulkDeviceRowSerializer(data=row)
+        if serializer.is_valid():
+            valid.append({**serializer.validated_data, 'row': number})
+        else:
+            ip = row.get('ip_address') if isinstance(row, dict) else None
+            errors.append({'row': number, 'ip_address': ip, 'errors': serializer.errors})
+
+    # Models: one query for all ids, one for all names
+    models_by_id = DeviceModel.objects.in_bulk({r['model_id'] for r in valid if r.get('model_id')})
+    models_by_name = {}
+    for model in DeviceModel.objects.filter(model_name__in={r['model_name'] for r in valid if not r.get('model_id')}):
+        models_by_name.setdefault(model.model_name, []).append(model)
+
+    # Devices already registered
+    existing = set()
+    for batch in _in_batches({r['ip_address'] for r in valid}):
+        existing.update(Device.objects.filter(ip_address__in=batch).values_list('ip_address', flat=True))
+
+    checked, seen = [], {}
+    for row in valid:
+        problem = None
+        if row.get('model_id'):
+            row['model'] = models_by_id.get(row['model_id'])
+            if row['model'] is None:
+                problem = {'model_id': [f"DeviceModel with ID {row['model_id']} not found."]}
+        else:
+            matches = models_by_name.get(row['model_name'], [])
+            if len(matches) != 1:
+                reason = 'not found' if not matches else 'is ambiguous; use model_id'
+                problem = {'model_name': [f"DeviceModel '{row['model_name']}' {reason}."]}
+            else:
+                row['model'] = matches[0]
+        if problem is None and row['ip_address'] in existing:
+            problem = {'ip_address': [f"A device with IP address {row['ip_address']} already exists."]}
+        if problem is None and row['ip_address'] in seen:
+            problem = {'ip_address': [f"Duplicate of row {seen[row['ip_address']]}."]}
+
+        if problem:
+            errors.append({'row': row['row'], 'ip_address': row['ip_address'], 'errors': problem})
+        else:
+            seen[row['ip_address']] = row['row']
+            checked.append(row)
+
+    errors.sort(key=lambda error: error['row'])
+    return checked, errors
+
+
+def _build_device(row, user):
+    device = Device(
+        hostname=row['hostname'],
+        ip_address=row['ip_address'],
+        subnet_mask=row.get('subnet_mask') or None,
+        model=row['model'],
+        user=user,
+        username=row['snmp_user'],
+    )
+    # Encrypted here, before the transaction, so the write path is only INSERTs
+    if row.get('auth_pass'):
+        device.set_snmp_password(row['auth_pass'])
+    if row.get('priv_pass'):
+        device.set_snmp_aes_passwd(row['priv_pass'])
+    return device
+
+
+def _insert_chunk(chunk):
+    """Writes one chunk of (row, device) pairs; must run inside a transaction."""
+    Device.objects.bulk_create([device for _, device in chunk])
+    # MySQL does not return primary keys from bulk_create: read them back by IP
+    ids = dict(Device.objects.filter(ip_address__in=[device.ip_address for _, device in chunk])
+               .values_list('ip_address', 'id'))
+    interfaces, changes, created = [], [], []
+    for row, device in chunk:
+        device.id = ids[device.ip_address]
+        interfaces.extend(
+            Interface(device_id=device.id, ifIndex=index, ifName=name)
+            for index, name in row.get('interfaces') or []
+        )
+        # bulk_create skips post_save, so feed the change stream here
+        changes.append(DeviceChange(device_id=device.id, owner_id=device.user_id, kind=DeviceChange.KIND_METADATA))
+        created.append({'row': row['row'], 'id': device.id, 'ip_address': device.ip_address,
+                        'hostname': device.hostname, 'interfaces': len(row.get('interfaces') or [])})
+    Interface.objects.bulk_create(interfaces, batch_size=1000)
+    DeviceChange.objects.bulk_create(changes)
+    return created
+
+
+def register_devices(rows, user=None, chunk_size=CHUNK_SIZE, dry_run=False):
+    """
+    Validates and registers `rows` (list of dicts). Returns
+    {'created': [{row, id, ip_address, hostname, interfaces}], 'errors': [{row, ip_address, errors}]}.
+    With dry_run, only validation runs ('created' lists the rows that would be created).
+    """
+    if len(rows) > MAX_ROWS:
+        return {'created': [], 'errors': [{'row': None, 'ip_address': None,
+                                           'errors': {'non_field_errors': [f"At most {MAX_ROWS} rows per import."]}}]}
+
+    valid, errors = validate_rows(rows)
+    if dry_run:
+        return {'created': [{'row': r['row'], 'id': None, 'ip_address': r['ip_address'], 'hostname': r['hostname'],
+                             'interfaces': len(r.get('interfaces') or [])} for r in valid],
+                'errors': errors}
+
+    owner = user if user is not None and user.is_authenticated else None
+    pairs = [(row, _build_device(row, owner)) for row in valid]
+
+    created = []
+    for start in range(0, len(pairs), chunk_size):
+        chunk = pairs[start:start + chunk_size]
+        try:
+            with transaction.atomic():
+                created.extend(_insert_chunk(chunk))
+        except IntegrityError:
+            # Something changed since validation (e.g., a concurrent registration):
+            # retry the chunk row by row so only the conflicting rows fail
+            for row, device in chunk:
+                device.pk = None
+                try:
+                    with transaction.atomic():
+                        created.extend(_insert_chunk([(row, device)]))
+                except IntegrityError as e:
+                    errors.append({'row': row['row'], 'ip_address': row['ip_address'],
+                                   'errors': {'non_field_errors': [f"Database error: {e}"]}})
+
+    if created:
+        bump_version(DEVICES)
+    errors.sort(key=lambda error: error['row'] or 0)
+    return {'created': created, 'errors': errors}
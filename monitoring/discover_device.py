@@ -1,5 +1,6 @@
-""" This script discovers a network device via ICMP and SNMP
-    using the system's commands via subprocess """
+""" This script discovers a network device via ICMP and SNMP.
+    SNMP requests go through shared in-process SNMPv3 sessions (snmpv3.py):
+    after the first request to a device, each one is a single round trip. """
 
 # ----- How to use -----
 # Go to the directory where the script is located
@@ -17,26 +18,45 @@
 
 # Import necessary libraries
 import subprocess
-import re
 import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from . import icmp_prober, snmpv3
+except ImportError:  # Run as a standalone script
+    import icmp_prober
+    import snmpv3
 
 # --- CONFIGURATION ---
 SNMP_USER = "ADMIN"
 AUTH_PASS = "!frqAIRNAV"   # The actual, plaintext Auth Password
 PRIV_PASS = "!frqAIRNAV"   # The actual, plaintext Priv Password
-AUTH_PROTO = "sha"
-PRIV_PROTO = "aes"
-SEC_LEVEL = "authPriv"
+# SNMPv3 authPriv with SHA + AES-128 (the only combination snmpv3.py speaks)
 # ---------------------------------------------------------------------------------
 
-def run_ping(ip_address):
-    """Pings the IP address using the native Linux 'ping' command."""
+# Failures reported as "SNMP Error: ..." values (agent errors, timeouts, bad addresses or OIDs)
+SNMP_ERRORS = (snmpv3.SnmpError, OSError, ValueError)
+
+def run_ping(ip_address, count=3, deadline=10):
+    """Pings the IP address (in-process ICMP when allowed, otherwise the native Linux 'ping' command)."""
     # Output: (success: bool, message: str)
 
     print(f"Pinging {ip_address}...")
-    # Ping 3x (-c 3) and wait 10 second for timeout (-w 10)
-    command = ['ping', '-c', '3', '-w', '10', ip_address]
+    if icmp_prober.available():
+        try:
+            timeout = max(1.0, deadline - icmp_prober.INTERVAL * (count - 1))
+            result = icmp_prober.ping_hosts([ip_address], count=count, timeout=timeout)[ip_address]
+        except Exception as e:
+            return False, f"Ping execution error: {e}"
+        if result['error']:
+            return False, result['error']
+        if not result['received']:
+            return False, "Device is unreachable via ICMP (ping failed)."
+        return True, f"Device is reachable ({result['loss']}% loss, avg RTT {result['rtt_avg']} ms)."
+
+    # Ping 3x (-c 3) and wait 10 second for timeout (-w 10) by default
+    command = ['ping', '-c', str(count), '-w', str(deadline), ip_address]
     
     try:
         result = subprocess.run(command, capture_output=True, text=True, check=False)
@@ -49,76 +69,121 @@ def run_ping(ip_address):
     except Exception as e:
         return False, f"Ping command execution error: {e}"
 
-def run_snmp(snmp_command, snmp_user, auth_pass, priv_pass, ip_address, oid):
-    """Runs snmpget with the SNMPv3 credentials to retrieve a value and its type."""
-    # Output: (value, type)
-    # This relies on AlmaLinux host having the snmpget tool and MIBs configured.
+def run_snmp(snmp_command, snmp_user, auth_pass, priv_pass, ip_address, oid, retries=3, timeout=5):
+    """Runs an SNMPv3 get, getnext or walk of one OID to retrieve a value and its type."""
+    # Output: (value, type), or ([values], "LIST") for a walk
 
     if snmp_command.lower() not in ['snmpget', 'snmpgetnext', 'snmpwalk']:
         return f"SNMP Error: Invalid SNMP command: {snmp_command}", None
+    if snmp_command.lower() != 'snmpwalk':
+        return run_snmp_varbinds(snmp_command, snmp_user, auth_pass, priv_pass, ip_address, [oid], retries, timeout)[0]
+
+    try:
+        with snmpv3.session(ip_address, snmp_user, auth_pass, priv_pass) as session:
+            varbinds = session.walk(oid, timeout=timeout, retries=retries)
+    except SNMP_ERRORS as e:
+        return f"SNMP Error: {e}", None
+    extracted_data = [snmpv3.text(value) for _, value in varbinds]
+    if not extracted_data:
+        return "SNMP Error: No values found for OID.", None
+    return extracted_data, "LIST"
+
+def run_snmp_varbinds(snmp_command, snmp_user, auth_pass, priv_pass, ip_address, oids, retries=3, timeout=5):
+    """Runs one get/getnext request carrying several OIDs (one round trip instead of one per OID)."""
+    # Output: [(value, type), ...] in the order of `oids`; a failed varbind gets ("SNMP Error: ...", None)
 
-    command = [
-        snmp_command, '-v', '3',
-        '-l', SEC_LEVEL,
-        # '-u', SNMP_USER,
-        '-u', snmp_user,
-        '-a', AUTH_PROTO,
-        # '-A', AUTH_PASS, # Plaintext password
-        '-A', auth_pass, # Plaintext password
-        '-x', PRIV_PROTO,
-        # '-X', PRIV_PASS, # Plaintext password
-        '-X', priv_pass, # Plaintext password
-        '-r', '3',  # Retry count
-        '-t', '5',  # Timeout in seconds
-        ip_address,
-        oid
-    ]
+    methods = {'snmpget': 'get', 'snmpgetnext': 'get_next'}
+    if snmp_command.lower() not in methods:
+        return [(f"SNMP Error: Invalid SNMP command: {snmp_command}", None)] * len(oids)
 
     try:
-        result = subprocess.run(command, capture_output=True, text=True, timeout=60)
-        if result.returncode != 0:
-            # Return detailed error for debugging
-            return f"SNMP Error: {result.stderr.strip()}", None
-        
-        # Parsing output if command is SNMPGET
-        if command[0] == 'snmpget' or command[0] == 'snmpgetnext':
-            # Regex pattern: "=<group1>:<group2>" (e.g., 'OID: cisco2811' or 'STRING: Hostname')
-            match = re.search(r'=\s+(.*?):\s+(.*)', result.stdout.strip())
-            if match:
-                # Group 1 is the type (e.g., STRING), Group 2 is the value
-                return match.group(2).strip().strip('"'), match.group(1).strip().strip('"')
-            return "SNMP Error: No OID Found", None
-        
-        # Parsing output if command is SNMPWALK
-        elif command[0] == 'snmpwalk':
-            output_lines = result.stdout.strip().split('\n')
-            extracted_data = []
-
-            # Process each line of the SNMPWALK output
-            for line in output_lines:
-                if not line.strip() or "No Such Object" in line:
-                    continue
-                
-                # Regex to match the part after the colon and space (e.g., 'STRING: FastEthernet0/0')
-                match = re.search(r':\s+(.*)', line.strip())
-                if match:
-                    value = match.group(1).strip().strip('"')
-                    extracted_data.append(value)
-
-            if not extracted_data:
-                return "SNMP Error: No values found for OID.", None
-             
-        return extracted_data, "LIST"
-
-    except subprocess.TimeoutExpired:
-        return "Subprocess Error: SNMP Timeout", None
-    except Exception as e:
-        return f"Subprocess Error: {e}", None
+        with snmpv3.session(ip_address, snmp_user, auth_pass, priv_pass) as session:
+            varbinds = getattr(session, methods[snmp_command.lower()])(oids, timeout=timeout, retries=retries)
+    except SNMP_ERRORS as e:
+        return [(f"SNMP Error: {e}", None)] * len(oids)
 
-def discover_device(snmp_user, auth_pass, priv_pass, ip_address):
-    """Main function to orchestrate ping and SNMP discovery."""
-    
-    # 1. ICMP Ping Check
+    # The agent answers one varbind per OID, in request order
+    values = []
+    for _, value in varbinds[:len(oids)]:
+        if snmpv3.type_name(value) is None:  # noSuchObject / noSuchInstance / endOfMibView
+            values.append(("SNMP Error: No OID Found", None))
+        else:
+            values.append((snmpv3.text(value), snmpv3.type_name(value)))
+    values += [("SNMP Error: No OID Found", None)] * (len(oids) - len(values))
+    return values
+
+def run_snmp_column(snmp_user, auth_pass, priv_pass, ip_address, column_oid, labels=None, retries=3, timeout=5):
+    """
+    Walks one table column (GETBULK) and keys each value by its row index (e.g., ifIndex).
+    `labels` names enumerated values, e.g. snmpv3.IF_STATUS -> 'up(1)'.
+    """
+    # Output: ({index: value}, None) or ({}, "SNMP Error: ...")
+
+    try:
+        with snmpv3.session(ip_address, snmp_user, auth_pass, priv_pass) as session:
+            varbinds = session.walk(column_oid, timeout=timeout, retries=retries)
+    except SNMP_ERRORS as e:
+        return {}, f"SNMP Error: {e}"
+
+    column = {}
+    prefix = snmpv3.normalize_oid(column_oid) + '.'
+    for name, value in varbinds:
+        # e.g. '1.3.6.1.2.1.2.2.1.2.3' under ifDescr -> row index 3
+        index = name[len(prefix):]
+        if name.startswith(prefix) and index.isdigit():
+            column[int(index)] = snmpv3.text(value, labels)
+
+    if not column:
+        return {}, "SNMP Error: No values found for OID."
+    return column, None
+
+def probe_host(snmp_user, auth_pass, priv_pass, ip_address, pinged=None):
+    """
+    Quick reachability check used by subnet sweeps: one ping, then a single
+    short SNMPv3 get of sysObjectID and sysName.
+    Pass pinged=True when the host already answered a sweep-wide ICMP probe.
+    """
+    # Output: {"ip_address", "reachable", "snmp", "model_id_raw", "hostname", "message"}
+    probe = {"ip_address": ip_address, "reachable": False, "snmp": False,
+             "model_id_raw": None, "hostname": None, "message": ""}
+
+    if pinged is None:
+        reachable, message = run_ping(ip_address, count=1, deadline=1)
+    else:
+        reachable, message = pinged, "Device is unreachable via ICMP (ping failed)."
+    if not reachable:
+        probe["message"] = message
+        return probe
+    probe["reachable"] = True
+
+    (model_id_value, _), (hostname_value, _) = run_snmp_varbinds(
+        "snmpget", snmp_user, auth_pass, priv_pass, ip_address,
+        ["1.3.6.1.2.1.1.2.0", "1.3.6.1.2.1.1.5.0"], retries=0, timeout=1)
+    if "Error" in model_id_value:
+        probe["message"] = model_id_value
+        return probe
+    probe["snmp"] = True
+    probe["model_id_raw"] = model_id_value
+
+    if "Error" not in hostname_value:
+        probe["hostname"] = hostname_value.split(".")[0]
+    probe["message"] = "SNMP agent answered."
+    return probe
+
+def discover_device(snmp_user, auth_pass, priv_pass, ip_address, progress=None):
+    """
+    Main function to orchestrate ping and SNMP discovery.
+    `progress` is an optional callable(step, message) notified as each stage starts
+    (used by background discovery jobs).
+    """
+    def report(step, message):
+        print(message)
+        if progress is not None:
+            progress(step, message)
+
+    # 1. ICMP Ping Check (run_ping prints its own message)
+    if progress is not None:
+        progress("ping", f"Pinging {ip_address}...")
     ping_success, ping_message = run_ping(ip_address)
     if not ping_success:
         return {"status": "error", "message": ping_message}
@@ -134,20 +199,33 @@ def discover_device(snmp_user, auth_pass, priv_pass, ip_address):
         "memory_used": "1.3.6.1.4.1.9.9.48.1.1.1.5",   # Used memory in Bytes
     }
     available_interfaces = "1.3.6.1.2.1.2.2.1.2"       # List of interface names
-    if_index_oid = "1.3.6.1.2.1.2.2.1.1"               # Interface index
     if_admin_oid = "1.3.6.1.2.1.2.2.1.7"     # Admin status of interfaces
     if_oper_oid = "1.3.6.1.2.1.2.2.1.8"      # Operational status of interfaces
 
-    # 2.2 SNMP Polling for system info
-    print("Gathering SNMP data...")
-    model_id_value, _ = run_snmp("snmpget", snmp_user, auth_pass, priv_pass, ip_address, sys_object_id)
+    # 2.2 Run the independent SNMP queries concurrently: system info and the
+    # measurements are one request each, every interface column is one bulk walk.
+    # Total time is roughly that of the slowest query.
+    report("snmp", "Gathering system info, measurements and interfaces...")
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        system_future = pool.submit(run_snmp_varbinds, "snmpget", snmp_user, auth_pass, priv_pass,
+                                    ip_address, [sys_object_id, sys_name])
+        measurement_future = pool.submit(run_snmp_varbinds, "snmpgetnext", snmp_user, auth_pass, priv_pass,
+                                         ip_address, list(applicable_measurement_oid.values()))
+        column_futures = {
+            key: pool.submit(run_snmp_column, snmp_user, auth_pass, priv_pass, ip_address, oid, labels)
+            for key, oid, labels in (("names", available_interfaces, None),
+                                     ("admin_status", if_admin_oid, snmpv3.IF_STATUS),
+                                     ("oper_status", if_oper_oid, snmpv3.IF_STATUS))
+        }
+
+    # 2.3 System info
+    (model_id_value, _), (hostname_value, _) = system_future.result()
     if "Error" in model_id_value:
         return {
             "status": "error",
             "details": "SNMP Error during Model ID retrieval.",
             "message": model_id_value  # Pass the specific error message here
         }
-    hostname_value, _ = run_snmp("snmpget", snmp_user, auth_pass, priv_pass, ip_address, sys_name)
     if "Error" in hostname_value:
         return {
             "status": "error",
@@ -156,28 +234,33 @@ def discover_device(snmp_user, auth_pass, priv_pass, ip_address):
         }
     hostname_value = hostname_value.split(".")[0]  # Get only the first part of the hostname
     
-    # 2.3 SNMP Polling for Applicable Measurements
-    print("Gathering Applicable Measurements...")
+    # 2.4 Applicable Measurements
     applicable_measurements = {}
-    for measurement, oid in applicable_measurement_oid.items():
-        m_value, m_type = run_snmp("snmpgetnext", snmp_user, auth_pass, priv_pass, ip_address, oid)
+    for measurement, (m_value, m_type) in zip(applicable_measurement_oid, measurement_future.result()):
         applicable_measurements[measurement] = {
             "value": m_value,
             "type": m_type
         }
         if "Error" in m_value:
             applicable_measurements[measurement]["note"] = "Measurement not available or SNMP error."
-            break
+    report("measurements", "Applicable measurements gathered.")
 
-    # 2.4 SNMP Polling for Available Interfaces
-    print("Gathering Available Interfaces...")
-    interface_indexes, _ = run_snmp("snmpwalk", snmp_user, auth_pass, priv_pass, ip_address, if_index_oid)
-    interface_names, _ = run_snmp("snmpwalk", snmp_user, auth_pass, priv_pass, ip_address, available_interfaces)
-    interface_admin_status, _ = run_snmp("snmpwalk", snmp_user, auth_pass, priv_pass, ip_address, if_admin_oid)
-    interface_oper_status, _ = run_snmp("snmpwalk", snmp_user, auth_pass, priv_pass, ip_address, if_oper_oid)
+    # 2.5 Available Interfaces, aligned by ifIndex (the row index of each column)
+    columns = {key: future.result() for key, future in column_futures.items()}
+    names, names_error = columns["names"]
+    interface_indexes = sorted(names)
+    interfaces = {
+        "indexes": [str(index) for index in interface_indexes],
+        "names": [names[index] for index in interface_indexes],
+        "admin_status": [columns["admin_status"][0].get(index, "unknown") for index in interface_indexes],
+        "oper_status": [columns["oper_status"][0].get(index, "unknown") for index in interface_indexes],
+    }
+    if names_error:
+        interfaces["note"] = names_error
+    report("interfaces", f"{len(interface_indexes)} interface(s) found.")
 
     # 3. Return Discovery Results
-    print("Discovery completed successfully.")
+    report("done", "Discovery completed successfully.")
     return {
         "status": "OK",
         "data": {
@@ -185,12 +268,7 @@ def discover_device(snmp_user, auth_pass, priv_pass, ip_address):
             "model_id_raw": model_id_value,
             "hostname": hostname_value,
             "applicable_measurements": applicable_measurements,
-            "interfaces": {
-                "indexes": interface_indexes,
-                "names": interface_names,
-                "admin_status": interface_admin_status,
-                "oper_status": interface_oper_status
-            },
+            "interfaces": interfaces,
             "snmpv3_credentials": {
                 "snmp_user": snmp_user,
                 "auth_pass": auth_pass,
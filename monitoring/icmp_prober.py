@@ -0,0 +1,209 @@
+""" Asynchronous ICMP echo prober for many hosts at once.
+
+    Uses unprivileged datagram ICMP sockets (socket(AF_INET, SOCK_DGRAM,
+    IPPROTO_ICMP)), so no root and no `ping` subprocess per host: one
+    socket per address family serves every probe, and replies are matched
+    to their request by (address, sequence number). Sends are paced to
+    MAX_RATE packets per second so a sweep of thousands of hosts does not
+    flood the network.
+
+    Linux only allows these sockets for groups listed in
+    net.ipv4.ping_group_range, e.g.:
+        sysctl -w net.ipv4.ping_group_range="0 2147483647"
+    When they are not allowed, available() is False and callers fall back
+    to the `ping` command.
+
+    Only the standard library is used, so discover_device.py keeps working
+    as a standalone script. """
+
+import asyncio
+import ipaddress
+import itertools
+import os
+import socket
+import struct
+import time
+
+# --- CONFIGURATION ---
+COUNT = 3              # Echo requests per host
+INTERVAL = 0.2         # Seconds between the requests to one host
+TIMEOUT = 1.0          # Seconds to wait for each reply
+MAX_RATE = 2000        # Packets per second for the whole prober
+RECEIVE_BUFFER = 4 * 1024 * 1024   # Bytes; replies to a large sweep arrive in bursts
+# ---------------------------------------------------------------------------------
+
+ECHO_REQUEST = {socket.AF_INET: 8, socket.AF_INET6: 128}
+ECHO_REPLY = {socket.AF_INET: 0, socket.AF_INET6: 129}
+PROTOCOL = {socket.AF_INET: socket.IPPROTO_ICMP, socket.AF_INET6: getattr(socket, 'IPPROTO_ICMPV6', 58)}
+
+_available = None
+
+
+class IcmpUnavailable(Exception):
+    """Raised when datagram ICMP sockets cannot be opened (see net.ipv4.ping_group_range)."""
+
+
+def available():
+    """True if this process may open datagram ICMP sockets (checked once)."""
+    global _available
+    if _available is None:
+        try:
+            socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP).close()
+            _available = True
+        except OSError:
+            _available = False
+    return _available
+
+
+def checksum(data):
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def echo_request(family, sequence, payload):
+    """ICMP echo request; the identifier is replaced by the kernel for datagram sockets."""
+    header = struct.pack('!BBHHH', ECHO_REQUEST[family], 0, 0, 0, sequence)
+    return struct.pack('!BBHHH', ECHO_REQUEST[family], 0, checksum(header + payload), 0, sequence) + payload
+
+
+def summarize(ip_address, sent, rtts, error=''):
+    """Result dict: sent, received, loss (%), rtt_min / rtt_avg / rtt_max / jitter (ms, None without replies)."""
+    result = {'ip_address': ip_address, 'sent': sent, 'received': len(rtts),
+              'loss': round(100.0 * (sent - len(rtts)) / sent, 1) if sent else 100.0,
+              'rtt_min': None, 'rtt_avg': None, 'rtt_max': None, 'jitter': None, 'error': error}
+    if rtts:
+        result.update(rtt_min=round(min(rtts), 3), rtt_avg=round(sum(rtts) / len(rtts), 3), rtt_max=round(max(rtts), 3))
+        # Jitter: mean difference between consecutive round trips
+        steps = [abs(b - a) for a, b in zip(rtts, rtts[1:])]
+        result['jitter'] = round(sum(steps) / len(steps), 3) if steps else 0.0
+    return result
+
+
+class IcmpProber:
+    """
+    async with IcmpProber() as prober:
+        results = await prober.ping_many(['10.0.0.1', '10.0.0.2'])
+    """
+
+    def __init__(self, rate=MAX_RATE):
+        self.rate = rate
+        self.sockets = {}          # family -> socket
+        self.pending = {}          # (address, sequence) -> (future, sent_at)
+        self.sequences = itertools.cycle(range(1, 0x10000))
+        self.next_send = 0.0
+        self.token = os.urandom(8)
+        self.loop = None
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for sock in self.sockets.values():
+            self.loop.remove_reader(sock.fileno())
+            sock.close()
+        self.sockets.clear()
+        for future, _ in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+    def _socket(self, family):
+        sock = self.sockets.get(family)
+        if sock is None:
+            try:
+                sock = socket.socket(family, socket.SOCK_DGRAM, PROTOCOL[family])
+            except OSError as e:
+                raise IcmpUnavailable(f"Cannot open an ICMP datagram socket: {e}") from e
+            sock.setblocking(False)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+            except OSError:
+                pass
+            self.loop.add_reader(sock.fileno(), self._on_readable, sock, family)
+            self.sockets[family] = sock
+        return sock
+
+    def _on_readable(self, sock, family):
+        now = time.monotonic()
+        while True:
+            try:
+                data, address = sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if len(data) < 8 or data[0] != ECHO_REPLY[family] or data[8:16] != self.token:
+                continue
+            sequence = struct.unpack('!H', data[6:8])[0]
+            entry = self.pending.pop((address[0], sequence), None)
+            if entry is not None and not entry[0].done():
+                entry[0].set_result((now - entry[1]) * 1000.0)
+
+    async def _pace(self):
+        now = time.monotonic()
+        slot = max(now, self.next_send)
+        self.next_send = slot + 1.0 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _send(self, sock, family, address):
+        """Sends one echo request. Returns a future resolving to the RTT in ms."""
+        await self._pace()
+        sequence = next(self.sequences)
+        while (address, sequence) in self.pending:
+            sequence = next(self.sequences)
+        future = self.loop.create_future()
+        self.pending[(address, sequence)] = (future, time.monotonic())
+        try:
+            sock.sendto(echo_request(family, sequence, self.token), (address, 0))
+        except OSError:
+            self.pending.pop((address, sequence), None)
+            future.cancel()
+        return future, sequence
+
+    async def ping(self, ip_address, count=COUNT, interval=INTERVAL, timeout=TIMEOUT):
+        """Pings one host; returns a summarize() dict."""
+        try:
+            address = ipaddress.ip_address(str(ip_address).strip())
+        except ValueError:
+            return summarize(ip_address, 0, [], error='Invalid IP address.')
+        family = socket.AF_INET6 if address.version == 6 else socket.AF_INET
+        sock = self._socket(family)
+
+        probes = []
+        for number in range(count):
+            if number:
+                await asyncio.sleep(interval)
+            probes.append(await self._send(sock, family, str(address)))
+
+        rtts = []
+        for future, sequence in probes:
+            try:
+                rtts.append(await asyncio.wait_for(future, timeout) if not future.cancelled() else None)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                rtts.append(None)
+            finally:
+                self.pending.pop((str(address), sequence), None)
+        return summarize(str(ip_address), count, [rtt for rtt in rtts if rtt is not None])
+
+    async def ping_many(self, hosts, count=COUNT, interval=INTERVAL, timeout=TIMEOUT):
+        """Pings all hosts concurrently. Returns {ip_address: summarize() dict}."""
+        results = await asyncio.gather(*(self.ping(host, count, interval, timeout) for host in hosts))
+        return {result['ip_address']: result for result in results}
+
+
+async def _ping_hosts(hosts, count, interval, timeout, rate):
+    async with IcmpProber(rate) as prober:
+        return await prober.ping_many(hosts, count, interval, timeout)
+
+
+def ping_hosts(hosts, count=COUNT, interval=INTERVAL, timeout=TIMEOUT, rate=MAX_RATE):
+    """Blocking wrapper (for threads and management commands). Raises IcmpUnavailable."""
+    return asyncio.run(_ping_hosts(list(hosts), count, interval, timeout, rate))
@@ -0,0 +1,192 @@
+""" Interface re-sync: reconciles stored Interface rows with a fresh ifTable walk.
+
+    Rows are matched by interface name, so an interface renumbered after a
+    reboot or line-card insertion keeps its history; ifIndex is only used to
+    tell apart duplicate names. Only the differences are written, with bulk operations:
+    new interfaces are inserted, moved or renamed ones updated, and missing
+    ones retired (is_active=False) rather than deleted. Interface speeds
+    (ifHighSpeed, falling back to ifSpeed) are refreshed on the same pass;
+    utilization thresholds need them.
+
+    Used by `manage.py sync_interfaces`. """
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Device, Interface, DeviceChange
+from .discover_device import run_snmp_column
+from .response_cache import bump_version, DEVICES
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+IF_DESCR_OID = "1.3.6.1.2.1.2.2.1.2"    # Interface names (same column discovery stores as ifName)
+IF_HIGH_SPEED_OID = "1.3.6.1.2.1.31.1.1.1.15"   # Mbps (IF-MIB ifXTable)
+IF_SPEED_OID = "1.3.6.1.2.1.2.2.1.5"             # bps, saturates at 4.29 Gbps
+DEFAULT_WORKERS = 8                      # Devices walked at the same time
+# ---------------------------------------------------------------------------------
+
+
+def fetch_interface_table(device):
+    """Walks the device's ifTable. Returns ({ifIndex: name}, error)."""
+    return run_snmp_column(
+        device.username, device.get_snmp_password() or '', device.get_snmp_aes_passwd() or '',
+        device.ip_address, IF_DESCR_OID
+    )
+
+
+def fetch_interface_speeds(device):
+    """Walks ifHighSpeed (or ifSpeed on agents without ifXTable). Returns {ifIndex: bits per second}."""
+    credentials = (device.username, device.get_snmp_password() or '', device.get_snmp_aes_passwd() or '',
+                   device.ip_address)
+    for oid, factor in ((IF_HIGH_SPEED_OID, 1000000), (IF_SPEED_OID, 1)):
+        column, error = run_snmp_column(*credentials, oid)
+        speeds = {}
+        for index, value in column.items():
+            try:
+                speeds[index] = int(value.split()[0]) * factor
+            except (ValueError, IndexError):
+                continue
+        if any(speeds.values()):
+            return speeds
+    return {}
+
+
+def apply_speeds(device, speeds):
+    """Stores changed speeds of the device's active interfaces. Returns the number updated."""
+    changed = []
+    for interface in Interface.objects.filter(device=device, is_active=True):
+        speed = speeds.get(interface.ifIndex) or None
+        if speed is not None and interface.speed != speed:
+            interface.speed = speed
+            changed.append(interface)
+    Interface.objects.bulk_update(changed, ['speed'])
+    return len(changed)
+
+
+def diff_interfaces(stored, fresh):
+    """
+    Compares stored Interface rows with a fresh {ifIndex: name} table.
+    Returns {'create': [(ifIndex, name)], 'update': [(interface, ifIndex, name)],
+             'retire': [interface], 'unchanged': int}.
+    """
+    fresh_names = {}
+    for index, name in fresh.items():
+        fresh_names.setdefault(name, []).append(index)
+    stored_names = {}
+    for interface in stored:
+        stored_names.setdefault(interface.ifName, []).append(interface)
+
+    assigned = {}        # fresh ifIndex -> stored interface
+    matched = set()      # stored interface ids
+
+    # 1. Same (unique) name on both sides: the interface may have a new ifIndex
+    for name, indexes in fresh_names.items():
+        candidates = stored_names.get(name, [])
+        if len(indexes) == 1 and len(candidates) == 1:
+            assigned[indexes[0]] = candidates[0]
+            matched.add(candidates[0].id)
+
+    # 2. Same ifIndex with a compatible name (duplicate names, or a row stored without one).
+    # A different name on a reused ifIndex is a different port: the old row is retired.
+    by_index = {interface.ifIndex: interface for interface in stored if interface.id not in matched}
+    for index, name in fresh.items():
+        interface = by_index.get(index)
+        if index not in assigned and interface is not None and interface.ifName in (None, '', name):
+            assigned[index] = interface
+            matched.add(interface.id)
+
+    plan = {'create': [], 'update': [], 'retire': [], 'unchanged': 0}
+    for index, name in sorted(fresh.items()):
+        interface = assigned.get(index)
+        if interface is None:
+            plan['create'].append((index, name))
+        elif interface.ifIndex != index or interface.ifName != name or not interface.is_active:
+            plan['update'].append((interface, index, name))
+        else:
+            plan['unchanged'] += 1
+
+    plan['retire'] = [i for i in stored if i.id not in matched and i.is_active]
+    return plan
+
+
+def apply_diff(device, stored, plan):
+    """Writes a diff_interfaces() plan in one transaction with bulk operations."""
+    now = timezone.now()
+    taken = {index for _, index, _ in plan['update']} | {index for index, _ in plan['create']}
+
+    with transaction.atomic():
+        # Park moving rows, and retired rows whose ifIndex is reused, on unique negative
+        # ifIndexes first so swaps never collide with the (device, ifIndex) unique key
+        updated_ids = {interface.id for interface, _, _ in plan['update']}
+        parked = [interface for interface, index, _ in plan['update'] if interface.ifIndex != index]
+        parked += [interface for interface in stored if interface.id not in updated_ids and interface.ifIndex in taken]
+        for interface in parked:
+            interface.ifIndex = -interface.id
+        if parked:
+            Interface.objects.bulk_update(parked, ['ifIndex'])
+
+        for interface, index, name in plan['update']:
+            interface.ifIndex, interface.ifName, interface.is_active = index, name, True
+        for interface in plan['retire']:
+            interface.is_active = False
+        Interface.objects.bulk_update([i for i, _, _ in plan['update']], ['ifIndex', 'ifName', 'is_active'])
+        Interface.objects.bulk_update(plan['retire'], ['is_active'])
+
+        Interface.objects.bulk_create([
+            Interface(device=device, ifIndex=index, ifName=name) for index, name in plan['create']
+        ])
+        Interface.objects.filter(device=device, is_active=True).update(last_seen=now)
+        # Bulk operations skip signals: notify live clients here (caches are bumped by sync_devices)
+        DeviceChange.objects.create(device_id=device.id, owner_id=device.user_id, kind=DeviceChange.KIND_METADATA)
+
+
+def sync_device(device, dry_run=False):
+    """Re-syncs one device. Returns a summary dict (counts, or 'error')."""
+    fresh, error = fetch_interface_table(device)
+    if error:
+        return {'device': device.ip_address, 'error': error}
+
+    stored = list(Interface.objects.filter(device=device, retired_at__isnull=True))  # Deleted rows are being purged
+    plan = diff_interfaces(stored, fresh)
+    changed = plan['create'] or plan['update'] or plan['retire']
+    if changed and not dry_run:
+        apply_diff(device, stored, plan)
+    elif not dry_run:
+        Interface.objects.filter(device=device, is_active=True).update(last_seen=timezone.now())
+    speeds = apply_speeds(device, fetch_interface_speeds(device)) if not dry_run else 0
+    return {
+        'device': device.ip_address,
+        'created': len(plan['create']),
+        'updated': len(plan['update']),
+        'retired': len(plan['retire']),
+        'unchanged': plan['unchanged'],
+        'speeds': speeds,
+    }
+
+
+def _sync_in_thread(device, dry_run):
+    try:
+        return sync_device(device, dry_run=dry_run)
+    except Exception as e:
+        logger.warning(f"Interface sync failed for {device.ip_address}: {e}")
+        return {'device': device.ip_address, 'error': str(e)}
+    finally:
+        close_old_connections()
+
+
+def sync_devices(devices=None, workers=DEFAULT_WORKERS, dry_run=False):
+    """Re-syncs many devices with at most `workers` SNMP walks in flight. Yields summaries as they finish."""
+    devices = list(devices if devices is not None else Device.objects.filter(retired_at__isnull=True))
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='monitoring-ifsync') as pool:
+        futures = [pool.submit(_sync_in_thread, device, dry_run) for device in devices]
+        changed = False
+        for future in as_completed(futures):
+            summary = future.result()
+            changed = changed or any(summary.get(key) for key in ('created', 'updated', 'retired', 'speeds'))
+            yield summary
+    if changed and not dry_run:
+        bump_version(DEVICES)
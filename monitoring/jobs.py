@@ -0,0 +1,384 @@
+""" Background jobs (BackgroundJob rows executed by a bounded thread pool).
+
+    A request creates the job row and returns its id immediately; a worker
+    thread runs the job, appending progress events and storing the final
+    result on the row. Clients poll `/api/discover/jobs/<id>/` or stream
+    `/api/discover/jobs/<id>/stream/`.
+
+    Jobs run inside the web process, so a restart interrupts them; such
+    jobs are reported as failed once no progress was written for
+    STALE_AFTER (an interrupted purge is finished by `manage.py purge_retired`). """
+
+import ipaddress
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import (
+    AlertEvent, BackgroundJob, Device, DeviceChange, History, HistoryRollup, Interface, ProbeSample,
+)
+from .response_cache import bump_version, DEVICES
+from .discover_device import discover_device, probe_host
+from . import icmp_prober
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+MAX_WORKERS = getattr(settings, 'JOB_MAX_WORKERS', 4)       # Jobs running at the same time
+MAX_PENDING = getattr(settings, 'JOB_MAX_PENDING', 32)      # Running + queued jobs per process
+STALE_AFTER = timedelta(minutes=30)                         # Unfinished jobs silent this long were interrupted
+SWEEP_WORKERS = getattr(settings, 'SWEEP_MAX_WORKERS', 64)  # Hosts probed at the same time by one sweep
+SWEEP_MAX_HOSTS = 4096                                      # Largest sweep accepted (a /20)
+PURGE_BATCH = getattr(settings, 'PURGE_BATCH_SIZE', 5000)   # Rows deleted per statement by a purge
+PURGE_PAUSE = 0.05                                          # Seconds between purge batches (lets the poller in)
+# ---------------------------------------------------------------------------------
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='monitoring-job')
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+class JobQueueFull(Exception):
+    """Raised when MAX_PENDING jobs are already queued or running in this process."""
+
+
+class ProgressReporter:
+    """
+    Callable handed to job runners: report(step, message, key=None, **extra) appends a progress event.
+    An event with a `key` replaces the earlier event of the same step and key (running counters, e.g.,
+    rows purged so far), and only the newest MAX_EVENTS are kept; 'seq' numbers every reported event,
+    so the number dropped is progress[0]['seq'] - 1. Writes are batched to at most one UPDATE per
+    FLUSH_INTERVAL; flush() writes the rest. Each write also refreshes the job's heartbeat (updated_at).
+    """
+    FLUSH_INTERVAL = 0.5
+    MAX_EVENTS = SWEEP_MAX_HOSTS + 100   # A sweep reports every answering host
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.events = []
+        self.reported = 0
+        self.flushed = 0
+        self.flushed_at = 0.0
+
+    def __call__(self, step, message, key=None, **extra):
+        self.reported += 1
+        if key is not None:
+            self.events = [event for event in self.events if (event['step'], event.get('key')) != (step, key)]
+            extra['key'] = key
+        self.events.append({'step': step, 'message': message, 'at': timezone.now().isoformat(),
+                            'seq': self.reported, **extra})
+        del self.events[:-self.MAX_EVENTS]
+        if time.monotonic() - self.flushed_at >= self.FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if self.flushed == self.reported:
+            return
+        BackgroundJob.objects.filter(pk=self.job_id).update(progress=self.events, updated_at=timezone.now())
+        self.flushed = self.reported
+        self.flushed_at = time.monotonic()
+
+
+def encrypt_secrets(secrets):
+    return settings.FERNET.encrypt(json.dumps(secrets).encode())
+
+
+def decrypt_secrets(job):
+    if not job.secrets:
+        return {}
+    return json.loads(settings.FERNET.decrypt(bytes(job.secrets)).decode())
+
+
+def submit(kind, runner, user=None, params=None, secrets=None, keep_secrets=False):
+    """
+    Creates a BackgroundJob and schedules `runner(report, **params, **secrets)`.
+    The runner returns the JSON-serializable result or raises to fail the job.
+    The encrypted secrets are erased when the job finishes, unless `keep_secrets`
+    and the job succeeded (see discovery_credentials).
+    """
+    global _pending
+    with _pending_lock:
+        if _pending >= MAX_PENDING:
+            raise JobQueueFull(f"Too many background jobs in progress ({MAX_PENDING}). Try again shortly.")
+        _pending += 1
+
+    try:
+        job = BackgroundJob.objects.create(
+            kind=kind,
+            user=user if user is not None and user.is_authenticated else None,
+            params=params or {},
+            secrets=encrypt_secrets(secrets) if secrets else b'',
+        )
+        _executor.submit(_execute, job.pk, runner, params or {}, secrets or {}, keep_secrets)
+    except Exception:
+        with _pending_lock:
+            _pending -= 1
+        raise
+    return job
+
+
+def _execute(job_id, runner, params, secrets, keep_secrets=False):
+    global _pending
+    try:
+        now = timezone.now()
+        BackgroundJob.objects.filter(pk=job_id).update(status=BackgroundJob.STATUS_RUNNING, started_at=now, updated_at=now)
+        report = ProgressReporter(job_id)
+        try:
+            result = runner(report, **params, **secrets)
+            report.flush()
+            BackgroundJob.objects.filter(pk=job_id).update(
+                status=BackgroundJob.STATUS_DONE, result=result, finished_at=timezone.now(), updated_at=timezone.now(),
+                **({} if keep_secrets else {'secrets': b''}),
+            )
+        except Exception as e:
+            logger.warning(f"Background job {job_id} failed: {e}")
+            report.flush()
+            BackgroundJob.objects.filter(pk=job_id).update(
+                status=BackgroundJob.STATUS_FAILED, error=str(e), finished_at=timezone.now(), updated_at=timezone.now(),
+                secrets=b'',
+            )
+    finally:
+        with _pending_lock:
+            _pending -= 1
+        # Worker threads keep their own DB connection; release it between jobs
+        close_old_connections()
+
+
+def get_job_for(request, job_id):
+    """Returns the job if `request.user` may read it, else None. Marks interrupted jobs as failed."""
+    job = BackgroundJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return None
+    if job.user_id is not None:
+        user = request.user
+        if not user.is_authenticated or not (user.is_superuser or user.id == job.user_id):
+            return None
+    # A running purge of a big device writes progress after every batch, so only silence counts
+    if not job.is_finished and timezone.now() - job.updated_at > STALE_AFTER:
+        job.status = BackgroundJob.STATUS_FAILED
+        job.error = 'Job was interrupted (server restart or timeout).'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+    return job
+
+
+def job_payload(job):
+    """JSON body describing a job for the API. Never contains the job's secrets."""
+    result = job.result
+    if job.kind == BackgroundJob.KIND_DISCOVERY and result and result.get('status') == 'OK':
+        # The registration step sends the discovery data back; it reads the credentials
+        # from the job (discovery_credentials) instead of from the client
+        result = {**result, 'data': {**result['data'], 'discovery_job': str(job.pk)}}
+    return {
+        'job_id': str(job.pk),
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'result': result,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+# ----- Discovery -----
+
+def _run_discovery(report, ip_address, snmp_user, auth_pass, priv_pass):
+    results = discover_device(snmp_user, auth_pass, priv_pass, ip_address, progress=report)
+    if results.get('status') == 'error':
+        raise RuntimeError(results.get('message') or results.get('details') or 'Discovery failed.')
+    # Keep plaintext credentials out of the stored result
+    results['data'].pop('snmpv3_credentials', None)
+    return results
+
+
+def start_discovery_job(user, ip_address, snmp_user, auth_pass, priv_pass):
+    """
+    Queues discovery of one device and returns the BackgroundJob. The credentials of a
+    successful discovery are kept (encrypted) for its owner's registration step; an
+    anonymous discovery keeps none.
+    """
+    return submit(
+        BackgroundJob.KIND_DISCOVERY, _run_discovery, user=user,
+        params={'ip_address': ip_address, 'snmp_user': snmp_user},
+        secrets={'auth_pass': auth_pass, 'priv_pass': priv_pass},
+        keep_secrets=user is not None and user.is_authenticated,
+    )
+
+
+def discovery_credentials(user, job_id, ip_address):
+    """
+    SNMPv3 credentials {'snmp_user', 'auth_pass', 'priv_pass'} of a finished discovery of
+    `ip_address` owned by `user`, or None (unknown job, another owner, already used).
+    """
+    if user.pk is None:
+        return None
+    try:
+        job = BackgroundJob.objects.filter(
+            pk=job_id, kind=BackgroundJob.KIND_DISCOVERY, status=BackgroundJob.STATUS_DONE, user_id=user.pk,
+        ).first()
+    except (ValueError, ValidationError):
+        return None
+    if job is None or not job.secrets or job.params.get('ip_address') != ip_address:
+        return None
+    secrets = decrypt_secrets(job)
+    return {'snmp_user': job.params.get('snmp_user', ''), 'auth_pass': secrets.get('auth_pass', ''),
+            'priv_pass': secrets.get('priv_pass', '')}
+
+
+def forget_credentials(job_id):
+    """Erases the stored credentials of a discovery job once the device is registered."""
+    BackgroundJob.objects.filter(pk=job_id).update(secrets=b'')
+
+
+# ----- Subnet sweep -----
+
+def parse_sweep_network(ip_address, subnet_mask=None):
+    """
+    Returns the ip_network to sweep from 'a.b.c.d/nn' or an IP plus a subnet mask
+    (prefix length or dotted mask). Raises ValueError for invalid or oversized ranges.
+    """
+    target = f"{ip_address}/{subnet_mask}" if subnet_mask and '/' not in ip_address else ip_address
+    network = ipaddress.ip_network(target.strip(), strict=False)
+    if network.num_addresses > SWEEP_MAX_HOSTS + 2:
+        raise ValueError(f"Subnet {network} is too large to sweep (max {SWEEP_MAX_HOSTS} hosts).")
+    return network
+
+
+def _run_sweep(report, cidr, snmp_user, auth_pass, priv_pass):
+    network = ipaddress.ip_network(cidr, strict=False)
+    hosts = [str(host) for host in network.hosts()] or [str(network.network_address)]
+    existing = set(Device.objects.filter(ip_address__in=hosts).values_list('ip_address', flat=True))
+    targets = [ip for ip in hosts if ip not in existing]
+    report('start', f"Sweeping {network}: {len(targets)} host(s) to probe, {len(existing)} already registered.",
+           total=len(targets))
+
+    found = []
+    reachable = 0
+    pinged = {}
+    if targets and icmp_prober.available():
+        # One asynchronous ICMP pass over the whole range; only answering hosts get an SNMP probe
+        pings = icmp_prober.ping_hosts(targets, count=1)
+        pinged = {ip: pings[ip]['received'] > 0 for ip in targets}
+        report('scan', f"{sum(pinged.values())}/{len(targets)} host(s) answered ICMP.", done=0)
+    with ThreadPoolExecutor(max_workers=min(SWEEP_WORKERS, max(len(targets), 1)),
+                            thread_name_prefix='monitoring-sweep') as pool:
+        futures = [pool.submit(probe_host, snmp_user, auth_pass, priv_pass, ip, pinged.get(ip)) for ip in targets]
+        # Results are reported in completion order so answering hosts show up right away
+        for done, future in enumerate(as_completed(futures), start=1):
+            probe = future.result()
+            if probe['reachable']:
+                reachable += 1
+                found.append(probe)
+                report('host', f"{probe['ip_address']}: {probe['hostname'] or probe['message']}", host=probe)
+            elif done % 64 == 0:
+                report('scan', f"Probed {done}/{len(targets)} host(s)...", done=done)
+
+    found.sort(key=lambda probe: ipaddress.ip_address(probe['ip_address']))
+    report('done', f"Sweep finished: {reachable} reachable, "
+                   f"{sum(1 for probe in found if probe['snmp'])} answering SNMP.")
+    return {
+        "status": "OK",
+        "data": {
+            "cidr": str(network),
+            "probed": len(targets),
+            "skipped": sorted(existing, key=ipaddress.ip_address),
+            "hosts": found,
+        }
+    }
+
+
+def start_sweep_job(user, network, snmp_user, auth_pass, priv_pass):
+    """Queues a concurrent ICMP + SNMP sweep of `network` and returns the BackgroundJob."""
+    return submit(
+        BackgroundJob.KIND_SWEEP, _run_sweep, user=user,
+        params={'cidr': str(network), 'snmp_user': snmp_user},
+        secrets={'auth_pass': auth_pass, 'priv_pass': priv_pass},
+    )
+
+
+# ----- Device / interface purge -----
+
+def purge_rows(queryset, report, label):
+    """Deletes `queryset` PURGE_BATCH rows at a time (one short transaction each). Returns the count."""
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by().values_list('id', flat=True)[:PURGE_BATCH])
+        if not ids:
+            return deleted
+        queryset.model.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+        report('purge', f"Deleted {deleted:,} {label} row(s)...", key=label, table=label, deleted=deleted)
+        time.sleep(PURGE_PAUSE)
+
+
+def purge_retired(report, model, object_id):
+    """Removes a retired device or interface: its bulky rows in batches, then the row itself."""
+    if model == 'device':
+        obj = Device.objects.filter(pk=object_id, retired_at__isnull=False).first()
+        related = {'device_id': object_id}
+    else:
+        obj = Interface.objects.filter(pk=object_id, retired_at__isnull=False).first()
+        related = {'interface_id': object_id}
+    if obj is None:
+        return {"status": "OK", "data": {"deleted": {}}}
+
+    report('start', f"Purging {model} {obj}...")
+    deleted = {}
+    tables = [('history', History), ('rollup', HistoryRollup), ('alert event', AlertEvent)]
+    if model == 'device':
+        tables.append(('probe sample', ProbeSample))
+    for label, table in tables:
+        deleted[label] = purge_rows(table.objects.filter(**related), report, label)
+
+    # What is left (interfaces, thresholds, states) is small enough for the regular cascade
+    obj.delete()
+    report('done', f"Purged {model} {obj}: {sum(deleted.values()):,} row(s) removed.")
+    return {"status": "OK", "data": {"model": model, "id": object_id, "deleted": deleted}}
+
+
+def start_purge_job(user, model, object_id):
+    """Queues the background purge of a retired device or interface and returns the BackgroundJob."""
+    return submit(BackgroundJob.KIND_PURGE, purge_retired, user=user,
+                  params={'model': model, 'object_id': object_id})
+
+
+def retire_device(device, user=None):
+    """
+    Takes a device out of polling, the API and live clients at once, then queues
+    the purge of its data. Returns the purge job (None when the queue is full;
+    `manage.py purge_retired` picks the device up later).
+    """
+    with transaction.atomic():
+        Device.objects.filter(pk=device.pk).update(retired_at=timezone.now())
+        # Bulk update skips signals: leave the tombstone so clients drop the device
+        DeviceChange.objects.create(device_id=device.pk, owner_id=device.user_id, kind=DeviceChange.KIND_DELETED)
+    bump_version(DEVICES)
+    try:
+        return start_purge_job(user, 'device', device.pk)
+    except JobQueueFull:
+        return None
+
+
+def retire_interface(interface, user=None):
+    """Same as retire_device for one interface (hidden and unpolled right away, purged in the background)."""
+    with transaction.atomic():
+        # A negative ifIndex frees the (device, ifIndex) slot, as the interface re-sync does for retired rows
+        Interface.objects.filter(pk=interface.pk).update(
+            retired_at=timezone.now(), is_active=False, ifIndex=-interface.pk)
+        DeviceChange.objects.create(device_id=interface.device_id, owner_id=interface.device.user_id,
+                                    kind=DeviceChange.KIND_METADATA)
+    bump_version(DEVICES)
+    try:
+        return start_purge_job(user, 'interface', interface.pk)
+    except JobQueueFull:
+        return None
@@ -0,0 +1,45 @@
+""" Scores new History samples against per-series EWMA / hour-of-day baselines.
+
+    Runs as a long-lived process next to the poller. Baselines are kept in
+    ANOMALY_BASELINE_PATH (.npz); unusual values are written as
+    AlertEvent(kind='anomaly').
+
+    ----- How to use -----
+    python manage.py detect_anomalies                # run forever, poll every 60 seconds
+    python manage.py detect_anomalies --once         # single pass (e.g., from cron)
+
+    ----- SYSTEMD SAMPLE -----
+    ExecStart=/usr/bin/python /path/to/manage.py detect_anomalies
+    Restart=always """
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from monitoring.anomaly import BATCH_SIZE, Detector
+
+
+class Command(BaseCommand):
+    help = "Maintains fleet-wide anomaly baselines and records anomalies as alert events."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Process the pending samples and exit")
+        parser.add_argument('--interval', type=float, default=60,
+                            help="Seconds to wait when no new samples arrived. Default: 60")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f"History rows per pass. Default: {BATCH_SIZE}")
+
+    def handle(self, *args, **options):
+        detector = Detector()
+        self.stdout.write(f"Loaded {len(detector.baselines)} baseline series.")
+        while True:
+            read, events = detector.run_once(options['batch_size'])
+            for event in events:
+                self.stdout.write(event.message)
+            if read < options['batch_size']:
+                if options['once']:
+                    break
+                close_old_connections()
+                time.sleep(options['interval'])
@@ -0,0 +1,61 @@
+""" Evaluates Threshold rules against new History samples as they arrive.
+
+    Runs as a long-lived process next to the poller; each pass reads the
+    samples written since the last pass and updates AlertState / AlertEvent.
+    State changes are mailed / posted as digests by a background dispatcher
+    (see monitoring/notifications.py and the ALERT_* settings).
+
+    ----- How to use -----
+    python manage.py evaluate_alerts                 # run forever, poll every 5 seconds
+    python manage.py evaluate_alerts --once          # single pass (e.g., from cron)
+    python manage.py evaluate_alerts --no-notify     # states and events only, no digests
+
+    ----- SYSTEMD SAMPLE -----
+    ExecStart=/usr/bin/python /path/to/manage.py evaluate_alerts
+    Restart=always """
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from monitoring.alerting import BATCH_SIZE, Evaluator
+from monitoring.notifications import Dispatcher
+
+
+class Command(BaseCommand):
+    help = "Tails History and maintains alert states and events for every Threshold."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Process the pending samples and exit")
+        parser.add_argument('--interval', type=float, default=5,
+                            help="Seconds to wait when no new samples arrived. Default: 5")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f"History rows per pass. Default: {BATCH_SIZE}")
+        parser.add_argument('--no-notify', action='store_true',
+                            help="Do not send alert digests")
+
+    def handle(self, *args, **options):
+        dispatcher = None if options['no_notify'] else Dispatcher().start()
+        evaluator = Evaluator(notify=dispatcher.enqueue if dispatcher else None)
+        try:
+            while True:
+                read, events = evaluator.run_once(options['batch_size'])
+                for event in events:
+                    self.stdout.write(event.message)
+                if read < options['batch_size']:
+                    if options['once']:
+                        break
+                    # Idle: drop the DB connection if it went stale, then wait
+                    close_old_connections()
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if dispatcher is not None:
+                # Send what is still collected instead of waiting for the digest window
+                dispatcher.stop()
+                if dispatcher.dropped or dispatcher.failed:
+                    self.stderr.write(f"Notifications dropped: {dispatcher.dropped}, "
+                                      f"digests failed: {dispatcher.failed}")
@@ -0,0 +1,53 @@
+""" Registers devices in bulk from a CSV or JSON file.
+
+    CSV header: ip_address,hostname,model_id (or model_name),snmp_user,auth_pass,priv_pass[,subnet_mask,interfaces]
+    `interfaces` is optional, e.g. "1:Gi0/1;2:Gi0/2".
+
+    ----- How to use -----
+    python manage.py import_devices devices.csv --user admin
+    python manage.py import_devices devices.json --user admin --dry-run """
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.bulk_register import CHUNK_SIZE, parse_rows, register_devices
+
+
+class Command(BaseCommand):
+    help = "Validates and registers devices (and their interfaces) from a CSV or JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON file to import")
+        parser.add_argument('--user', help="Username that will own the imported devices")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help=f"Devices written per transaction. Default: {CHUNK_SIZE}")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only validate; nothing is written")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        try:
+            with open(options['path'], 'rb') as f:
+                rows = parse_rows(f.read(), 'json' if options['path'].endswith('.json') else '')
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+        if not isinstance(rows, list):
+            raise CommandError("Expected a list of devices.")
+
+        outcome = register_devices(rows, user=user, chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+
+        for error in outcome['errors']:
+            details = '; '.join(f"{field}: {' '.join(map(str, messages))}"
+                                for field, messages in error['errors'].items()) \
+                if isinstance(error['errors'], dict) else str(error['errors'])
+            self.stderr.write(f"Row {error['row']} ({error['ip_address'] or '-'}): {details}")
+
+        verb = 'valid' if options['dry_run'] else 'registered'
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(outcome['created'])} device(s) {verb}, {len(outcome['errors'])} row(s) rejected."
+        ))
@@ -0,0 +1,62 @@
+""" Fast reachability probe for every device (updates DeviceState).
+
+    Each pass sends one short SNMP get (and a ping when it fails) to every
+    device concurrently, so a device is reported down within one interval
+    instead of waiting for its History to go stale. With in-process ICMP
+    available, every pass also stores RTT / jitter / loss samples
+    (ProbeSample); samples older than PROBE_RETENTION_DAYS are pruned hourly.
+
+    ----- How to use -----
+    python manage.py probe_devices                   # run forever, every 30 seconds
+    python manage.py probe_devices --once            # single pass (e.g., from cron)
+    python manage.py probe_devices --once --device 10.0.0.1
+    python manage.py probe_devices --icmp-only --interval 10   # fast RTT/loss tier only
+
+    ----- SYSTEMD SAMPLE -----
+    ExecStart=/usr/bin/python /path/to/manage.py probe_devices
+    Restart=always """
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from monitoring.models import Device
+from monitoring.reachability import PROBE_INTERVAL, PROBE_WORKERS, probe_devices, prune_samples
+
+PRUNE_EVERY = 3600         # Seconds between ProbeSample retention runs
+
+
+class Command(BaseCommand):
+    help = "Probes all devices (SNMP + ICMP) and records reachability transitions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Probe once and exit")
+        parser.add_argument('--interval', type=float, default=PROBE_INTERVAL,
+                            help=f"Seconds between passes. Default: {PROBE_INTERVAL}")
+        parser.add_argument('--workers', type=int, default=PROBE_WORKERS,
+                            help=f"Devices probed at the same time. Default: {PROBE_WORKERS}")
+        parser.add_argument('--device', action='append', default=[],
+                            help="Only probe this IP address (repeatable)")
+        parser.add_argument('--icmp-only', action='store_true',
+                            help="Only record ICMP RTT/loss samples; leave DeviceState to the SNMP tier")
+
+    def handle(self, *args, **options):
+        pruned_at = None
+        while True:
+            started = time.monotonic()
+            if pruned_at is None or started - pruned_at >= PRUNE_EVERY:
+                prune_samples()
+                pruned_at = started
+            devices = Device.objects.filter(retired_at__isnull=True)
+            if options['device']:
+                devices = devices.filter(ip_address__in=options['device'])
+            transitions = probe_devices(devices, workers=options['workers'], snmp=not options['icmp_only'])
+            for device, old, new, reason in transitions:
+                self.stdout.write(f"{device.hostname} ({device.ip_address}): {old} -> {new}"
+                                  + (f" ({reason})" if reason else ''))
+            if options['once']:
+                break
+            close_old_connections()
+            time.sleep(max(0.0, options['interval'] - (time.monotonic() - started)))
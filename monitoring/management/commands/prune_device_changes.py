@@ -0,0 +1,39 @@
+""" Deletes old rows from the DeviceChange feed.
+
+    ----- How to use -----
+    python manage.py prune_device_changes             # keep the last 24 hours
+    python manage.py prune_device_changes --hours 6
+
+    ----- CRON SAMPLE -----
+    0 * * * * /usr/bin/python /path/to/manage.py prune_device_changes """
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from monitoring.models import DeviceChange
+
+
+class Command(BaseCommand):
+    help = "Removes DeviceChange feed rows older than the retention window."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24,
+                            help="Retention window in hours. Default: 24")
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help="Rows deleted per statement. Default: 10000")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        deleted = 0
+        while True:
+            # Delete by id ranges so each statement stays short on a busy table
+            ids = list(
+                DeviceChange.objects.filter(created_at__lt=cutoff)
+                .order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            deleted += DeviceChange.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} change feed row(s) older than {cutoff}."))
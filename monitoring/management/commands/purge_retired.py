@@ -0,0 +1,53 @@
+""" Finishes purging deleted (retired) devices and interfaces.
+
+    Deleting a device or interface in the admin retires it and queues a
+    background purge in the web process. A restart interrupts that purge,
+    and a full job queue skips it; this command picks up whatever is left.
+
+    ----- How to use -----
+    python manage.py purge_retired
+
+    ----- CRON SAMPLE -----
+    */15 * * * * /usr/bin/python /path/to/manage.py purge_retired """
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from monitoring import jobs
+from monitoring.models import BackgroundJob, Device, Interface
+
+
+class Command(BaseCommand):
+    help = "Purges the data of retired devices and interfaces in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=jobs.PURGE_BATCH,
+                            help=f"Rows deleted per statement. Default: {jobs.PURGE_BATCH}")
+
+    def handle(self, *args, **options):
+        jobs.PURGE_BATCH = options['batch_size']
+
+        # Leave purges that are still running in the web process alone
+        busy = {
+            (job.params.get('model'), job.params.get('object_id'))
+            for job in BackgroundJob.objects.filter(
+                kind=BackgroundJob.KIND_PURGE,
+                status__in=[BackgroundJob.STATUS_QUEUED, BackgroundJob.STATUS_RUNNING],
+                updated_at__gte=timezone.now() - jobs.STALE_AFTER,
+            )
+        }
+        targets = [('device', pk) for pk in Device.objects.filter(retired_at__isnull=False).values_list('id', flat=True)]
+        # Interfaces of a retired device go with the device
+        targets += [('interface', pk) for pk in Interface.objects.filter(
+            retired_at__isnull=False, device__retired_at__isnull=True).values_list('id', flat=True)]
+
+        for model, pk in targets:
+            if (model, pk) in busy:
+                self.stdout.write(f"Skipping {model} {pk}: a purge job is running.")
+                continue
+            result = jobs.purge_retired(self.report, model, pk)
+            self.stdout.write(self.style.SUCCESS(f"Purged {model} {pk}: {result['data']['deleted']}"))
+
+    def report(self, step, message, **extra):
+        if step != 'purge' or extra.get('deleted', 0) % (jobs.PURGE_BATCH * 20) == 0:
+            self.stdout.write(message)
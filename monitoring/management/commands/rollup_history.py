@@ -0,0 +1,45 @@
+""" Builds HistoryRollup buckets from raw History.
+
+    ----- How to use -----
+    python manage.py rollup_history                  # last 2 hours, all rollup steps
+    python manage.py rollup_history --hours 48 --step 3600
+
+    ----- CRON SAMPLE -----
+    */5 * * * * /usr/bin/python /path/to/manage.py rollup_history """
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from monitoring.timeseries import ROLLUP_STEPS, build_rollups
+
+
+class Command(BaseCommand):
+    help = "Aggregates raw History samples into HistoryRollup buckets for the metrics API."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=2,
+                            help="How far back to (re)build rollups. Default: 2")
+        parser.add_argument('--step', type=int, action='append',
+                            help=f"Bucket width in seconds; repeatable. Default: {', '.join(map(str, ROLLUP_STEPS))}")
+
+    def handle(self, *args, **options):
+        steps = options['step'] or list(ROLLUP_STEPS)
+        unknown = [s for s in steps if s not in ROLLUP_STEPS]
+        if unknown:
+            raise CommandError(f"Unsupported step(s) {unknown}; the metrics API only reads {list(ROLLUP_STEPS)}.")
+
+        stop = timezone.now()
+        start = stop - timedelta(hours=options['hours'])
+        for step in steps:
+            # Only close complete buckets; the open bucket is served from raw History
+            aligned_stop = stop - timedelta(seconds=stop.timestamp() % step)
+            window_start = start - timedelta(seconds=start.timestamp() % step)
+            written = 0
+            # One day per pass keeps memory bounded on large backfills
+            while window_start < aligned_stop:
+                window_stop = min(window_start + timedelta(days=1), aligned_stop)
+                written += build_rollups(step, window_start, window_stop)
+                window_start = window_stop
+            self.stdout.write(self.style.SUCCESS(f"{step}s rollups: {written} bucket(s) written."))
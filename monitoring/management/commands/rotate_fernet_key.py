@@ -0,0 +1,106 @@
+""" Re-encrypts the stored SNMP credentials with the current FERNET_KEY.
+
+    Rotating the key:
+      1. python manage.py rotate_fernet_key --generate      (prints a new key)
+      2. Set FERNET_KEY=<new key> and FERNET_OLD_KEYS=<old key> for the web
+         app and the poller and restart both: either key decrypts, the new
+         one encrypts.
+      3. python manage.py rotate_fernet_key                 (re-encrypts every row)
+      4. Remove FERNET_OLD_KEYS and restart.
+
+    Rows are rewritten in batches, each in its own transaction, so the web
+    app and the poller keep working while it runs. Rows already encrypted
+    with the new key are skipped, so an interrupted run can be repeated.
+
+    ----- How to use -----
+    python manage.py rotate_fernet_key
+    python manage.py rotate_fernet_key --dry-run
+    python manage.py rotate_fernet_key --batch-size 200 """
+
+from cryptography.fernet import Fernet, InvalidToken
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from monitoring.models import BackgroundJob, Device
+
+BATCH_SIZE = 500           # Rows re-encrypted per transaction
+
+# Encrypted columns: model -> fields
+ENCRYPTED = [
+    (Device, ['snmp_password', 'snmp_aes_passwd']),
+    # Credentials of jobs that have not run yet (see jobs.encrypt_secrets)
+    (BackgroundJob, ['secrets']),
+]
+
+
+class Command(BaseCommand):
+    help = "Re-encrypts device credentials with FERNET_KEY (see FERNET_OLD_KEYS)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generate', action='store_true',
+                            help="Print a new key and exit")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f"Rows per transaction. Default: {BATCH_SIZE}")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Count the rows that need re-encryption without writing")
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            self.stdout.write(Fernet.generate_key().decode())
+            return
+
+        current = Fernet(settings.FERNET_KEY)
+        if not settings.FERNET_OLD_KEYS:
+            self.stdout.write(self.style.WARNING(
+                "FERNET_OLD_KEYS is empty: only rows that fail to decrypt will be reported."))
+
+        failed = 0
+        for model, fields in ENCRYPTED:
+            rotated, skipped, errors = self.rotate(model, fields, current, options['batch_size'], options['dry_run'])
+            failed += errors
+            verb = 'need re-encryption' if options['dry_run'] else 're-encrypted'
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {rotated} {verb}, "
+                              f"{skipped} already current, {errors} undecryptable")
+        if failed:
+            raise CommandError(f"{failed} value(s) could not be decrypted with FERNET_KEY or FERNET_OLD_KEYS.")
+        self.stdout.write(self.style.SUCCESS("Done." if not options['dry_run'] else "Dry run: nothing written."))
+
+    def rotate(self, model, fields, current, batch_size, dry_run):
+        """Re-encrypts `fields` of every `model` row. Returns (rotated, skipped, errors)."""
+        rotated = skipped = errors = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                # Locks the batch so a concurrent edit is not overwritten with the old value
+                batch = list(model.objects.select_for_update().filter(pk__gt=last_pk)
+                             .order_by('pk').only('pk', *fields)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                changed = []
+                for obj in batch:
+                    dirty = False
+                    for field in fields:
+                        token = bytes(getattr(obj, field) or b'')
+                        if not token:
+                            continue
+                        try:
+                            current.decrypt(token)
+                            skipped += 1
+                            continue
+                        except InvalidToken:
+                            pass
+                        try:
+                            setattr(obj, field, settings.FERNET.rotate(token))
+                        except InvalidToken:
+                            errors += 1
+                            self.stderr.write(f"{model.__name__} {obj.pk}: {field} cannot be decrypted")
+                            continue
+                        rotated += 1
+                        dirty = True
+                    if dirty:
+                        changed.append(obj)
+                if changed and not dry_run:
+                    model.objects.bulk_update(changed, fields)
+        return rotated, skipped, errors
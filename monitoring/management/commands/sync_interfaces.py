@@ -0,0 +1,51 @@
+""" Re-syncs stored interfaces with each device's live ifTable.
+
+    ----- How to use -----
+    python manage.py sync_interfaces                       # every device, 8 at a time
+    python manage.py sync_interfaces --device 10.11.1.1 --dry-run
+    python manage.py sync_interfaces --workers 16
+
+    ----- CRON SAMPLE -----
+    30 * * * * /usr/bin/python /path/to/manage.py sync_interfaces """
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.models import Device
+from monitoring.interface_sync import DEFAULT_WORKERS, sync_devices
+
+
+class Command(BaseCommand):
+    help = "Compares each device's ifTable with its Interface rows and applies inserts, updates and retirements."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--device', action='append',
+                            help="IP address of a device to sync; repeatable. Default: all devices")
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                            help=f"Devices walked at the same time. Default: {DEFAULT_WORKERS}")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report the differences; nothing is written")
+
+    def handle(self, *args, **options):
+        devices = Device.objects.filter(retired_at__isnull=True)
+        if options['device']:
+            devices = devices.filter(ip_address__in=options['device'])
+            if not devices.exists():
+                raise CommandError("No matching devices.")
+
+        totals = {'created': 0, 'updated': 0, 'retired': 0, 'failed': 0}
+        for summary in sync_devices(devices, workers=options['workers'], dry_run=options['dry_run']):
+            if 'error' in summary:
+                totals['failed'] += 1
+                self.stderr.write(f"{summary['device']}: {summary['error']}")
+                continue
+            for key in ('created', 'updated', 'retired'):
+                totals[key] += summary[key]
+            if summary['created'] or summary['updated'] or summary['retired']:
+                self.stdout.write(f"{summary['device']}: +{summary['created']} new, "
+                                  f"{summary['updated']} updated, {summary['retired']} retired")
+
+        prefix = "Dry run: " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{totals['created']} created, {totals['updated']} updated, "
+            f"{totals['retired']} retired, {totals['failed']} device(s) failed."
+        ))
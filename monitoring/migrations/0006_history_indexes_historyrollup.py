@@ -0,0 +1,58 @@
+# Generated by Django 4.2.25 on 2026-10-18 22:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0005_alter_device_snmp_aes_passwd_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('step', models.PositiveIntegerField()),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('total', models.FloatField()),
+                ('minimum', models.FloatField()),
+                ('maximum', models.FloatField()),
+                ('last', models.FloatField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='history',
+            index=models.Index(fields=['device', 'metric', 'timestamp'], name='history_device_metric_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='history',
+            index=models.Index(fields=['interface', 'metric', 'timestamp'], name='history_iface_metric_ts'),
+        ),
+        migrations.AddField(
+            model_name='historyrollup',
+            name='device',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitoring.device'),
+        ),
+        migrations.AddField(
+            model_name='historyrollup',
+            name='interface',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='monitoring.interface'),
+        ),
+        migrations.AddField(
+            model_name='historyrollup',
+            name='metric',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, to='monitoring.metric'),
+        ),
+        migrations.AddIndex(
+            model_name='historyrollup',
+            index=models.Index(fields=['device', 'metric', 'step', 'bucket'], name='rollup_device_metric_bucket'),
+        ),
+        migrations.AddIndex(
+            model_name='historyrollup',
+            index=models.Index(fields=['step', 'bucket'], name='rollup_step_bucket'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.25 on 2026-10-18 22:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0006_history_indexes_historyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.BigIntegerField()),
+                ('owner_id', models.BigIntegerField(blank=True, null=True)),
+                ('kind', models.CharField(choices=[('metadata', 'Metadata'), ('metrics', 'Metrics'), ('deleted', 'Deleted')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.25 on 2026-10-18 22:40
+
+from django.db import migrations, models
+
+
+def create_versions(apps, schema_editor):
+    # The poller only UPDATEs these rows, so they must exist up front
+    DataVersion = apps.get_model('monitoring', 'DataVersion')
+    for name in ('metadata', 'devices'):
+        DataVersion.objects.get_or_create(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0007_devicechange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-18 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0009_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='kind',
+            field=models.CharField(choices=[('discovery', 'Device discovery'), ('sweep', 'Subnet sweep')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.25 on 2026-10-18 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0010_backgroundjob_sweep'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interface',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='interface',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.25 on 2026-10-18 22:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0011_interface_is_active_last_seen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='threshold',
+            name='clear_value',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='threshold',
+            name='min_duration',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='AlertState',
+            fields=[
+                ('threshold', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='monitoring.threshold')),
+                ('state', models.CharField(choices=[('ok', 'OK'), ('warning', 'Warning'), ('critical', 'Critical')], default='ok', max_length=10)),
+                ('pending_state', models.CharField(blank=True, choices=[('ok', 'OK'), ('warning', 'Warning'), ('critical', 'Critical')], default='', max_length=10)),
+                ('pending_since', models.DateTimeField(blank=True, null=True)),
+                ('last_value', models.TextField(blank=True, default='')),
+                ('last_sample_at', models.DateTimeField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(blank=True, null=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitoring.device')),
+                ('interface', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='monitoring.interface')),
+                ('metric', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitoring.metric')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AlertEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('threshold', 'Threshold')], default='threshold', max_length=20)),
+                ('from_state', models.CharField(choices=[('ok', 'OK'), ('warning', 'Warning'), ('critical', 'Critical')], max_length=10)),
+                ('to_state', models.CharField(choices=[('ok', 'OK'), ('warning', 'Warning'), ('critical', 'Critical')], max_length=10)),
+                ('value', models.TextField(blank=True, default='')),
+                ('sample_at', models.DateTimeField()),
+                ('message', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitoring.device')),
+                ('interface', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='monitoring.interface')),
+                ('metric', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitoring.metric')),
+                ('threshold', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='monitoring.threshold')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['device', 'created_at'], name='alertevent_device_created')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-18 22:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0012_alerting'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alertevent',
+            name='kind',
+            field=models.CharField(choices=[('threshold', 'Threshold'), ('anomaly', 'Anomaly')], default='threshold', max_length=20),
+        ),
+    ]
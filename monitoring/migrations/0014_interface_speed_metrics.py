@@ -0,0 +1,28 @@
+# Generated by Django 4.2.25 on 2026-10-18 22:56
+
+from django.db import migrations, models
+
+
+def create_interface_metrics(apps, schema_editor):
+    # 'Errors In/Out' are written by the poller (looked up by name); the utilization
+    # metrics are derived by the alert evaluator so interface thresholds can target them
+    Metric = apps.get_model('monitoring', 'Metric')
+    for name, unit in (('Errors In', 'errors'), ('Errors Out', 'errors'),
+                       ('Utilization In', '%'), ('Utilization Out', '%')):
+        Metric.objects.get_or_create(metric_name=name, defaults={'unit': unit})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0013_alertevent_anomaly'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interface',
+            name='speed',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(create_interface_metrics, migrations.RunPython.noop),
+    ]
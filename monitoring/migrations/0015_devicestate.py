@@ -0,0 +1,26 @@
+# Generated by Django 4.2.25 on 2026-10-18 22:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0014_interface_speed_metrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceState',
+            fields=[
+                ('device', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='state', serialize=False, to='monitoring.device')),
+                ('status', models.CharField(choices=[('up', 'Up'), ('down', 'Down'), ('unknown', 'Unknown')], db_index=True, default='unknown', max_length=10)),
+                ('reason', models.CharField(blank=True, choices=[('icmp_loss', 'ICMP loss'), ('snmp_timeout', 'SNMP timeout')], default='', max_length=20)),
+                ('last_success', models.DateTimeField(blank=True, null=True)),
+                ('last_checked', models.DateTimeField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(blank=True, null=True)),
+                ('failures', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.25 on 2026-10-18 23:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0015_devicestate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProbeSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('sent', models.PositiveSmallIntegerField(default=0)),
+                ('received', models.PositiveSmallIntegerField(default=0)),
+                ('loss', models.FloatField()),
+                ('rtt_min', models.FloatField(blank=True, null=True)),
+                ('rtt_avg', models.FloatField(blank=True, null=True)),
+                ('rtt_max', models.FloatField(blank=True, null=True)),
+                ('jitter', models.FloatField(blank=True, null=True)),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitoring.device')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['device', 'timestamp'], name='probesample_device_ts')],
+            },
+        ),
+    ]
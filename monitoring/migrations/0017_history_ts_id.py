@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0016_probesample'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='history',
+            index=models.Index(fields=['timestamp', 'id'], name='history_ts_id'),
+        ),
+    ]
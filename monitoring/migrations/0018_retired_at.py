@@ -0,0 +1,28 @@
+# Generated by Django 4.2.25 on 2026-10-18 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0017_history_ts_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='retired_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='interface',
+            name='retired_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='kind',
+            field=models.CharField(choices=[('discovery', 'Device discovery'), ('sweep', 'Subnet sweep'), ('purge', 'Data purge')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-18 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0018_retired_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicemodel',
+            name='bulk_max_repetitions',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
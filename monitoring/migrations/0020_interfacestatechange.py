@@ -0,0 +1,28 @@
+# Generated by Django 4.2.25 on 2026-10-18 23:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0019_devicemodel_bulk_max_repetitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterfaceStateChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('admin', 'Admin status'), ('oper', 'Oper status')], max_length=10)),
+                ('previous', models.CharField(max_length=50)),
+                ('status', models.CharField(max_length=50)),
+                ('changed_at', models.DateTimeField()),
+                ('interface', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitoring.interface')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['interface', 'changed_at'], name='ifstatechange_iface_changed')],
+            },
+        ),
+    ]
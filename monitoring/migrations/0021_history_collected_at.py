@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-18 23:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0020_interfacestatechange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='history',
+            name='collected_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from cryptography.fernet import Fernet
@@ -55,6 +57,10 @@ class DeviceModel(models.Model):
     # The model belongs to a type (e.g., Router or Switch)
     type = models.ForeignKey(DeviceType, on_delete=models.RESTRICT)
 
+    # Rows per SNMP GETBULK that devices of this model handle well, learned by the poller
+    # (None until it has walked one; see snmpv3.Session.walk)
+    bulk_max_repetitions = models.PositiveSmallIntegerField(null=True, blank=True)
+
     def __str__(self):
         return self.model_name
 
@@ -86,6 +92,10 @@ class Device(models.Model):
     # Whether the device is actively monitored
     # is_active = models.BooleanField(default=True)
 
+    # Set when the device is deleted: it leaves polling and the UI right away
+    # while its history is purged in the background (see jobs.retire_device)
+    retired_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
     def __str__(self):
         return self.hostname
     
@@ -149,6 +159,20 @@ class Interface(models.Model):
     # Custom alias or label for easier identification
     ifAlias = models.CharField(max_length=255, blank=True, null=True)
 
+    # False once the interface disappears from the device's ifTable (history is kept;
+    # a retired row whose ifIndex is reused is moved to a negative ifIndex)
+    is_active = models.BooleanField(default=True)
+
+    # Last time an interface re-sync saw this interface on the device
+    last_seen = models.DateTimeField(null=True, blank=True)
+
+    # Nominal speed in bits per second (ifHighSpeed / ifSpeed), filled by the interface re-sync;
+    # needed to evaluate utilization thresholds
+    speed = models.BigIntegerField(null=True, blank=True)
+
+    # Set when the interface is deleted; its history is purged in the background
+    retired_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
     class Meta:
         # Ensures a device cannot have duplicate ifIndex values
         unique_together = ('device', 'ifIndex')
@@ -198,15 +222,186 @@ class History(models.Model):
     # The recorded value (e.g., 60%)
     value = models.TextField()
 
-    # The timestamp when the data was collected
+    # The polling slot the sample belongs to: the scheduled start of the poller cycle,
+    # aligned to its interval and the same for every device of that cycle (samples of
+    # a manual poll and older rows carry their collection time here)
     timestamp = models.DateTimeField() 
 
+    # When the device actually answered (null for rows written before it was recorded)
+    collected_at = models.DateTimeField(null=True, blank=True)
+
     # Change timestamp to CharField since it's stored as a string
     # timestamp = models.CharField(max_length=255)
 
     class Meta:
         # Rename the table in the admin to be more readable
         verbose_name_plural = "History"
+        # Time-range lookups for a single series (charts, latest value)
+        indexes = [
+            models.Index(fields=['device', 'metric', 'timestamp'], name='history_device_metric_ts'),
+            models.Index(fields=['interface', 'metric', 'timestamp'], name='history_iface_metric_ts'),
+            # Newest-first browsing across all devices (admin keyset pagination)
+            models.Index(fields=['timestamp', 'id'], name='history_ts_id'),
+        ]
+
+
+# ======================
+# INTERFACE STATE CHANGE TABLE
+# ======================
+class InterfaceStateChange(models.Model):
+    # One row per admin/oper status transition, written by the poller. History only
+    # keeps status rows on a change plus a periodic keep-alive, so this log is what
+    # flap counts are read from.
+    KIND_ADMIN = 'admin'
+    KIND_OPER = 'oper'
+    KIND_CHOICES = [
+        (KIND_ADMIN, 'Admin status'),
+        (KIND_OPER, 'Oper status'),
+    ]
+
+    interface = models.ForeignKey(Interface, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+
+    # Raw status strings as stored in History, e.g. "up(1)" -> "down(2)"
+    previous = models.CharField(max_length=50)
+    status = models.CharField(max_length=50)
+
+    # Poll time of the first sample with the new status
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['interface', 'changed_at'], name='ifstatechange_iface_changed'),
+        ]
+
+    def __str__(self):
+        return f"{self.interface} {self.kind}: {self.previous} -> {self.status}"
+
+
+# ======================
+# HISTORY ROLLUP TABLE
+# ======================
+class HistoryRollup(models.Model):
+    # Pre-aggregated History buckets (built by `manage.py rollup_history`)
+    device = models.ForeignKey(Device, on_delete=models.CASCADE)
+    metric = models.ForeignKey(Metric, on_delete=models.RESTRICT)
+    interface = models.ForeignKey(Interface, on_delete=models.CASCADE, null=True, blank=True)
+
+    # Bucket width in seconds (e.g., 300 or 3600) and bucket start time
+    step = models.PositiveIntegerField()
+    bucket = models.DateTimeField()
+
+    # Partial aggregates; avg = total / count
+    count = models.PositiveIntegerField()
+    total = models.FloatField()
+    minimum = models.FloatField()
+    maximum = models.FloatField()
+    last = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['device', 'metric', 'step', 'bucket'], name='rollup_device_metric_bucket'),
+            models.Index(fields=['step', 'bucket'], name='rollup_step_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id}/{self.metric_id} @ {self.bucket} ({self.step}s)"
+
+
+# ======================
+# DEVICE CHANGE FEED TABLE
+# ======================
+class DeviceChange(models.Model):
+    # One row per device change; the auto-increment id is the feed cursor
+    KIND_METADATA = 'metadata'   # Device/Interface rows edited (signals)
+    KIND_METRICS = 'metrics'     # New samples ingested by the poller
+    KIND_DELETED = 'deleted'     # Device removed (tombstone)
+    KIND_CHOICES = [
+        (KIND_METADATA, 'Metadata'),
+        (KIND_METRICS, 'Metrics'),
+        (KIND_DELETED, 'Deleted'),
+    ]
+
+    # Plain ids (no FK) so tombstones outlive the device row
+    device_id = models.BigIntegerField()
+    owner_id = models.BigIntegerField(null=True, blank=True)
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"#{self.pk} device {self.device_id} ({self.kind})"
+
+
+# ======================
+# DATA VERSION TABLE
+# ======================
+class DataVersion(models.Model):
+    # Counters bumped whenever the data behind a cached API response changes
+    # ('metadata': brands/types/models, 'devices': device list and its metrics)
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+# ======================
+# BACKGROUND JOB TABLE
+# ======================
+class BackgroundJob(models.Model):
+    # Long-running work (e.g., device discovery) executed outside the request
+    KIND_DISCOVERY = 'discovery'
+    KIND_SWEEP = 'sweep'
+    KIND_PURGE = 'purge'
+    KIND_CHOICES = [
+        (KIND_DISCOVERY, 'Device discovery'),
+        (KIND_SWEEP, 'Subnet sweep'),
+        (KIND_PURGE, 'Data purge'),
+    ]
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    # Random id so job URLs cannot be guessed
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+
+    # Who started the job (only they, or a superuser, may read it)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+
+    # Non-secret inputs (e.g., IP address, SNMP user)
+    params = models.JSONField(default=dict, blank=True)
+    # Secrets needed by the job, encrypted with the Fernet key
+    secrets = models.BinaryField(default=b'')
+
+    # Progress events ([{"step": ..., "message": ..., "at": ...}]) and final outcome
+    progress = models.JSONField(default=list, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Heartbeat: refreshed with every progress write while the job runs
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
 
 
 # ======================
@@ -231,11 +426,169 @@ class Threshold(models.Model):
     # Alert severity level (e.g., Warning, Critical)
     alert_level = models.CharField(max_length=50, default='Warning')
 
+    # Hysteresis: the alert clears only once the condition no longer holds against
+    # this value (e.g., fire above 90, clear below 80). Empty = same as `value`.
+    clear_value = models.CharField(max_length=255, blank=True, default='')
+
+    # Seconds the condition (or its clearing) must hold before the state changes
+    min_duration = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         # Example: "CoreRouter1 - CPU Usage alert"
         return f"{self.device.hostname} - {self.metric.metric_name} alert"
 
 
+# ======================
+# ALERT STATE / EVENT TABLES
+# ======================
+class AlertState(models.Model):
+    # Current state of one Threshold rule, maintained by `manage.py evaluate_alerts`
+    STATE_OK = 'ok'
+    STATE_WARNING = 'warning'
+    STATE_CRITICAL = 'critical'
+    STATE_CHOICES = [
+        (STATE_OK, 'OK'),
+        (STATE_WARNING, 'Warning'),
+        (STATE_CRITICAL, 'Critical'),
+    ]
+
+    threshold = models.OneToOneField(Threshold, on_delete=models.CASCADE, primary_key=True)
+
+    # Copied from the threshold so dashboards can read states without joins
+    device = models.ForeignKey(Device, on_delete=models.CASCADE)
+    metric = models.ForeignKey(Metric, on_delete=models.CASCADE)
+    interface = models.ForeignKey(Interface, on_delete=models.CASCADE, null=True, blank=True)
+
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=STATE_OK)
+
+    # State the rule is moving to while `min_duration` has not elapsed yet
+    pending_state = models.CharField(max_length=10, choices=STATE_CHOICES, blank=True, default='')
+    pending_since = models.DateTimeField(null=True, blank=True)
+
+    # Last evaluated sample
+    last_value = models.TextField(blank=True, default='')
+    last_sample_at = models.DateTimeField(null=True, blank=True)
+
+    # When `state` last changed
+    changed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.threshold} - {self.state}"
+
+
+class AlertEvent(models.Model):
+    # Append-only log of alert state transitions
+    KIND_THRESHOLD = 'threshold'
+    KIND_ANOMALY = 'anomaly'      # Written by `manage.py detect_anomalies` (no threshold)
+    KIND_CHOICES = [
+        (KIND_THRESHOLD, 'Threshold'),
+        (KIND_ANOMALY, 'Anomaly'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=KIND_THRESHOLD)
+    threshold = models.ForeignKey(Threshold, on_delete=models.SET_NULL, null=True, blank=True)
+    device = models.ForeignKey(Device, on_delete=models.CASCADE)
+    metric = models.ForeignKey(Metric, on_delete=models.CASCADE)
+    interface = models.ForeignKey(Interface, on_delete=models.CASCADE, null=True, blank=True)
+
+    from_state = models.CharField(max_length=10, choices=AlertState.STATE_CHOICES)
+    to_state = models.CharField(max_length=10, choices=AlertState.STATE_CHOICES)
+
+    # Sample that caused the transition
+    value = models.TextField(blank=True, default='')
+    sample_at = models.DateTimeField()
+
+    message = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['device', 'created_at'], name='alertevent_device_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.device} {self.metric}: {self.from_state} -> {self.to_state}"
+
+
+class IngestCheckpoint(models.Model):
+    # Last History id processed by a background consumer (e.g., 'alerts')
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
+
+
+# ======================
+# DEVICE STATE TABLE
+# ======================
+class DeviceState(models.Model):
+    # Reachability of a device, written by the poller and `manage.py probe_devices`
+    STATUS_UP = 'up'
+    STATUS_DOWN = 'down'
+    STATUS_UNKNOWN = 'unknown'
+    STATUS_CHOICES = [
+        (STATUS_UP, 'Up'),
+        (STATUS_DOWN, 'Down'),
+        (STATUS_UNKNOWN, 'Unknown'),
+    ]
+    REASON_ICMP_LOSS = 'icmp_loss'           # No ping reply and no SNMP answer
+    REASON_SNMP_TIMEOUT = 'snmp_timeout'     # Answers ping, but the SNMP agent does not
+    REASON_CHOICES = [
+        (REASON_ICMP_LOSS, 'ICMP loss'),
+        (REASON_SNMP_TIMEOUT, 'SNMP timeout'),
+    ]
+
+    device = models.OneToOneField(Device, on_delete=models.CASCADE, primary_key=True, related_name='state')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_UNKNOWN, db_index=True)
+
+    # Why the device is down (empty while up)
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, blank=True, default='')
+
+    # Last successful SNMP answer, last check of any outcome, last status change
+    last_success = models.DateTimeField(null=True, blank=True)
+    last_checked = models.DateTimeField(null=True, blank=True)
+    changed_at = models.DateTimeField(null=True, blank=True)
+
+    # Consecutive failed checks
+    failures = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.device} - {self.status}"
+
+
+# ======================
+# ICMP PROBE SAMPLE TABLE
+# ======================
+class ProbeSample(models.Model):
+    # Result of one ICMP probe round (monitoring/icmp_prober.py), numeric so
+    # latency and loss can be charted and aggregated like other series
+    device = models.ForeignKey(Device, on_delete=models.CASCADE)
+    timestamp = models.DateTimeField()
+
+    # Echo requests sent and replies received
+    sent = models.PositiveSmallIntegerField(default=0)
+    received = models.PositiveSmallIntegerField(default=0)
+
+    # Packet loss in percent
+    loss = models.FloatField()
+
+    # Round-trip times and jitter in milliseconds (null when nothing answered)
+    rtt_min = models.FloatField(null=True, blank=True)
+    rtt_avg = models.FloatField(null=True, blank=True)
+    rtt_max = models.FloatField(null=True, blank=True)
+    jitter = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['device', 'timestamp'], name='probesample_device_ts'),
+        ]
+
+    def __str__(self):
+        return f"{self.device} - {self.timestamp} - {self.loss}% loss"
+
+
 # ======================
 # USER PREFERENCE TABLE (NEW)
 # ======================
@@ -0,0 +1,267 @@
+""" Alert notifications: coalesces AlertEvent transitions into digests.
+
+    The evaluator hands its new events to Dispatcher.enqueue(), which only
+    appends to a bounded in-memory queue and never waits; when the backlog
+    is full the oldest notifications are dropped (and counted), so a slow
+    mail server can never stall ingest. A dispatcher thread groups the
+    events per recipient and sends one digest per ALERT_DIGEST_WINDOW:
+
+    - a rule that flaps inside a window is one line ("flapped 6x, now critical")
+    - a rule whose final state was already sent to the same recipient within
+      REPEAT_INTERVAL is suppressed
+    - failed sends are retried with exponential backoff, without blocking
+      the other recipients
+
+    Sinks are pluggable: SINKS maps a name to an object with
+    send(address, digest); 'email' (SMTP through Django's mail settings) and
+    'webhook' (JSON POST) are built in. """
+
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.request
+from collections import Counter
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+DIGEST_WINDOW = getattr(settings, 'ALERT_DIGEST_WINDOW', 60)   # Seconds of events coalesced into one digest
+REPEAT_INTERVAL = 15 * 60       # Same final state is not re-sent to a recipient within this many seconds
+MAX_BACKLOG = 10000             # Notifications waiting for the dispatcher thread
+MAX_ATTEMPTS = 5                # Sends per digest before it is dropped
+RETRY_BACKOFF = 10              # Seconds before the first retry (doubles every attempt)
+SEND_TIMEOUT = 10               # Seconds per SMTP / HTTP call
+MAX_LINES = 50                  # Alerts listed in an e-mail body
+# ---------------------------------------------------------------------------------
+
+
+# ----- Sinks -----
+
+class EmailSink:
+    """Sends the digest as a plain-text e-mail (EMAIL_HOST / EMAIL_PORT / ... settings)."""
+
+    def send(self, address, digest):
+        connection = get_connection(timeout=SEND_TIMEOUT)
+        EmailMessage(
+            subject=digest_subject(digest),
+            body=digest_text(digest),
+            from_email=getattr(settings, 'ALERT_EMAIL_FROM', None),
+            to=[address],
+            connection=connection,
+        ).send()
+
+
+class WebhookSink:
+    """POSTs the digest as JSON; any non-2xx answer counts as a failure."""
+
+    def send(self, address, digest):
+        body = json.dumps({
+            'subject': digest_subject(digest),
+            'window_start': digest['opened'],
+            'alerts': digest['alerts'],
+            'suppressed': digest['suppressed'],
+        }).encode()
+        request = urllib.request.Request(address, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=SEND_TIMEOUT) as response:
+            if not 200 <= response.status < 300:
+                raise RuntimeError(f"Webhook answered HTTP {response.status}")
+
+
+SINKS = {
+    'email': EmailSink(),
+    'webhook': WebhookSink(),
+}
+
+
+# ----- Notifications and digests -----
+
+def notification(event, threshold):
+    """Plain dict describing one AlertEvent (built on the ingest side, so the dispatcher needs no DB)."""
+    device = threshold.device
+    return {
+        'threshold_id': threshold.id,
+        'device_id': device.id,
+        'hostname': device.hostname,
+        'ip_address': device.ip_address,
+        'owner_email': device.user.email if device.user_id and device.user else '',
+        'metric': threshold.metric.metric_name,
+        'interface': threshold.interface.ifName if threshold.interface_id else None,
+        'from_state': event.from_state,
+        'to_state': event.to_state,
+        'value': event.value,
+        'at': event.sample_at.isoformat(),
+        'message': event.message,
+    }
+
+
+def recipients_for(note):
+    """(sink name, address) pairs that receive `note`."""
+    recipients = []
+    if getattr(settings, 'ALERT_EMAIL_OWNERS', True) and note['owner_email']:
+        recipients.append(('email', note['owner_email']))
+    recipients += [('email', address) for address in getattr(settings, 'ALERT_EMAIL_TO', [])
+                   if address != note['owner_email']]
+    recipients += [('webhook', url) for url in getattr(settings, 'ALERT_WEBHOOK_URLS', [])]
+    return recipients
+
+
+def digest_subject(digest):
+    states = Counter(alert['to_state'] for alert in digest['alerts'])
+    summary = ', '.join(f"{count} {state}" for state, count in sorted(states.items()))
+    return f"[Network Monitor] {len(digest['alerts'])} alert change(s): {summary}"
+
+
+def digest_text(digest):
+    lines = []
+    for alert in digest['alerts'][:MAX_LINES]:
+        target = alert['hostname'] + (f" {alert['interface']}" if alert['interface'] else '')
+        change = f"{alert['from_state']} -> {alert['to_state']}"
+        if alert['transitions'] > 1:
+            change += f" (flapped {alert['transitions']}x)"
+        lines.append(f"{alert['at']}  {target} ({alert['ip_address']})  {alert['metric']} = {alert['value']}  {change}")
+    if len(digest['alerts']) > MAX_LINES:
+        lines.append(f"... and {len(digest['alerts']) - MAX_LINES} more.")
+    if digest['suppressed']:
+        lines.append(f"{digest['suppressed']} repeated alert(s) already notified were suppressed.")
+    return '\n'.join(lines) + '\n'
+
+
+class Dispatcher:
+    """
+    Background digest sender. enqueue() is safe to call from the ingest loop;
+    start() launches the thread and stop() flushes what is pending.
+    """
+
+    def __init__(self, window=DIGEST_WINDOW, max_backlog=MAX_BACKLOG, sinks=None):
+        self.window = window
+        self.sinks = sinks if sinks is not None else SINKS
+        self.queue = queue.Queue(maxsize=max_backlog)
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self._open = {}        # (sink, address) -> digest being collected
+        self._retry = []       # digests waiting for another attempt
+        self._notified = {}    # ((sink, address), threshold_id) -> (state, monotonic time)
+        self._stopping = threading.Event()
+        self._thread = None
+
+    # --- ingest side ---
+
+    def enqueue(self, notes):
+        """Queues notifications without blocking; drops the oldest ones when the backlog is full."""
+        for note in notes:
+            while True:
+                try:
+                    self.queue.put_nowait(note)
+                    break
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+        if self.dropped and self.dropped % 1000 == 1:
+            logger.warning(f"Notification backlog full: {self.dropped} notification(s) dropped so far.")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='monitoring-notify', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=30):
+        """Sends everything pending (one attempt per digest) and stops the thread."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # --- dispatcher thread ---
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self._add(self.queue.get(timeout=self._wait()))
+            except queue.Empty:
+                pass
+            self._flush(time.monotonic())
+        while True:
+            try:
+                self._add(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self._flush(time.monotonic(), final=True)
+
+    def _wait(self):
+        """Seconds until the next digest or retry is due (at most 1, so stop() is noticed)."""
+        due = [digest['due'] for digest in self._open.values()] + [digest['due'] for digest in self._retry]
+        return max(0.05, min([1.0] + [d - time.monotonic() for d in due]))
+
+    def _add(self, note):
+        now = time.monotonic()
+        for recipient in recipients_for(note):
+            if recipient[0] not in self.sinks:
+                continue
+            digest = self._open.get(recipient)
+            if digest is None:
+                digest = self._open[recipient] = {
+                    'recipient': recipient, 'opened': note['at'], 'due': now + self.window,
+                    'rules': {}, 'alerts': [], 'suppressed': 0, 'attempts': 0,
+                }
+            rule = digest['rules'].get(note['threshold_id'])
+            if rule is None:
+                # First transition in this window keeps its from_state; later ones update the rest
+                digest['rules'][note['threshold_id']] = {**note, 'transitions': 1}
+            else:
+                rule.update({key: note[key] for key in ('to_state', 'value', 'at', 'message')})
+                rule['transitions'] += 1
+
+    def _flush(self, now, final=False):
+        for recipient, digest in list(self._open.items()):
+            if final or digest['due'] <= now:
+                del self._open[recipient]
+                self._close(digest, now)
+                if digest['alerts']:
+                    self._deliver(digest, now)
+        retry, self._retry = self._retry, []
+        for digest in retry:
+            if final or digest['due'] <= now:
+                self._deliver(digest, now)
+            else:
+                self._retry.append(digest)
+
+    def _close(self, digest, now):
+        """Turns the per-rule entries into the digest's alert list, dropping recent repeats."""
+        for threshold_id, rule in digest['rules'].items():
+            key = (digest['recipient'], threshold_id)
+            last = self._notified.get(key)
+            if last and last[0] == rule['to_state'] and now - last[1] < REPEAT_INTERVAL:
+                digest['suppressed'] += 1
+                continue
+            self._notified[key] = (rule['to_state'], now)
+            rule.pop('owner_email', None)
+            digest['alerts'].append(rule)
+        digest['alerts'].sort(key=lambda alert: (alert['hostname'], alert['metric'], alert['interface'] or ''))
+        # Forget old entries so the map stays bounded by active rules
+        for key in [key for key, (_, at) in self._notified.items() if now - at >= REPEAT_INTERVAL]:
+            del self._notified[key]
+
+    def _deliver(self, digest, now):
+        sink_name, address = digest['recipient']
+        digest['attempts'] += 1
+        try:
+            self.sinks[sink_name].send(address, digest)
+            self.sent += 1
+        except Exception as e:
+            if digest['attempts'] >= MAX_ATTEMPTS or self._stopping.is_set():
+                self.failed += 1
+                logger.error(f"Dropping alert digest for {sink_name}:{address} after "
+                             f"{digest['attempts']} attempt(s): {e}")
+            else:
+                digest['due'] = now + RETRY_BACKOFF * 2 ** (digest['attempts'] - 1)
+                self._retry.append(digest)
+                logger.warning(f"Alert digest for {sink_name}:{address} failed ({e}); retrying.")
@@ -0,0 +1,155 @@
+""" Device reachability (DeviceState).
+
+    The status shown by the API is whatever was recorded here, so reading
+    it is a primary-key lookup instead of a scan of the device's History.
+    Two writers keep it current:
+
+    - the poller marks a device up after a successful poll and down
+      (snmp_timeout) when the agent does not answer;
+    - `manage.py probe_devices` checks every device each PROBE_INTERVAL
+      seconds (SNMP get of sysUpTime, plus a ping to tell ICMP loss from an
+      SNMP timeout), so an outage is detected within one probe interval.
+
+    When datagram ICMP sockets are allowed (see icmp_prober.py), each pass
+    starts with one asynchronous ping of the whole fleet; its RTT, jitter
+    and loss are stored as ProbeSample rows and decide the down reason
+    without a second ping.
+
+    Only transitions write a DeviceChange and bump the device-list cache. """
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import icmp_prober
+from .models import Device, DeviceChange, DeviceState, ProbeSample
+from .discover_device import run_ping, run_snmp_varbinds
+from .response_cache import bump_version, DEVICES
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+SYS_UPTIME_OID = "1.3.6.1.2.1.1.3.0"
+PROBE_INTERVAL = 30        # Seconds between fast probes (detection latency)
+PROBE_WORKERS = 64         # Devices probed at the same time
+DOWN_AFTER = 1             # Consecutive failed checks before a device is marked down
+PROBE_RETENTION = timedelta(days=getattr(settings, 'PROBE_RETENTION_DAYS', 30))  # ProbeSample rows kept
+# ---------------------------------------------------------------------------------
+
+
+def check_device(device, pinged=None):
+    """
+    One fast check. Returns (reachable, reason); reason is '' when reachable.
+    `pinged` is the outcome of an ICMP probe already sent this pass, if any.
+    """
+    (value, _), = run_snmp_varbinds(
+        "snmpget", device.username, device.get_snmp_password() or '', device.get_snmp_aes_passwd() or '',
+        device.ip_address, [SYS_UPTIME_OID], retries=1, timeout=1)
+    if "Error" not in value:
+        return True, ''
+    # No SNMP answer: a ping tells a dead host from a silent agent
+    if pinged is None:
+        pinged, _ = run_ping(device.ip_address, count=2, deadline=2)
+    return False, DeviceState.REASON_SNMP_TIMEOUT if pinged else DeviceState.REASON_ICMP_LOSS
+
+
+def _check_in_thread(device, pinged=None):
+    try:
+        return device, check_device(device, pinged)
+    except Exception as e:
+        logger.warning(f"Reachability check failed for {device.ip_address}: {e}")
+        return device, None
+    finally:
+        close_old_connections()
+
+
+def record_results(results, at=None, down_after=DOWN_AFTER):
+    """
+    Applies check results {device: (reachable, reason)} to DeviceState in bulk.
+    Returns the transitions as [(device, old status, new status, reason)].
+    """
+    at = at or timezone.now()
+    states = DeviceState.objects.in_bulk([device.id for device in results])
+    missing = [DeviceState(device_id=device.id) for device in results if device.id not in states]
+    DeviceState.objects.bulk_create(missing)
+    states.update({state.device_id: state for state in missing})
+
+    transitions = []
+    for device, (reachable, reason) in results.items():
+        state = states[device.id]
+        previous = state.status
+        state.last_checked = at
+        if reachable:
+            state.failures, state.reason, state.last_success = 0, '', at
+            state.status = DeviceState.STATUS_UP
+        else:
+            state.failures += 1
+            if state.failures >= down_after:
+                state.status, state.reason = DeviceState.STATUS_DOWN, reason
+        if state.status != previous:
+            state.changed_at = at
+            transitions.append((device, previous, state.status, state.reason))
+
+    with transaction.atomic():
+        DeviceState.objects.bulk_update(
+            list(states.values()), ['status', 'reason', 'last_success', 'last_checked', 'changed_at', 'failures'],
+            batch_size=500)
+        DeviceChange.objects.bulk_create([
+            DeviceChange(device_id=device.id, owner_id=device.user_id, kind=DeviceChange.KIND_METADATA)
+            for device, *_ in transitions
+        ])
+    if transitions:
+        bump_version(DEVICES)
+    return transitions
+
+
+def ping_devices(devices, at=None):
+    """
+    Pings `devices` in one asynchronous ICMP pass and stores a ProbeSample per device.
+    Returns {device id: True if any reply came back}.
+    """
+    at = at or timezone.now()
+    results = icmp_prober.ping_hosts([device.ip_address for device in devices])
+    samples = []
+    for device in devices:
+        result = results.get(device.ip_address)
+        if result is None or result['error']:
+            continue
+        samples.append(ProbeSample(
+            device_id=device.id, timestamp=at, sent=result['sent'], received=result['received'],
+            loss=result['loss'], rtt_min=result['rtt_min'], rtt_avg=result['rtt_avg'],
+            rtt_max=result['rtt_max'], jitter=result['jitter']))
+    ProbeSample.objects.bulk_create(samples, batch_size=1000)
+    return {sample.device_id: sample.received > 0 for sample in samples}
+
+
+def prune_samples(retention=PROBE_RETENTION):
+    """Deletes ProbeSample rows older than `retention`. Returns the number deleted."""
+    deleted, _ = ProbeSample.objects.filter(timestamp__lt=timezone.now() - retention).delete()
+    return deleted
+
+
+def probe_devices(devices=None, workers=PROBE_WORKERS, snmp=True):
+    """
+    Checks `devices` (default: all) concurrently and records the results. Returns the transitions.
+    With snmp=False only the ICMP pass runs (RTT/loss samples, no DeviceState update).
+    """
+    devices = list(devices if devices is not None else Device.objects.filter(retired_at__isnull=True))
+    if not devices:
+        return []
+    pinged = {}
+    if icmp_prober.available():
+        try:
+            pinged = ping_devices(devices)
+        except icmp_prober.IcmpUnavailable as e:
+            logger.warning(f"ICMP probe skipped: {e}")
+    if not snmp:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(devices)), thread_name_prefix='monitoring-probe') as pool:
+        checks = pool.map(_check_in_thread, devices, [pinged.get(device.id) for device in devices])
+        results = dict(result for result in checks if result[1] is not None)
+    return record_results(results)
@@ -0,0 +1,160 @@
+""" Versioned response cache with conditional GET support.
+
+    Responses are cached per (endpoint, user scope, request path, data
+    version). A DataVersion counter is bumped by model signals and by the
+    poller's ingest path, which makes every older cache entry unreachable;
+    the bounded LRU then evicts it. Clients revalidate with ETag /
+    Last-Modified and receive `304 Not Modified` while nothing changed.
+
+    Version reads are memoized per process for VERSION_TTL seconds, so hot
+    dashboard reads do not query the monitoring tables at all. Bumps made
+    by another process become visible after at most VERSION_TTL seconds. """
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import DataVersion
+
+# --- CONFIGURATION ---
+MAX_ENTRIES = 512     # LRU capacity (responses)
+VERSION_TTL = 2.0     # Seconds a DataVersion read is trusted in this process
+# ---------------------------------------------------------------------------------
+
+METADATA = 'metadata'
+DEVICES = 'devices'
+THRESHOLDS = 'thresholds'   # Not a response cache: tells the alert evaluator to reload its rules
+
+
+class LRUCache:
+    """Small thread-safe LRU keyed by tuples."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = LRUCache()
+
+_versions = {}          # name -> (version, updated_at, read_at)
+_versions_lock = threading.Lock()
+
+
+def get_version(name):
+    """Returns (version, updated_at) for a DataVersion row, memoized for VERSION_TTL."""
+    now = time.monotonic()
+    with _versions_lock:
+        cached = _versions.get(name)
+    if cached and now - cached[2] < VERSION_TTL:
+        return cached[0], cached[1]
+
+    row, _ = DataVersion.objects.get_or_create(name=name)
+    with _versions_lock:
+        _versions[name] = (row.version, row.updated_at, now)
+    return row.version, row.updated_at
+
+
+def bump_version(*names):
+    """
+    Marks the data behind `names` as changed (called from signals). Inside a transaction the
+    bump waits for its commit, so readers never see a new version before the data (or one for
+    a transaction that was rolled back).
+    """
+    transaction.on_commit(lambda: _bump(names))
+
+
+def _bump(names):
+    for name in names:
+        updated = DataVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=timezone.now())
+        if not updated:
+            DataVersion.objects.get_or_create(name=name, defaults={'version': 1})
+        with _versions_lock:
+            _versions.pop(name, None)
+
+
+def user_scope(user):
+    """Cache scope: everything a superuser sees is shared; normal users see only their own devices."""
+    return 'all' if user.is_superuser else f'user:{user.pk}'
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(last_modified.timestamp()) <= if_modified_since
+
+
+def cached_json_response(request, endpoint, version_name, build, scope='public', headers=None):
+    """
+    Serves `build()` (JSON-serializable data) through the versioned cache.
+
+    - `request`: DRF request of a GET view
+    - `endpoint`: cache namespace (e.g., 'device-list')
+    - `version_name`: DataVersion row that invalidates this response
+    - `scope`: 'public' or user_scope(request.user)
+    - `headers`: optional callable returning extra response headers; it runs
+      before `build()` and its result is cached with the body
+    """
+    # The browsable API (HTML) is not cached
+    renderer = getattr(request, 'accepted_renderer', None)
+    if renderer is not None and renderer.format != 'json':
+        extra = headers() if headers else {}
+        response = Response(build())
+        for name, value in extra.items():
+            response[name] = value
+        return response
+
+    version, updated_at = get_version(version_name)
+    key = (endpoint, scope, request.get_full_path(), version)
+    etag = '"' + hashlib.sha1(repr(key).encode()).hexdigest()[:20] + '"'
+
+    entry = response_cache.get(key)
+    if _not_modified(request, etag, updated_at):
+        response = HttpResponseNotModified()
+        # Not cached in this process (evicted, or served by another worker): the body is not
+        # needed, but the extra headers (e.g., X-Change-Cursor) are
+        extra = entry[1] if entry else (headers() if headers else {})
+    else:
+        if entry is None:
+            extra = headers() if headers else {}
+            entry = (JSONRenderer().render(build()), extra)
+            response_cache.set(key, entry)
+        response = HttpResponse(entry[0], content_type='application/json')
+        extra = entry[1]
+
+    for name, value in extra.items():
+        response[name] = value
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(updated_at.timestamp())
+    # Browsers must revalidate, but may reuse the body on 304
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -1,12 +1,13 @@
 # monitoring/serializers.py - FINAL REFACTORED VERSION
 
+import json
 import logging
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.db.models import Max, F 
 from datetime import timedelta               # <--- ADD THIS
 from django.utils import timezone
-from .models import Device, DeviceModel, Metric, UserPreference, Threshold, Interface, Brand, DeviceType
+from .models import Device, DeviceModel, Metric, UserPreference, Threshold, Interface, Brand, DeviceType, AlertState, DeviceState
 
 # Get an instance of a logger to print errors to your console
 logger = logging.getLogger(__name__)
@@ -53,7 +54,7 @@ class DeviceSerializer(serializers.ModelSerializer):
 # --- HELPER FUNCTION 1: Optimized (NOW RETURNS TIMESTAMP) ---
     def get_latest_metrics_data(self, obj):
         
-        # 1. Get the pre-fetched history data.
+        # 1. Get the pre-fetched history data (newest row per metric, see prefetch_latest_history).
         all_history = obj.history_set.all() 
         if not all_history:
             return {}, None # Return (empty_dict, no_timestamp)
@@ -77,7 +78,7 @@ class DeviceSerializer(serializers.ModelSerializer):
         metrics_dict = {}
         for record in sorted_by_metric:
             # We use .metric_name because the 'metric' object
-            # was also pre-fetched by 'history_set__metric'
+            # was also pre-fetched (select_related in prefetch_latest_history)
             metric_name = record.metric.metric_name
             
             if metric_name not in metrics_dict:
@@ -86,19 +87,25 @@ class DeviceSerializer(serializers.ModelSerializer):
         # 4. Return BOTH the data and the newest timestamp
         return metrics_dict, latest_timestamp
     
+    @staticmethod
+    def format_uptime(value):
+        # The poller stores sysUpTime in seconds; older rows hold text and are shown as-is
+        if not str(value).isdigit():
+            return value
+        seconds = int(value)
+        return f"{seconds // 86400}d {seconds % 86400 // 3600}h {seconds % 3600 // 60}m"
+
 # --- HELPER FUNCTION 2: For Measurements (NOW OPTIMIZED) ---
     def get_measurements(self, obj):
         """
-        Fetches real metrics and calculates the status (good, warning, critical)
-        for each one based on thresholds.
+        Fetches real metrics and the status (good, warning, critical)
+        of each one from the precomputed alert states.
         """
         # We get the metrics dictionary, but ignore the timestamp
         metrics, _ = self.get_latest_metrics_data(obj)
-        
-        thresholds = Threshold.objects.filter(device=obj).select_related('metric')
 
         # Define the order of severity.
-        severity_map = { "good": 1, "Warning": 2, "Critical": 3 }
+        severity_map = { "good": 1, "warning": 2, "critical": 3 }
 
         # Helper to safely convert metric value to a float/int or return 0
         def safe_value(key):
@@ -116,53 +123,31 @@ class DeviceSerializer(serializers.ModelSerializer):
             "memory_free_bytes": safe_value('Memory Free'),   # id: 3
             # "bandwidth_in_mbps" is REMOVED
             # "bandwidth_out_mbps" is REMOVED
-            "uptime": metrics.get('System Uptime', "N/A")     # id: 9
+            "uptime": self.format_uptime(metrics.get('System Uptime', "N/A"))     # id: 9
         }
 
-        # --- 2. Calculate the status for each metric ---
+        # --- 2. Read the status for each metric ---
+        # States are precomputed at ingest time by `manage.py evaluate_alerts`
+        # (AlertState), so nothing is re-evaluated per viewer here.
         
         metric_statuses = {
             "cpu_percent": "good",
             "memory": "good"
             # (Add more as needed)
         }
-        
-        # List of metrics we can check thresholds for
-        NUMERIC_METRIC_NAMES = ['CPU Usage', 'Memory Used', 'Memory Free']
+        status_keys = {
+            'CPU Usage': "cpu_percent",
+            'Memory Used': "memory",
+            'Memory Free': "memory",
+        }
 
-        for t in thresholds:
-            metric_name = t.metric.metric_name
-            
-            if metric_name in metrics and metric_name in NUMERIC_METRIC_NAMES:
-                try:
-                    cleaned_t_value = t.value.replace('%', '')
-                    current_value = float(metrics[metric_name])
-                    threshold_value = float(cleaned_t_value)
-                except (ValueError, TypeError) as e:
-                    logger.warning(f"SKIPPING THRESHOLD: Could not convert {metric_name}: {e}")
-                    continue 
-
-                new_alert_level = None
-                if t.condition == '>' and current_value > threshold_value:
-                    new_alert_level = t.alert_level # "Warning" or "Critical"
-                elif t.condition == '<' and current_value < threshold_value:
-                    new_alert_level = t.alert_level
-
-                # Update the status if this new alert is more severe
-                if new_alert_level:
-                    key_to_update = None
-                    if metric_name == 'CPU Usage':
-                        key_to_update = "cpu_percent"
-                    elif metric_name == 'Memory Used' or metric_name == 'Memory Free':
-                        key_to_update = "memory"
-
-                    if key_to_update:
-                        current_severity = severity_map.get(metric_statuses[key_to_update], 0)
-                        new_severity = severity_map.get(new_alert_level, 0)
-                        
-                        if new_severity > current_severity:
-                            # Note: we send the *lowercase* version for CSS
-                            metric_statuses[key_to_update] = new_alert_level.lower()
+        for alert in obj.alertstate_set.all():
+            key_to_update = status_keys.get(alert.metric.metric_name)
+            if alert.interface_id is not None or key_to_update is None or alert.state == AlertState.STATE_OK:
+                continue
+            # Keep the most severe state per metric group
+            if severity_map.get(alert.state, 0) > severity_map.get(metric_statuses[key_to_update], 0):
+                metric_statuses[key_to_update] = alert.state
 
         # --- 3. Build the final JSON response ---
         return {
@@ -181,30 +166,14 @@ class DeviceSerializer(serializers.ModelSerializer):
             "uptime": raw_values["uptime"]
         }
 
-    # --- HELPER FUNCTION 3: For Status (NOW SIMPLE) ---
-# --- HELPER FUNCTION 3: For Status (NOW WITH HEARTBEAT LOGIC) ---
+    # --- HELPER FUNCTION 3: For Status (FROM THE DEVICE STATE TABLE) ---
     def get_status(self, obj):
             """
-            Determines status based on whether metrics were *recently* fetched.
+            Reachability recorded by the poller and `manage.py probe_devices`
+            (DeviceState, select_related('state')); no History is read here.
             """
-            # 1. Get both the metrics and the *newest* timestamp
-            metrics, latest_timestamp = self.get_latest_metrics_data(obj)
-            
-            # 2. If no metrics OR no timestamp, it's definitely down.
-            if not metrics or not latest_timestamp:
-                return "down"
-            
-            # 3. Define our "heartbeat" threshold (e.g., 10 minutes)
-            #    This is 2x your 5-minute poll interval, which is a safe grace period.
-            threshold = timedelta(minutes=10)
-            
-            # 4. Compare the times
-            if timezone.now() - latest_timestamp > threshold:
-                # The latest data is *too old*, so the device is down
-                return "down"
-            
-            # 5. If we're here, the data exists AND it's recent.
-            return "up"
+            state = getattr(obj, 'state', None)
+            return state.status if state is not None else DeviceState.STATUS_UNKNOWN
     
 # --- Serializer 4: UserPreferenceSerializer ---
 class UserPreferenceSerializer(serializers.ModelSerializer):
@@ -223,35 +192,51 @@ class InterfaceSerializer(serializers.ModelSerializer):
     bandwidth_in_mb = serializers.SerializerMethodField()
     bandwidth_out_mb = serializers.SerializerMethodField()
     status = serializers.SerializerMethodField() # <-- NEW FIELD
+    # Interface threshold states (precomputed by `manage.py evaluate_alerts`)
+    alert_status = serializers.SerializerMethodField()
+    alerts = serializers.SerializerMethodField()
 
     class Meta:
         model = Interface
         # These fields come directly from the database
         fields = [
-            'id', 'ifIndex', 'ifName', 'ifDescr', 'ifAlias', 
+            'id', 'ifIndex', 'ifName', 'ifDescr', 'ifAlias', 'speed',
             'bandwidth_in_mb', 'bandwidth_out_mb',
-            'status' # <-- NEW FIELD
+            'status', # <-- NEW FIELD
+            'alert_status', 'alerts',
         ]
 
     def get_latest_metric_value(self, obj, metric_name):
         """
         Helper function to find the newest raw metric value for THIS interface.
         (This finds the data, but does NO conversion)
+        Reads the prefetched newest rows (prefetch_latest_history) once per interface, so listing
+        a device's interfaces does not query per interface and metric.
         """
-        try:
-            # We look for the metric by name (e.g., "Bandwidth In")
-            metric = Metric.objects.get(metric_name=metric_name)
-            
-            # We search history for this metric *and* this interface_id
-            history_record = obj.history_set.filter(
-                metric=metric
-            ).order_by('-timestamp').first() # Get the newest one
-
-            if history_record:
-                return history_record.value
-            return None # Return None if no record was found
-        except Metric.DoesNotExist:
-            return None # Return None if metric name is wrong
+        latest = getattr(obj, '_latest_values', None)
+        if latest is None:
+            latest = {}
+            for record in sorted(obj.history_set.all(), key=lambda h: h.timestamp):
+                latest[record.metric.metric_name] = record.value
+            obj._latest_values = latest
+        return latest.get(metric_name)
+
+    def get_alert_status(self, obj):
+        # Most severe state of this interface's rules; None when it has no rules
+        severity_map = { "ok": 1, "warning": 2, "critical": 3 }
+        states = [alert.state for alert in obj.alertstate_set.all()]
+        return max(states, key=lambda state: severity_map.get(state, 0)) if states else None
+
+    def get_alerts(self, obj):
+        return [
+            {
+                "metric": alert.metric.metric_name,
+                "state": alert.state,
+                "value": alert.last_value,
+                "since": alert.changed_at,
+            }
+            for alert in obj.alertstate_set.all()
+        ]
 
     def get_bandwidth_in_mb(self, obj):
         # 1. Get the raw value
@@ -327,6 +312,52 @@ class DeviceRegistrationSerializer(serializers.Serializer):
             raise serializers.ValidationError("Discovery data is missing 'data.interfaces.names' array.")
         return value
     
+class BulkDeviceRowSerializer(serializers.Serializer):
+    """
+    Validates one row of a bulk registration (CSV line or JSON object).
+    Cross-row checks (duplicate IPs, existing devices, model lookup) are done by bulk_register.
+    """
+    ip_address = serializers.IPAddressField(required=True)
+    hostname = serializers.CharField(max_length=100, required=True)
+    subnet_mask = serializers.CharField(max_length=45, required=False, allow_blank=True, allow_null=True)
+    # Either the DeviceModel id or its exact model_name
+    model_id = serializers.IntegerField(required=False, allow_null=True)
+    model_name = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    snmp_user = serializers.CharField(max_length=100, required=True)
+    auth_pass = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
+    priv_pass = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
+    # [{"ifIndex": 1, "ifName": "Gi0/1"}, ...], {"indexes": [...], "names": [...]} (discovery output)
+    # or "1:Gi0/1;2:Gi0/2" (CSV)
+    interfaces = serializers.JSONField(required=False)
+
+    def validate_interfaces(self, value):
+        """Normalizes every accepted format to a list of (ifIndex, ifName)."""
+        try:
+            if isinstance(value, str) and value.strip()[:1] in ('[', '{'):
+                value = json.loads(value)  # JSON typed into a CSV cell
+            if value in (None, ''):
+                pairs = []
+            elif isinstance(value, str):
+                pairs = [item.split(':', 1) for item in value.split(';') if item.strip()]
+            elif isinstance(value, dict):
+                if len(value.get('indexes', [])) != len(value.get('names', [])):
+                    raise serializers.ValidationError("'indexes' and 'names' must have the same length.")
+                pairs = list(zip(value['indexes'], value['names']))
+            else:
+                pairs = [(item['ifIndex'], item.get('ifName')) for item in value]
+            interfaces = [(int(index), (name or '').strip() or None) for index, name in pairs]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise serializers.ValidationError("Invalid interface list; expected ifIndex/ifName pairs.")
+        if len({index for index, _ in interfaces}) != len(interfaces):
+            raise serializers.ValidationError("Duplicate ifIndex in interface list.")
+        return interfaces
+
+    def validate(self, attrs):
+        if not attrs.get('model_id') and not attrs.get('model_name'):
+            raise serializers.ValidationError("Either model_id or model_name is required.")
+        return attrs
+
+
 class BrandSerializer(serializers.ModelSerializer):
     class Meta:
         model = Brand
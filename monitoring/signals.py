@@ -0,0 +1,80 @@
+""" Model signal handlers for the monitoring app (connected in apps.py). """
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Device, Interface, DeviceChange, Brand, DeviceType, DeviceModel, Metric, Threshold
+from .response_cache import bump_version, METADATA, DEVICES, THRESHOLDS
+
+
+def record_change(device_id, owner_id, kind):
+    """Adds a DeviceChange once the caller's transaction commits (never for one that is rolled back)."""
+    transaction.on_commit(lambda: DeviceChange.objects.create(device_id=device_id, owner_id=owner_id, kind=kind))
+
+
+@receiver(post_save, sender=Device)
+def device_saved(sender, instance, raw=False, **kwargs):
+    """Device created or edited: push its new metadata to live subscribers."""
+    if raw:  # loaddata fixtures
+        return
+    record_change(instance.pk, instance.user_id, DeviceChange.KIND_METADATA)
+
+
+@receiver(post_delete, sender=Device)
+def device_deleted(sender, instance, **kwargs):
+    """Device removed: leave a tombstone so clients can drop it."""
+    record_change(instance.pk, instance.user_id, DeviceChange.KIND_DELETED)
+
+
+@receiver(post_save, sender=Interface)
+@receiver(post_delete, sender=Interface)
+def interface_changed(sender, instance, raw=False, **kwargs):
+    """Interface list changed: the owning device's state changed too."""
+    if raw:
+        return
+    # The device may already be gone during a cascade delete
+    owner = list(Device.objects.filter(pk=instance.device_id).values_list('user_id', flat=True)[:1])
+    if not owner:
+        return
+    record_change(instance.device_id, owner[0], DeviceChange.KIND_METADATA)
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=DeviceType)
+@receiver(post_delete, sender=DeviceType)
+def metadata_changed(sender, raw=False, **kwargs):
+    """Dropdown data changed: invalidate cached metadata responses."""
+    if not raw:
+        bump_version(METADATA)
+
+
+@receiver(post_save, sender=DeviceModel)
+@receiver(post_delete, sender=DeviceModel)
+def device_model_changed(sender, raw=False, **kwargs):
+    """Model names appear both in the dropdowns and in the device list."""
+    if not raw:
+        bump_version(METADATA, DEVICES)
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+@receiver(post_save, sender=Interface)
+@receiver(post_delete, sender=Interface)
+@receiver(post_save, sender=Metric)
+@receiver(post_delete, sender=Metric)
+@receiver(post_save, sender=Threshold)
+@receiver(post_delete, sender=Threshold)
+def device_data_changed(sender, raw=False, **kwargs):
+    """Anything rendered in the device list changed: invalidate cached device lists."""
+    if not raw:
+        bump_version(DEVICES)
+
+
+@receiver(post_save, sender=Threshold)
+@receiver(post_delete, sender=Threshold)
+def threshold_changed(sender, raw=False, **kwargs):
+    """Threshold rules changed: the alert evaluator reloads them."""
+    if not raw:
+        bump_version(THRESHOLDS)
@@ -0,0 +1,699 @@
+""" Minimal in-process SNMPv3 client (USM authPriv: HMAC-SHA-96 + AES-128-CFB).
+
+    Used instead of one snmpget / snmpwalk process per request: the
+    credentials stay in this process's memory (a command line is visible
+    to every user through `ps`), and a Session keeps its UDP socket, the
+    agent's engine ID / boots / time and the localized keys, so only its
+    first request pays for engine discovery and key localization.
+
+    Supports GET, GETNEXT, GETBULK and walks over the SNMPv2-SMI value
+    types. Only the standard library and `cryptography` (already needed
+    for Fernet) are used, so the standalone poller scripts can import it.
+
+    with Session('10.0.0.1', 'admin', 'authpass', 'privpass') as session:
+        session.get(['1.3.6.1.2.1.1.5.0'])        # [('1.3.6.1.2.1.1.5.0', b'R1')]
+        session.walk('1.3.6.1.2.1.2.2.1.2')       # [(oid, value), ...] """
+
+import functools
+import hashlib
+import hmac
+import itertools
+import random
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms
+try:
+    from cryptography.hazmat.decrepit.ciphers.modes import CFB   # cryptography >= 47
+except ImportError:
+    from cryptography.hazmat.primitives.ciphers.modes import CFB
+
+# --- CONFIGURATION ---
+PORT = 161
+TIMEOUT = 2.0              # Seconds to wait for each response
+RETRIES = 1                # Resends after a timeout
+MAX_REPETITIONS = 25       # Rows per GETBULK during a walk (where each session's tuning starts)
+MIN_REPETITIONS = 5        # Tuning never goes below ...
+MAX_REPETITIONS_LIMIT = 250  # ... or above these
+REPETITIONS_STEP = 10      # Added after a full, fast answer (halved after tooBig / timeout)
+RESPONSE_BUDGET = 16384    # Largest response (bytes) the tuning grows towards
+MAX_MESSAGE_SIZE = 65507   # Largest response we accept (UDP payload)
+SESSION_CACHE_SIZE = 4096  # Agents whose session state session() keeps (least recently used dropped)
+# ---------------------------------------------------------------------------------
+
+# BER tags
+INTEGER, OCTET_STRING, NULL, OBJECT_IDENTIFIER, SEQUENCE = 0x02, 0x04, 0x05, 0x06, 0x30
+IP_ADDRESS, COUNTER32, GAUGE32, TIMETICKS, OPAQUE, COUNTER64 = 0x40, 0x41, 0x42, 0x43, 0x44, 0x46
+GET, GET_NEXT, RESPONSE, GET_BULK, REPORT = 0xA0, 0xA1, 0xA2, 0xA5, 0xA8
+UNSIGNED = (COUNTER32, GAUGE32, TIMETICKS, COUNTER64)
+
+# msgFlags
+FLAG_AUTH, FLAG_PRIV, FLAG_REPORTABLE = 0x01, 0x02, 0x04
+
+ERROR_STATUS = {
+    1: 'tooBig', 2: 'noSuchName', 3: 'badValue', 4: 'readOnly', 5: 'genErr', 6: 'noAccess',
+    7: 'wrongType', 8: 'wrongLength', 9: 'wrongEncoding', 10: 'wrongValue', 11: 'noCreation',
+    12: 'inconsistentValue', 13: 'resourceUnavailable', 14: 'commitFailed', 15: 'undoFailed',
+    16: 'authorizationError', 17: 'notWritable', 18: 'inconsistentName',
+}
+TOO_BIG = 1
+
+# USM report counters (RFC 3414) and the net-snmp style message for each
+USM_STATS = '1.3.6.1.6.3.15.1.1.'
+NOT_IN_TIME_WINDOW = USM_STATS + '2.0'
+UNKNOWN_USER_NAME = USM_STATS + '3.0'
+UNKNOWN_ENGINE_ID = USM_STATS + '4.0'
+REPORTS = {
+    USM_STATS + '1.0': 'Unsupported security level',
+    NOT_IN_TIME_WINDOW: 'Not in time window',
+    UNKNOWN_USER_NAME: 'Unknown user name',
+    UNKNOWN_ENGINE_ID: 'Unknown engine ID',
+    USM_STATS + '5.0': 'Authentication failure (incorrect password, community or key)',
+    USM_STATS + '6.0': 'Decryption error',
+}
+
+
+class SnmpError(Exception):
+    """Agent error: a PDU error-status (`status`, `index`) or a USM report (`report` is its OID)."""
+
+    def __init__(self, message, status=0, index=0, report=None):
+        super().__init__(message)
+        self.status = status
+        self.index = index
+        self.report = report
+
+
+class SnmpTimeout(SnmpError):
+    """No response after all retries."""
+
+
+class _Exception:
+    # noSuchObject / noSuchInstance / endOfMibView varbind values
+    def __init__(self, tag, text):
+        self.tag, self.text = tag, text
+
+    def __repr__(self):
+        return self.text
+
+    __str__ = __repr__
+
+
+NO_SUCH_OBJECT = _Exception(0x80, 'No Such Object available on this agent at this OID')
+NO_SUCH_INSTANCE = _Exception(0x81, 'No Such Instance currently exists at this OID')
+END_OF_MIB_VIEW = _Exception(0x82, 'No more variables left in this MIB View')
+EXCEPTIONS = {value.tag: value for value in (NO_SUCH_OBJECT, NO_SUCH_INSTANCE, END_OF_MIB_VIEW)}
+
+
+# Typed values: they behave like int / str and keep their SNMP type for type_name()
+class Counter32(int):
+    pass
+
+
+class Gauge32(int):
+    pass
+
+
+class TimeTicks(int):
+    pass
+
+
+class Counter64(int):
+    pass
+
+
+class IpAddress(str):
+    pass
+
+
+class ObjectIdentifier(str):
+    pass
+
+
+TYPES = {COUNTER32: Counter32, GAUGE32: Gauge32, TIMETICKS: TimeTicks, COUNTER64: Counter64}
+TYPE_NAMES = {int: 'INTEGER', bytes: 'STRING', Counter32: 'Counter32', Gauge32: 'Gauge32', TimeTicks: 'Timeticks',
+              Counter64: 'Counter64', IpAddress: 'IpAddress', ObjectIdentifier: 'OID'}
+
+# ifAdminStatus / ifOperStatus labels (IF-MIB), rendered like net-snmp: "up(1)"
+IF_STATUS = {1: 'up', 2: 'down', 3: 'testing', 4: 'unknown', 5: 'dormant', 6: 'notPresent', 7: 'lowerLayerDown'}
+
+
+# ----- BER encoding -----
+
+def _length(n):
+    if n < 0x80:
+        return bytes([n])
+    body = n.to_bytes((n.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(body)]) + body
+
+
+def tlv(tag, value):
+    return bytes([tag]) + _length(len(value)) + value
+
+
+def integer(n):
+    return tlv(INTEGER, n.to_bytes(max(1, (n.bit_length() + 8) // 8), 'big', signed=True))
+
+
+def octets(value):
+    return tlv(OCTET_STRING, value)
+
+
+def sequence(*items, tag=SEQUENCE):
+    return tlv(tag, b''.join(items))
+
+
+def normalize_oid(oid):
+    """'.1.3.6.1.2.1.1.5.0 ' -> '1.3.6.1.2.1.1.5.0' (OIDs are stored with dots and spaces in places)."""
+    return str(oid).strip().strip('.')
+
+
+def oid_tuple(oid):
+    return tuple(int(part) for part in normalize_oid(oid).split('.'))
+
+
+def encode_oid(oid):
+    parts = oid_tuple(oid)
+    body = bytearray()
+    for number in (parts[0] * 40 + parts[1],) + parts[2:]:
+        chunk = [number & 0x7F]
+        number >>= 7
+        while number:
+            chunk.append(0x80 | (number & 0x7F))
+            number >>= 7
+        body.extend(reversed(chunk))
+    return tlv(OBJECT_IDENTIFIER, bytes(body))
+
+
+# ----- BER decoding -----
+
+def _read(data, pos):
+    """Returns (tag, start, end) of the TLV at `pos` (value bytes are data[start:end])."""
+    try:
+        tag, length = data[pos], data[pos + 1]
+    except IndexError:
+        raise SnmpError('Malformed response (truncated)')
+    pos += 2
+    if length & 0x80:
+        count = length & 0x7F
+        length = int.from_bytes(data[pos:pos + count], 'big')
+        pos += count
+    if pos + length > len(data):
+        raise SnmpError('Malformed response (truncated)')
+    return tag, pos, pos + length
+
+
+def _items(data, start, end):
+    items = []
+    while start < end:
+        item = _read(data, start)
+        items.append(item)
+        start = item[2]
+    return items
+
+
+def decode_oid(raw):
+    parts, number = [], 0
+    for byte in raw:
+        number = (number << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            parts.append(number)
+            number = 0
+    if not parts:
+        return ''
+    head = min(parts[0] // 40, 2)
+    return '.'.join(str(part) for part in [head, parts[0] - 40 * head] + parts[1:])
+
+
+def decode_value(tag, raw):
+    if tag == INTEGER:
+        return int.from_bytes(raw, 'big', signed=True)
+    if tag in UNSIGNED:
+        return TYPES[tag](int.from_bytes(raw, 'big'))
+    if tag == OBJECT_IDENTIFIER:
+        return ObjectIdentifier(decode_oid(raw))
+    if tag == IP_ADDRESS:
+        return IpAddress('.'.join(str(byte) for byte in raw))
+    if tag == NULL:
+        return None
+    if tag in EXCEPTIONS:
+        return EXCEPTIONS[tag]
+    return bytes(raw)  # OCTET STRING, Opaque, unknown types
+
+
+def type_name(value):
+    """net-snmp style type label ('STRING', 'INTEGER', 'Counter32', ...); None for noSuchObject etc."""
+    return TYPE_NAMES.get(type(value))
+
+
+def text(value, labels=None):
+    """
+    Value as text, the way the poller stores it (printable strings as-is,
+    other bytes as hex). `labels` names enumerated integers, e.g. IF_STATUS -> 'up(1)'.
+    """
+    if labels is not None and type(value) is int:
+        return f"{labels.get(value, 'unknown')}({value})"
+    if isinstance(value, bytes):
+        try:
+            decoded = value.rstrip(b'\x00').decode('utf-8')
+            if all(c.isprintable() or c in '\r\n\t' for c in decoded):
+                return decoded
+        except UnicodeDecodeError:
+            pass
+        return ' '.join(f'{byte:02X}' for byte in value)
+    if value is None:
+        return ''
+    return str(value)
+
+
+# ----- USM keys (RFC 3414 A.2.2) -----
+
+@functools.lru_cache(maxsize=1024)
+def password_to_key(password):
+    """
+    SHA-1 key from a password: the digest of the password repeated to 1 MB.
+    Cached, so devices sharing a password only pay for the hashing once.
+    """
+    password = password.encode() if isinstance(password, str) else password
+    if not password:
+        raise SnmpError('Empty SNMPv3 password')
+    return hashlib.sha1((password * (1048576 // len(password) + 1))[:1048576]).digest()
+
+
+def localize_key(key, engine_id):
+    return hashlib.sha1(key + engine_id + key).digest()
+
+
+# ----- Session -----
+
+class Session:
+    """
+    One agent, one user (authPriv, SHA + AES-128). Raises SnmpTimeout when
+    the agent does not answer and SnmpError for agent errors.
+
+    Thread-safe, and requests from several threads run concurrently (each
+    borrows its own socket). close() only releases the sockets: the engine
+    ID / boots / time and the localized keys are kept, so the next request
+    (e.g. in the next polling cycle) is a single round trip again.
+    """
+
+    def __init__(self, host, user, auth_password, priv_password, port=PORT, timeout=TIMEOUT, retries=RETRIES):
+        self.host, self.port = host, port
+        self.user = user.encode() if isinstance(user, str) else user
+        self.timeout, self.retries = timeout, retries
+        self.credentials = (auth_password, priv_password)
+
+        self.engine_id = None
+        self.engine_boots = 0
+        self.engine_time = 0
+        self.clock_at = 0.0
+        self.auth_key = self.priv_key = None
+
+        self.message_ids = itertools.count(random.randrange(1, 1 << 30))
+        self.request_ids = itertools.count(random.randrange(1, 1 << 30))
+        self.salts = itertools.count(random.getrandbits(63))
+        self.round_trips = 0
+        self.discoveries = 0
+        # GETBULK tuning of walk(): current size, largest size answered, smallest size that failed
+        self.max_repetitions = self.proven_repetitions = MAX_REPETITIONS
+        self.repetitions_ceiling = MAX_REPETITIONS_LIMIT + 1
+        self.tuning_lock = threading.Lock()
+        # Round trips of the last walk of each table (OID)
+        self.table_round_trips = {}
+        self.discovery_lock = threading.Lock()
+        self.sockets_lock = threading.Lock()
+        self.idle_sockets = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Closes the idle sockets (sockets in use are closed when their request ends)."""
+        with self.sockets_lock:
+            sockets, self.idle_sockets = self.idle_sockets, []
+        for sock in sockets:
+            sock.close()
+
+    # --- Public requests ---
+
+    def get(self, oids, **options):
+        return self.request(GET, oids, **options)
+
+    def get_next(self, oids, **options):
+        return self.request(GET_NEXT, oids, **options)
+
+    def get_bulk(self, oids, max_repetitions=MAX_REPETITIONS, non_repeaters=0, **options):
+        return self.request(GET_BULK, oids, non_repeaters, max_repetitions, **options)
+
+    def walk(self, oid, max_repetitions=None, **options):
+        """
+        All (oid, value) pairs under `oid`, like snmpwalk. An instance OID
+        with nothing below it (e.g. sysName.0) returns that instance.
+
+        Without `max_repetitions` the GETBULK size is tuned per session:
+        +REPETITIONS_STEP after a full answer that came back fast and stays
+        within RESPONSE_BUDGET, halved after tooBig or after a timeout at a
+        size the agent never answered (the request is then resent smaller).
+        The round trips of the walk are kept in table_round_trips[oid].
+        """
+        root = normalize_oid(oid)
+        prefix = root + '.'
+        tuned = max_repetitions is None
+        results, current, trips = [], root, 0
+        while True:
+            repetitions = self.max_repetitions if tuned else max_repetitions
+            stats = {}
+            started = time.monotonic()
+            try:
+                varbinds = self.request(GET_BULK, [current], 0, repetitions, stats=stats, **options)
+            except SnmpError as e:
+                trips += stats.get('round_trips', 0)
+                if tuned and self._shrink(repetitions, e):
+                    continue
+                raise
+            trips += stats.get('round_trips', 0)
+            progressed, rows = False, 0
+            for name, value in varbinds:
+                if value is END_OF_MIB_VIEW or not name.startswith(prefix):
+                    varbinds = None
+                    break
+                if oid_tuple(name) <= oid_tuple(current):
+                    raise SnmpError(f'OID not increasing: {current} >= {name}')
+                results.append((name, value))
+                current, progressed, rows = name, True, rows + 1
+            if tuned:
+                self._grow(repetitions, rows, time.monotonic() - started, stats.get('bytes', 0),
+                           options.get('timeout') or self.timeout)
+            if varbinds is None or not progressed:
+                break
+        if not results:
+            stats = {}
+            (name, value), = self.request(GET, [root], stats=stats, **options)
+            trips += stats.get('round_trips', 0)
+            if not isinstance(value, _Exception):
+                results.append((name, value))
+        self.table_round_trips[root] = trips
+        return results
+
+    def tune(self, max_repetitions):
+        """Starts the GETBULK tuning of walk() from a size learned earlier (e.g. for the device model)."""
+        self.max_repetitions = self.proven_repetitions = max(MIN_REPETITIONS, min(MAX_REPETITIONS_LIMIT, int(max_repetitions)))
+        self.repetitions_ceiling = MAX_REPETITIONS_LIMIT + 1
+
+    def _shrink(self, repetitions, error):
+        # tooBig always means "ask for less"; a timeout only at a size the agent never answered
+        # (a dead agent times out at every size: do not retry it smaller)
+        too_big = error.status == TOO_BIG or (isinstance(error, SnmpTimeout) and repetitions > self.proven_repetitions)
+        if not too_big or repetitions <= MIN_REPETITIONS:
+            return False
+        with self.tuning_lock:
+            self.repetitions_ceiling = min(self.repetitions_ceiling, repetitions)
+            self.max_repetitions = max(MIN_REPETITIONS, min(self.max_repetitions, repetitions // 2))
+        return True
+
+    def _grow(self, repetitions, rows, elapsed, size, timeout):
+        with self.tuning_lock:
+            self.proven_repetitions = max(self.proven_repetitions, repetitions)
+            if elapsed > timeout / 2:
+                # Close to timing out: back off before it does
+                self.max_repetitions = max(MIN_REPETITIONS, min(self.max_repetitions, repetitions * 3 // 4))
+            elif rows >= repetitions and elapsed < timeout / 4 and self.max_repetitions == repetitions:
+                grown = repetitions + REPETITIONS_STEP
+                if grown < self.repetitions_ceiling and grown <= MAX_REPETITIONS_LIMIT and size * grown <= RESPONSE_BUDGET * repetitions:
+                    self.max_repetitions = grown
+
+    def request(self, pdu_type, oids, non_repeaters=0, max_repetitions=0, timeout=None, retries=None, stats=None):
+        """
+        Sends one PDU and returns its varbinds [(oid, value)]. `timeout` / `retries` override the session's;
+        `stats` (a dict) receives the round trips made and the size of the response in bytes.
+        """
+        options = (self.timeout if timeout is None else timeout, self.retries if retries is None else retries)
+        discovered = self.engine_id is None
+        if discovered:
+            self.discover(options)
+        resynced = False
+        while True:
+            try:
+                return self._exchange(pdu_type, oids, non_repeaters, max_repetitions, options, stats)
+            except SnmpError as e:
+                # Agent rebooted or our clock drifted: the report carried its clock, resend once
+                if e.report == NOT_IN_TIME_WINDOW and not resynced:
+                    resynced = True
+                    continue
+                # Cached engine ID is stale (agent replaced or re-keyed): discover it again
+                if e.report in (UNKNOWN_ENGINE_ID, UNKNOWN_USER_NAME) and not discovered:
+                    discovered = True
+                    self.discover(options, force=True)
+                    continue
+                raise
+
+    # --- Engine discovery and keys ---
+
+    def discover(self, options=None, force=False):
+        """Learns the agent's engine ID / boots / time (RFC 3414 4) and localizes the keys."""
+        with self.discovery_lock:
+            # Another thread may have finished the discovery while we waited
+            if self.engine_id is not None and not force:
+                return
+            response = self._send(self._pdu(GET, [], 0, 0), False, options or (self.timeout, self.retries))
+            if not response['engine_id']:
+                raise SnmpError(f'Engine discovery failed for {self.host}')
+            self._set_clock(response['boots'], response['time'])
+            self._set_engine(response['engine_id'])
+            self.discoveries += 1
+
+    def state(self):
+        """
+        Engine state worth keeping across a restart (engine ID, boots / time,
+        localized keys) as a JSON-friendly dict, or None before discovery.
+        It holds key material: store it encrypted.
+        """
+        if self.engine_id is None:
+            return None
+        boots, engine_time = self._clock()
+        return {'engine_id': self.engine_id.hex(), 'boots': boots, 'time': engine_time, 'saved_at': time.time(),
+                'auth_key': self.auth_key.hex(), 'priv_key': self.priv_key.hex(), 'fingerprint': self._fingerprint(),
+                'max_repetitions': self.max_repetitions}
+
+    def restore(self, state):
+        """
+        Resumes from state(): the next request needs no discovery and no key
+        derivation. Ignored (returns False) when the credentials changed since.
+        """
+        if not state or state.get('fingerprint') != self._fingerprint():
+            return False
+        with self.discovery_lock:
+            # The agent's clock kept running while we were down; a reboot in between
+            # is caught by notInTimeWindow / unknownEngineID like any other
+            elapsed = max(0, int(time.time() - state['saved_at']))
+            self._set_clock(state['boots'], state['time'] + elapsed)
+            self.auth_key = bytes.fromhex(state['auth_key'])
+            self.priv_key = bytes.fromhex(state['priv_key'])
+            self.engine_id = bytes.fromhex(state['engine_id'])
+        if state.get('max_repetitions'):
+            self.tune(state['max_repetitions'])
+        return True
+
+    def _fingerprint(self):
+        secret = b'\0'.join([self.user, *(value.encode() if isinstance(value, str) else value
+                                          for value in self.credentials)])
+        return hashlib.sha256(secret).hexdigest()
+
+    def _set_engine(self, engine_id):
+        if engine_id != self.engine_id:
+            auth_password, priv_password = self.credentials
+            # Keys first: a request in another thread uses them as soon as engine_id is set
+            self.auth_key = localize_key(password_to_key(auth_password), engine_id)
+            self.priv_key = localize_key(password_to_key(priv_password), engine_id)[:16]
+            self.engine_id = engine_id
+
+    def _set_clock(self, boots, engine_time):
+        self.engine_boots, self.engine_time, self.clock_at = boots, engine_time, time.monotonic()
+
+    def _clock(self):
+        return self.engine_boots, self.engine_time + int(time.monotonic() - self.clock_at)
+
+    # --- Messages ---
+
+    def _pdu(self, pdu_type, oids, non_repeaters, max_repetitions):
+        varbinds = sequence(*[sequence(encode_oid(oid), tlv(NULL, b'')) for oid in oids])
+        return sequence(integer(next(self.request_ids)), integer(non_repeaters), integer(max_repetitions),
+                        varbinds, tag=pdu_type)
+
+    def _exchange(self, pdu_type, oids, non_repeaters, max_repetitions, options, stats=None):
+        response = self._send(self._pdu(pdu_type, oids, non_repeaters, max_repetitions), True, options, stats)
+        if response['pdu_type'] == REPORT:
+            name = response['varbinds'][0][0] if response['varbinds'] else ''
+            if name in (NOT_IN_TIME_WINDOW, UNKNOWN_ENGINE_ID):
+                self._set_clock(response['boots'], response['time'])
+            raise SnmpError(f"{REPORTS.get(name, 'Report ' + name)} ({self.host})", report=name)
+        if response['error_status']:
+            status = response['error_status']
+            raise SnmpError(f"{ERROR_STATUS.get(status, status)} from {self.host}", status, response['error_index'])
+        return response['varbinds']
+
+    def _socket(self):
+        with self.sockets_lock:
+            if self.idle_sockets:
+                return self.idle_sockets.pop()
+        sock = socket.socket(socket.AF_INET6 if ':' in self.host else socket.AF_INET, socket.SOCK_DGRAM)
+        sock.connect((self.host, self.port))
+        return sock
+
+    def _send(self, pdu, secure, options, stats=None):
+        timeout, retries = options
+        message_id = next(self.message_ids)
+        message = self._encode(message_id, pdu, secure)
+        sock = self._socket()
+        try:
+            for attempt in range(retries + 1):
+                sock.send(message)
+                self.round_trips += 1
+                if stats is not None:
+                    stats['round_trips'] = stats.get('round_trips', 0) + 1
+                deadline = time.monotonic() + timeout
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    sock.settimeout(remaining)
+                    try:
+                        data = sock.recv(MAX_MESSAGE_SIZE)
+                    except socket.timeout:
+                        break
+                    response = self._decode(data, secure)
+                    # Late answers to an earlier retry carry another msgID
+                    if response is not None and response['message_id'] == message_id:
+                        if stats is not None:
+                            stats['bytes'] = len(data)
+                        with self.sockets_lock:
+                            self.idle_sockets.append(sock)
+                        sock = None
+                        return response
+        except OSError as e:  # e.g. ICMP port unreachable
+            raise SnmpTimeout(f"Timeout: No Response from {self.host} ({e}).")
+        finally:
+            # A socket that timed out may still receive the late answer: do not reuse it
+            if sock is not None:
+                sock.close()
+        raise SnmpTimeout(f"Timeout: No Response from {self.host}.")
+
+    def _encode(self, message_id, pdu, secure):
+        flags = FLAG_AUTH | FLAG_PRIV | FLAG_REPORTABLE if secure else FLAG_REPORTABLE
+        header = sequence(integer(message_id), integer(MAX_MESSAGE_SIZE), octets(bytes([flags])), integer(3))
+        scoped = sequence(octets(self.engine_id or b''), octets(b''), pdu)
+        if not secure:
+            usm = sequence(octets(b''), integer(0), integer(0), octets(b''), octets(b''), octets(b''))
+            return sequence(integer(3), header, octets(usm), scoped)
+
+        boots, engine_time = self._clock()
+        salt = struct.pack('>Q', next(self.salts) & 0xFFFFFFFFFFFFFFFF)
+        iv = struct.pack('>II', boots, engine_time) + salt
+        encryptor = Cipher(algorithms.AES(self.priv_key), CFB(iv)).encryptor()
+        encrypted = octets(encryptor.update(scoped) + encryptor.finalize())
+
+        usm = sequence(octets(self.engine_id), integer(boots), integer(engine_time), octets(self.user),
+                       octets(b'\x00' * 12), octets(salt))
+        message = bytearray(sequence(integer(3), header, octets(usm), encrypted))
+        # The security parameters end with the 12 zeroed auth bytes and the salt (2 + 8 bytes)
+        offset = len(message) - len(encrypted) - 10 - 12
+        message[offset:offset + 12] = hmac.new(self.auth_key, bytes(message), hashlib.sha1).digest()[:12]
+        return bytes(message)
+
+    def _decode(self, data, secure):
+        """Parses a response; None when it is not for us or fails authentication."""
+        try:
+            _, start, end = _read(data, 0)
+            version, header, security, payload = _items(data, start, end)[:4]
+            message_id, _, flags, _ = _items(data, header[1], header[2])[:4]
+            message_id = decode_value(INTEGER, data[message_id[1]:message_id[2]])
+            flags = data[flags[1]] if flags[2] > flags[1] else 0
+
+            _, usm_start, usm_end = _read(data, security[1])
+            engine_id, boots, engine_time, _, auth, priv = _items(data, usm_start, usm_end)[:6]
+            response = {
+                'message_id': message_id,
+                'engine_id': bytes(data[engine_id[1]:engine_id[2]]),
+                'boots': decode_value(INTEGER, data[boots[1]:boots[2]]),
+                'time': decode_value(INTEGER, data[engine_time[1]:engine_time[2]]),
+            }
+
+            if flags & FLAG_AUTH and self.auth_key:
+                signed = bytearray(data)
+                signed[auth[1]:auth[2]] = b'\x00' * (auth[2] - auth[1])
+                digest = hmac.new(self.auth_key, bytes(signed), hashlib.sha1).digest()[:12]
+                if not hmac.compare_digest(digest, bytes(data[auth[1]:auth[2]])):
+                    return None
+                self._set_clock(response['boots'], response['time'])
+            elif flags & FLAG_AUTH:
+                return None
+
+            if flags & FLAG_PRIV:
+                if payload[0] != OCTET_STRING or not self.priv_key:
+                    return None
+                iv = struct.pack('>II', response['boots'], response['time']) + bytes(data[priv[1]:priv[2]])
+                decryptor = Cipher(algorithms.AES(self.priv_key), CFB(iv)).decryptor()
+                scoped = decryptor.update(bytes(data[payload[1]:payload[2]])) + decryptor.finalize()
+                _, scoped_start, scoped_end = _read(scoped, 0)
+            else:
+                scoped, scoped_start, scoped_end = data, payload[1], payload[2]
+
+            _, _, pdu = _items(scoped, scoped_start, scoped_end)[:3]
+            request_id, error_status, error_index, varbinds = _items(scoped, pdu[1], pdu[2])[:4]
+            response.update(
+                pdu_type=pdu[0],
+                error_status=decode_value(INTEGER, scoped[error_status[1]:error_status[2]]),
+                error_index=decode_value(INTEGER, scoped[error_index[1]:error_index[2]]),
+                varbinds=[],
+            )
+            for _, bind_start, bind_end in _items(scoped, varbinds[1], varbinds[2]):
+                name, value = _items(scoped, bind_start, bind_end)[:2]
+                response['varbinds'].append((
+                    decode_oid(scoped[name[1]:name[2]]),
+                    decode_value(value[0], scoped[value[1]:value[2]]),
+                ))
+            return response
+        except (SnmpError, ValueError):
+            return None
+
+
+# ----- Shared sessions -----
+
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def session(host, user, auth_password, priv_password, port=PORT):
+    """
+    The process-wide Session for this agent and user, created on first use.
+    Engine discovery and key localization happen once, then survive across
+    requests and polling cycles; changed passwords start a fresh session.
+    Use it as `with session(...) as s:` to release its sockets afterwards.
+    """
+    key = (host, port, user)
+    with _sessions_lock:
+        shared = _sessions.get(key)
+        if shared is None or shared.credentials != (auth_password, priv_password):
+            shared = _sessions[key] = Session(host, user, auth_password, priv_password, port)
+        _sessions.move_to_end(key)
+        while len(_sessions) > SESSION_CACHE_SIZE:
+            _sessions.popitem(last=False)[1].close()
+    return shared
+
+
+def shared_sessions():
+    """The sessions currently kept by session()."""
+    with _sessions_lock:
+        return list(_sessions.values())
+
+
+def forget(host, port=PORT):
+    """Drops the shared sessions of `host` (e.g. when its device is deleted)."""
+    with _sessions_lock:
+        for key in [key for key in _sessions if key[:2] == (host, port)]:
+            _sessions.pop(key).close()
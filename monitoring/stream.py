@@ -0,0 +1,267 @@
+""" Server-Sent Events stream of device changes (`/api/stream/`).
+
+    One ChangeBroadcaster per process polls the DeviceChange feed and
+    serializes each changed device once, then fans the result out to every
+    connected browser whose user may see that device. The database and
+    serialization cost therefore follows the change rate, not the number
+    of open dashboards.
+
+    NOTE: The stream needs an ASGI server (e.g. `uvicorn network_monitor.asgi:application`);
+    under WSGI the async response cannot be streamed. """
+
+import asyncio
+import json
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Device, DeviceChange, Interface
+from .serializers import DeviceSerializer, InterfaceSerializer
+from .timeseries import prefetch_latest_history
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+POLL_INTERVAL = 2          # Seconds between DeviceChange feed reads
+KEEPALIVE_INTERVAL = 15    # Seconds between SSE comment pings
+SUBSCRIBER_QUEUE_SIZE = 256
+BATCH_LIMIT = 500          # Max feed rows handled per poll
+SETTLE_SECONDS = 30        # How long a missing DeviceChange id may still commit
+# ---------------------------------------------------------------------------------
+
+
+def settled_cursor(cursor, changes, now=None):
+    """
+    Newest position the feed can move to after reading `changes` ((id, created_at, ...) after
+    `cursor`, in id order). Ids are handed out before commit, so an id missing below a recent
+    row may still appear; the cursor stops before it until SETTLE_SECONDS have passed.
+    """
+    horizon = (now or timezone.now()) - timedelta(seconds=SETTLE_SECONDS)
+    for change in changes:
+        if change[0] != cursor + 1 and change[1] > horizon:
+            break
+        cursor = change[0]
+    return cursor
+
+
+def latest_cursor():
+    """Returns the newest DeviceChange id no older change can still commit below (0 if the feed is empty)."""
+    horizon = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    settled = (DeviceChange.objects.filter(created_at__lte=horizon)
+               .order_by('-id').values_list('id', flat=True).first() or 0)
+    return settled_cursor(settled, DeviceChange.objects.filter(id__gt=settled).order_by('id').values_list('id', 'created_at'))
+
+
+def build_events(cursor, sent=frozenset(), limit=BATCH_LIMIT):
+    """
+    Reads feed rows after `cursor` and returns (new_cursor, events, ids read).
+    Each event is a dict with 'id', 'event', 'owner_id' and 'data'; a device
+    that changed several times in the batch is serialized only once. Rows
+    above the new cursor are read again next time; those in `sent` are skipped.
+    """
+    rows = list(
+        DeviceChange.objects.filter(id__gt=cursor).order_by('id')
+        .values_list('id', 'created_at', 'device_id', 'owner_id', 'kind')[:limit]
+    )
+    new_cursor = settled_cursor(cursor, rows)
+    changes = [(change_id, *rest) for change_id, _, *rest in rows if change_id not in sent]
+    if not changes:
+        return new_cursor, [], set()
+
+    # Keep only the newest change per device
+    newest = {}
+    for change_id, device_id, owner_id, kind in changes:
+        newest[device_id] = (change_id, owner_id, kind)
+
+    live_ids = [d for d, (_, _, kind) in newest.items() if kind != DeviceChange.KIND_DELETED]
+    devices = {
+        d.id: d for d in Device.objects.filter(id__in=live_ids, retired_at__isnull=True)
+        .select_related('model', 'user', 'state').prefetch_related('alertstate_set__metric')
+    }
+    # Only the newest History row per series, so a pushed change costs the same however long the history is
+    prefetch_latest_history(devices.values(), 'device')
+    interfaces = {}
+    metric_ids = [d for d in live_ids if newest[d][2] == DeviceChange.KIND_METRICS]
+    for interface in prefetch_latest_history(
+            Interface.objects.filter(device_id__in=metric_ids, is_active=True)
+            .prefetch_related('alertstate_set__metric').order_by('ifIndex'), 'interface'):
+        interfaces.setdefault(interface.device_id, []).append(interface)
+
+    events = []
+    for device_id, (change_id, owner_id, kind) in sorted(newest.items(), key=lambda item: item[1][0]):
+        device = devices.get(device_id)
+        if kind == DeviceChange.KIND_DELETED or device is None:
+            events.append({'id': change_id, 'event': 'deleted', 'owner_id': owner_id, 'data': {'id': device_id}})
+            continue
+        data = DeviceSerializer(device).data
+        if device_id in interfaces:
+            data['interfaces'] = InterfaceSerializer(interfaces[device_id], many=True).data
+        events.append({'id': change_id, 'event': 'device', 'owner_id': device.user_id, 'data': data})
+
+    return new_cursor, events, {change[0] for change in changes}
+
+
+class Subscriber:
+    def __init__(self, user_id, is_superuser):
+        self.user_id = user_id
+        self.is_superuser = is_superuser
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def can_see(self, event):
+        return self.is_superuser or event['owner_id'] == self.user_id
+
+
+class ChangeBroadcaster:
+    """Polls the change feed once per interval and fans events out to subscribers."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.cursor = None
+        self.sent = set()   # Change ids above the cursor already published
+        self.task = None
+
+    async def subscribe(self, user_id, is_superuser):
+        subscriber = Subscriber(user_id, is_superuser)
+        self.subscribers.add(subscriber)
+        if self.task is None or self.task.done():
+            # Nobody was listening: start from the current position instead of replaying the changes since
+            cursor = await sync_to_async(latest_cursor)()
+            if self.task is None or self.task.done():   # Another subscriber may have started it meanwhile
+                self.cursor, self.sent = cursor, set()
+                self.task = asyncio.get_running_loop().create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def _run(self):
+        # Stops by itself once the last subscriber disconnects
+        while self.subscribers:
+            try:
+                self.cursor, events, read = await sync_to_async(build_events)(self.cursor, self.sent)
+                self.sent = {change_id for change_id in self.sent | read if change_id > self.cursor}
+            except Exception as e:
+                logger.warning(f"Change stream poll failed: {e}")
+                events = []
+            for event in events:
+                self._publish(event)
+            if not events:
+                await asyncio.sleep(POLL_INTERVAL)
+        self.task = None
+
+    def _publish(self, event):
+        for subscriber in list(self.subscribers):
+            if not subscriber.can_see(event):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client: tell it to refetch instead of buffering without limit
+                subscriber.overflowed = True
+
+
+broadcaster = ChangeBroadcaster()
+
+
+def format_event(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def event_stream(subscriber):
+    try:
+        yield format_event(broadcaster.cursor, 'hello', {'cursor': broadcaster.cursor})
+        while True:
+            if subscriber.overflowed:
+                subscriber.overflowed = False
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                yield format_event(broadcaster.cursor, 'resync', {'cursor': broadcaster.cursor})
+                continue
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout=KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event['id'], event['event'], event['data'])
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+def _session_user(request):
+    user = request.user  # Resolving the lazy session user hits the DB
+    return user.is_authenticated, user.id, user.is_superuser
+
+
+async def device_stream(request):
+    """
+    SSE endpoint pushing changed device states to the logged-in user.
+    Events: 'hello' (initial cursor), 'device' (serialized device, plus
+    'interfaces' after a poll), 'deleted' ({id}) and 'resync' (client fell
+    behind and should refetch /api/devices/).
+    """
+    if request.method != 'GET':
+        return HttpResponse(status=405)
+    is_authenticated, user_id, is_superuser = await sync_to_async(_session_user)(request)
+    if not is_authenticated:
+        return HttpResponse(json.dumps({'detail': 'Authentication credentials were not provided.'}),
+                            status=403, content_type='application/json')
+
+    subscriber = await broadcaster.subscribe(user_id, is_superuser)
+    response = StreamingHttpResponse(event_stream(subscriber), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
+
+# ----- Background job progress -----
+
+JOB_POLL_INTERVAL = 1      # Seconds between job row reads
+
+
+def _job_for(request, job_id):
+    from .jobs import get_job_for, job_payload
+    job = get_job_for(request, job_id)
+    return None if job is None else job_payload(job)
+
+
+async def job_event_stream(request, job_id):
+    sent = 0
+    idle = 0
+    while True:
+        payload = await sync_to_async(_job_for)(request, job_id)
+        if payload is None:
+            yield format_event(sent, 'failed', {'error': 'Job not found.'})
+            return
+        for event in payload['progress'][sent:]:
+            sent += 1
+            idle = 0
+            yield format_event(sent, 'progress', event)
+        if payload['status'] in ('done', 'failed'):
+            yield format_event(sent, payload['status'], payload)
+            return
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+        idle += JOB_POLL_INTERVAL
+        if idle >= KEEPALIVE_INTERVAL:
+            idle = 0
+            yield ": keepalive\n\n"
+
+
+async def job_stream(request, job_id):
+    """
+    SSE endpoint following one background job. Events: 'progress' (one per
+    progress entry), then a final 'done' or 'failed' carrying the full job payload.
+    """
+    if request.method != 'GET':
+        return HttpResponse(status=405)
+    payload = await sync_to_async(_job_for)(request, job_id)
+    if payload is None:
+        return HttpResponse(json.dumps({'detail': 'Job not found.'}), status=404, content_type='application/json')
+
+    response = StreamingHttpResponse(job_event_stream(request, job_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,3 +1,345 @@
-from django.test import TestCase
+import json
+import socket
+import socketserver
+import threading
+import time
+from datetime import timedelta
+from email import message_from_string
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import alerting, jobs, notifications
+from .admin import custom_admin_site
+from .alerting import Evaluator
+from .models import AlertState, BackgroundJob, Device, Interface, Metric, Threshold
+from .response_cache import DEVICES, cached_json_response, response_cache
+from .notifications import Dispatcher
+
+
+# ----- Local stand-ins for the mail server and the webhook receiver -----
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Minimal SMTP server on 127.0.0.1; the first `fail` messages are refused with 451."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, fail=0):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.refused = 0
+        self.fail = fail
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply('220 stand-in ESMTP')
+        data = None
+        for raw in self.rfile:
+            line = raw.decode().rstrip('\r\n')
+            if data is not None:
+                if line != '.':
+                    data.append(line[1:] if line.startswith('..') else line)
+                    continue
+                if self.server.refused < self.server.fail:
+                    self.server.refused += 1
+                    self.reply('451 try again later')
+                else:
+                    self.server.messages.append(message_from_string('\n'.join(data)))
+                    self.reply('250 queued')
+                data = None
+                continue
+            command = line.split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 stand-in')
+            elif command == 'DATA':
+                data = []
+                self.reply('354 end with .')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+class WebhookStandIn(HTTPServer):
+    """Collects JSON POSTs on 127.0.0.1; the first `fail` requests answer HTTP 500."""
+
+    def __init__(self, fail=0):
+        super().__init__(('127.0.0.1', 0), WebhookHandler)
+        self.posts = []
+        self.calls = 0
+        self.fail = fail
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/hook"
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.server.calls += 1
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.server.calls <= self.server.fail:
+            self.send_response(500)
+        else:
+            self.server.posts.append(json.loads(body))
+            self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def note(threshold_id, to_state, from_state='ok', value='95', hostname='core-sw1'):
+    """A notification dict as alerting.Evaluator hands it to Dispatcher.enqueue()."""
+    return {
+        'threshold_id': threshold_id, 'device_id': 1, 'hostname': hostname, 'ip_address': '10.0.0.1',
+        'owner_email': 'owner@example.com', 'metric': 'CPU Usage', 'interface': None,
+        'from_state': from_state, 'to_state': to_state, 'value': value,
+        'at': '2025-11-01T10:00:00+00:00', 'message': f"{hostname} CPU Usage {value}",
+    }
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+class DispatcherSinkTests(SimpleTestCase):
+    """Runs the Dispatcher against a local SMTP server and a local webhook receiver."""
+
+    WINDOW = 0.3
+
+    def setUp(self):
+        self.smtp = SMTPStandIn()
+        self.webhook = WebhookStandIn()
+        for server in (self.smtp, self.webhook):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.addCleanup(server.server_close)
+            self.addCleanup(server.shutdown)
+        settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.smtp.port,
+            EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='', EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+            ALERT_EMAIL_FROM='monitor@example.com', ALERT_EMAIL_OWNERS=True, ALERT_EMAIL_TO=[],
+            ALERT_WEBHOOK_URLS=[self.webhook.url],
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patcher = mock.patch.object(notifications, 'RETRY_BACKOFF', 0.1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dispatcher = Dispatcher(window=self.WINDOW).start()
+        self.addCleanup(self.dispatcher.stop, 5)
+
+    def test_window_is_sent_as_one_digest_per_recipient(self):
+        # Rate limit: everything inside one window is one e-mail and one POST
+        self.dispatcher.enqueue([note(1, 'critical'), note(2, 'warning', hostname='edge-r1'), note(3, 'critical')])
+        self.assertTrue(wait_for(lambda: self.smtp.messages and self.webhook.posts))
+        time.sleep(self.WINDOW * 2)
+
+        self.assertEqual(len(self.smtp.messages), 1)
+        self.assertEqual(len(self.webhook.posts), 1)
+        message = self.smtp.messages[0]
+        self.assertEqual(message['To'], 'owner@example.com')
+        self.assertIn('3 alert change(s)', message['Subject'])
+        self.assertEqual([alert['threshold_id'] for alert in self.webhook.posts[0]['alerts']], [1, 3, 2])
+        self.assertEqual(self.dispatcher.sent, 2)
+
+    def test_flapping_rule_is_one_line(self):
+        states = ['critical', 'ok', 'critical', 'ok', 'critical']
+        self.dispatcher.enqueue([
+            note(1, state, from_state=previous)
+            for previous, state in zip(['ok'] + states, states)
+        ])
+        self.assertTrue(wait_for(lambda: self.smtp.messages and self.webhook.posts))
+
+        alerts = self.webhook.posts[0]['alerts']
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual((alerts[0]['from_state'], alerts[0]['to_state'], alerts[0]['transitions']),
+                         ('ok', 'critical', 5))
+        self.assertIn('(flapped 5x)', self.smtp.messages[0].get_payload())
+
+    def test_repeated_state_is_suppressed(self):
+        self.dispatcher.enqueue([note(1, 'critical')])
+        self.assertTrue(wait_for(lambda: self.smtp.messages and self.webhook.posts))
+
+        # Same final state within REPEAT_INTERVAL: nothing new is sent
+        self.dispatcher.enqueue([note(1, 'ok', from_state='critical'), note(1, 'critical', from_state='ok')])
+        time.sleep(self.WINDOW * 3)
+        self.assertEqual(len(self.smtp.messages), 1)
+        self.assertEqual(len(self.webhook.posts), 1)
+
+        # Another rule in the same window still goes out, with the repeat counted
+        self.dispatcher.enqueue([note(1, 'critical', from_state='ok'), note(2, 'warning')])
+        self.assertTrue(wait_for(lambda: len(self.webhook.posts) == 2))
+        self.assertEqual([alert['threshold_id'] for alert in self.webhook.posts[1]['alerts']], [2])
+        self.assertEqual(self.webhook.posts[1]['suppressed'], 1)
+
+    def test_failed_sends_are_retried(self):
+        self.smtp.fail = 1
+        self.webhook.fail = 2
+        with self.assertLogs('monitoring.notifications', 'WARNING') as logs:
+            self.dispatcher.enqueue([note(1, 'critical')])
+            self.assertTrue(wait_for(lambda: self.smtp.messages and self.webhook.posts))
+
+        self.assertEqual(sum('retrying' in line for line in logs.output), 3)
+        self.assertEqual(self.smtp.refused, 1)
+        self.assertEqual(self.webhook.calls, 3)
+        self.assertEqual(len(self.smtp.messages), 1)
+        self.assertEqual(len(self.webhook.posts), 1)
+        self.assertEqual((self.dispatcher.sent, self.dispatcher.failed), (2, 0))
+
+    def test_digest_is_dropped_after_max_attempts(self):
+        self.webhook.fail = notifications.MAX_ATTEMPTS
+        with self.assertLogs('monitoring.notifications', 'WARNING') as logs:
+            self.dispatcher.enqueue([note(1, 'critical')])
+            self.assertTrue(wait_for(lambda: self.dispatcher.failed == 1))
+
+        self.assertIn('Dropping alert digest', logs.output[-1])
+        self.assertEqual(self.webhook.calls, notifications.MAX_ATTEMPTS)
+        self.assertEqual(self.webhook.posts, [])
+        # The failing webhook did not hold back the e-mail
+        self.assertEqual(len(self.smtp.messages), 1)
+
+    def test_unreachable_server_does_not_block_enqueue(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            closed_port = probe.getsockname()[1]
+        with override_settings(EMAIL_PORT=closed_port), self.assertLogs('monitoring.notifications', 'WARNING'):
+            started = time.monotonic()
+            self.dispatcher.enqueue([note(i, 'critical') for i in range(100)])
+            self.assertLess(time.monotonic() - started, 0.5)
+            self.assertTrue(wait_for(lambda: self.webhook.posts))
+        self.assertEqual(len(self.webhook.posts[0]['alerts']), 100)
+
+
+class DispatcherBacklogTests(SimpleTestCase):
+    def test_oldest_notifications_are_dropped_when_full(self):
+        dispatcher = Dispatcher(max_backlog=3)
+        dispatcher.enqueue([note(i, 'critical') for i in range(10)])
+
+        self.assertEqual(dispatcher.dropped, 7)
+        self.assertEqual([dispatcher.queue.get_nowait()['threshold_id'] for _ in range(3)], [7, 8, 9])
+
+
+class AdminChangelistTests(TestCase):
+    """Every model on the custom admin site lists without a query error."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+    def test_changelists_load(self):
+        for model in custom_admin_site._registry:
+            opts = model._meta
+            with self.subTest(model=opts.label):
+                url = reverse(f'{custom_admin_site.name}:{opts.app_label}_{opts.model_name}_changelist')
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class StatusPromotionTests(SimpleTestCase):
+    """Pending status alerts are confirmed on the poller's clock, not the app server's."""
+
+    def setUp(self):
+        device = Device(id=1, hostname='core-sw1')
+        self.oper = Metric(id=7, metric_name='ifOperStatus')
+        self.cpu = Metric(id=1, metric_name='CPU Usage')
+        interface = Interface(id=3, device=device, ifIndex=3, ifName='Gi0/3')
+        self.threshold = Threshold(id=1, device=device, metric=self.oper, interface=interface, condition='=',
+                                   value='down', min_duration=120, alert_level='Critical')
+        self.evaluator = Evaluator()
+        self.evaluator.rules = {(1, 7, 3): [self.threshold]}
+        self.evaluator.states = {1: AlertState(threshold=self.threshold, device_id=1, metric_id=7, interface_id=3)}
+        self.clock = 1000.0
+        patcher = mock.patch.object(alerting.time, 'monotonic', lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # The poller's clock is 8 hours behind the app server's
+        self.poller_now = timezone.now() - timedelta(hours=8)
+
+    def sample(self, metric, value, seconds, interface_id=None):
+        at = self.poller_now + timedelta(seconds=seconds)
+        return {'id': seconds, 'device_id': 1, 'metric_id': metric.id, 'interface_id': interface_id,
+                'value': value, 'timestamp': at, 'collected_at': at}
+
+    def test_pending_status_is_confirmed_after_min_duration_on_the_sample_clock(self):
+        state = self.evaluator.states[1]
+        self.evaluator.process([self.sample(self.oper, 'down(2)', 0, interface_id=3)])
+        self.assertEqual((state.state, state.pending_state), ('ok', 'critical'))
+
+        # 60s later (a CPU sample and the local clock agree): not held long enough yet
+        self.clock += 60
+        self.evaluator.process([self.sample(self.cpu, '12', 60)])
+        self.assertEqual(self.evaluator.promote(self.evaluator.sample_now()), ([], []))
+
+        # No new sample, but 120s have passed since the status went down
+        self.clock += 61
+        touched, events = self.evaluator.promote(self.evaluator.sample_now())
+        self.assertEqual(state.state, 'critical')
+        self.assertEqual(state.changed_at, self.poller_now + timedelta(seconds=120))
+        self.assertEqual([(event.from_state, event.to_state) for event in events], [('ok', 'critical')])
+
+    def test_nothing_is_promoted_before_a_sample_was_read(self):
+        state = self.evaluator.states[1]
+        state.pending_state, state.pending_since = 'critical', self.poller_now - timedelta(hours=1)
+        self.assertIsNone(self.evaluator.sample_now())
+        self.assertEqual(self.evaluator.promote(self.evaluator.sample_now()), ([], []))
+        self.assertEqual(state.state, 'ok')
+
+
+class CachedResponseTests(TestCase):
+    def get(self, **extra):
+        request = RequestFactory().get('/api/devices/', **extra)
+        return cached_json_response(request, 'device-list', DEVICES, lambda: {'devices': []},
+                                    headers=lambda: {'X-Change-Cursor': '42'})
+
+    def test_not_modified_keeps_extra_headers_without_a_cached_entry(self):
+        etag = self.get()['ETag']
+        response_cache.clear()   # Evicted, or the first request was served by another worker
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['X-Change-Cursor'], '42')
+
+
+class DiscoveryCredentialTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pw')
+        self.job = BackgroundJob.objects.create(
+            kind=BackgroundJob.KIND_DISCOVERY, user=self.owner, status=BackgroundJob.STATUS_DONE,
+            params={'ip_address': '10.0.0.1', 'snmp_user': 'admin'},
+            secrets=jobs.encrypt_secrets({'auth_pass': 'auth-secret', 'priv_pass': 'priv-secret'}),
+            result={'status': 'OK', 'data': {'ip_address': '10.0.0.1', 'interfaces': {}}},
+        )
+
+    def test_payload_never_contains_secrets(self):
+        payload = jobs.job_payload(self.job)
+        self.assertNotIn('secret', json.dumps(payload))
+        self.assertEqual(payload['result']['data']['discovery_job'], str(self.job.pk))
+
+    def test_only_the_owner_reads_the_credentials_once(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        self.assertIsNone(jobs.discovery_credentials(other, self.job.pk, '10.0.0.1'))
+        self.assertIsNone(jobs.discovery_credentials(self.owner, self.job.pk, '10.0.0.2'))
+        self.assertIsNone(jobs.discovery_credentials(self.owner, 'not-a-uuid', '10.0.0.1'))
+        self.assertEqual(jobs.discovery_credentials(self.owner, self.job.pk, '10.0.0.1'),
+                         {'snmp_user': 'admin', 'auth_pass': 'auth-secret', 'priv_pass': 'priv-secret'})
+
+        jobs.forget_credentials(self.job.pk)
+        self.assertIsNone(jobs.discovery_credentials(self.owner, self.job.pk, '10.0.0.1'))
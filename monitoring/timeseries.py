@@ -0,0 +1,377 @@
+""" Server-side time-series aggregation for the metrics API.
+
+    Samples come from the raw History table and/or from pre-aggregated
+    HistoryRollup rows (ICMP RTT / loss series from ProbeSample). Both are turned into the same "partial" arrays
+    (count, total, minimum, maximum, last) so a single vectorized NumPy
+    pass can merge them into aligned buckets. The response size depends
+    only on the number of buckets, never on the number of raw samples. """
+
+import math
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db.models import Count, Max, OuterRef, Prefetch, Q, Subquery, prefetch_related_objects
+
+from .models import History, HistoryRollup, Interface, InterfaceStateChange, Metric, ProbeSample
+
+# --- CONFIGURATION ---
+AGGREGATIONS = ('avg', 'min', 'max', 'sum', 'count', 'last')
+DEFAULT_AGGREGATION = 'avg'
+DEFAULT_WINDOW = timedelta(hours=24)
+DEFAULT_STEP = 300               # 5 minutes
+MAX_POINTS = 1500                # Hard cap on buckets per response
+ROLLUP_STEPS = (300, 3600)       # Bucket widths maintained by `manage.py rollup_history`
+MAX_RAW_RANGES = 32              # Rollup gaps read as separate raw ranges; more are read as one span
+PROBE_SERIES = {                 # ProbeSample columns served as metrics -> unit
+    'rtt_min': 'ms', 'rtt_avg': 'ms', 'rtt_max': 'ms', 'jitter': 'ms', 'loss': '%',
+}
+STATUS_METRICS = {               # InterfaceStateChange kind -> metric name; History only has
+    InterfaceStateChange.KIND_ADMIN: 'ifAdminStatus',    # their transitions and keep-alives
+    InterfaceStateChange.KIND_OPER: 'ifOperStatus',
+}
+# ---------------------------------------------------------------------------------
+
+# Status strings are stored as e.g. "up(1)" / "down(2)"; keep the number
+_ENUM_PATTERN = re.compile(r'\((-?\d+)\)\s*$')
+_STEP_PATTERN = re.compile(r'^\s*(\d+)\s*([smhd]?)\s*$')
+_STEP_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_step(raw):
+    """Parses '300', '300s', '5m', '1h' or '1d' into seconds. Returns None if invalid."""
+    match = _STEP_PATTERN.match(str(raw))
+    if not match:
+        return None
+    seconds = int(match.group(1)) * _STEP_UNITS[match.group(2)]
+    return seconds if seconds > 0 else None
+
+
+def parse_timestamp(raw):
+    """Parses an epoch number or an ISO-8601 string into an aware datetime (UTC if naive)."""
+    try:
+        return datetime.fromtimestamp(float(raw), tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        pass
+    try:
+        value = datetime.fromisoformat(str(raw).replace('Z', '+00:00'))
+    except (ValueError, OverflowError, OSError):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt_timezone.utc)
+    return value
+
+
+def to_float(raw):
+    """Converts a stored History value to float (NaN when it is not numeric)."""
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        match = _ENUM_PATTERN.search(str(raw))
+        return float(match.group(1)) if match else math.nan
+
+
+def align(start, stop, step):
+    """Aligns [start, stop) to epoch multiples of `step`. Returns (first_bucket_epoch, bucket_count)."""
+    first = math.floor(start.timestamp() / step) * step
+    count = max(1, math.ceil((stop.timestamp() - first) / step))
+    return first, count
+
+
+def aggregate(times, count, total, minimum, maximum, last, first, step, buckets, agg):
+    """
+    Merges partial aggregates into `buckets` aligned buckets of width `step`.
+
+    Every input is a 1-D array of equal length: one entry per raw sample
+    (count=1) or per rollup row. Returns a float array with NaN for empty buckets.
+    """
+    index = np.floor((times - first) / step).astype(np.int64)
+    keep = (index >= 0) & (index < buckets) & (count > 0)
+    index, times = index[keep], times[keep]
+    count, total, minimum, maximum, last = count[keep], total[keep], minimum[keep], maximum[keep], last[keep]
+
+    counts = np.bincount(index, weights=count, minlength=buckets)
+    empty = counts == 0
+
+    if agg == 'count':
+        return counts
+    if agg == 'sum':
+        result = np.bincount(index, weights=total, minlength=buckets)
+    elif agg == 'avg':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = np.bincount(index, weights=total, minlength=buckets) / counts
+    elif agg == 'min':
+        result = np.full(buckets, np.inf)
+        np.minimum.at(result, index, minimum)
+    elif agg == 'max':
+        result = np.full(buckets, -np.inf)
+        np.maximum.at(result, index, maximum)
+    elif agg == 'last':
+        # Position of the newest partial in each bucket, after a stable time sort
+        order = np.argsort(times, kind='stable')
+        newest = np.full(buckets, -1, dtype=np.int64)
+        np.maximum.at(newest, index[order], np.arange(order.size))
+        result = np.full(buckets, np.nan)
+        filled = newest >= 0
+        result[filled] = last[order][newest[filled]]
+    else:
+        raise ValueError(f"Unsupported aggregation: {agg}")
+
+    result[empty] = np.nan
+    return result
+
+
+def raw_partials(queryset, field='value'):
+    """Loads (timestamp, value) pairs from a History (or ProbeSample) queryset as partial arrays."""
+    rows = list(queryset.values_list('timestamp', field))
+    times = np.fromiter((ts.timestamp() for ts, _ in rows), dtype=np.float64, count=len(rows))
+    values = np.fromiter((to_float(value) for _, value in rows), dtype=np.float64, count=len(rows))
+    valid = ~np.isnan(values)
+    times, values = times[valid], values[valid]
+    return times, np.ones_like(values), values, values, values, values
+
+
+def rollup_partials(queryset):
+    """Loads HistoryRollup rows as partial arrays."""
+    rows = list(queryset.values_list('bucket', 'count', 'total', 'minimum', 'maximum', 'last'))
+    if not rows:
+        empty = np.empty(0, dtype=np.float64)
+        return (empty,) * 6
+    columns = list(zip(*rows))
+    times = np.fromiter((ts.timestamp() for ts in columns[0]), dtype=np.float64, count=len(rows))
+    return (times,) + tuple(np.asarray(column, dtype=np.float64) for column in columns[1:])
+
+
+def pick_rollup_step(step):
+    """Returns the widest maintained rollup step that evenly divides `step`, or None."""
+    usable = [r for r in ROLLUP_STEPS if r <= step and step % r == 0]
+    return max(usable) if usable else None
+
+
+def query_series(device_id, metric_id, interface_id, start, stop, step, agg):
+    """
+    Returns a dict with aligned bucket timestamps and aggregated values for one series.
+
+    Rolled-up buckets are used where they exist; every part of the window that
+    has no rollup (before the first one, gaps between them, the open tail) is
+    read from raw History.
+    """
+    first, buckets = align(start, stop, step)
+    window_start = datetime.fromtimestamp(first, tz=dt_timezone.utc)
+    window_stop = datetime.fromtimestamp(first + buckets * step, tz=dt_timezone.utc)
+
+    series = {'device_id': device_id, 'metric_id': metric_id, 'interface_id': interface_id}
+    raw_ranges = [(window_start, window_stop)]
+    covered = []
+    partials = []
+
+    rollup_step = pick_rollup_step(step)
+    if rollup_step:
+        rollups = HistoryRollup.objects.filter(
+            step=rollup_step, bucket__gte=window_start, bucket__lt=window_stop, **series
+        )
+        covered = sorted(set(rollups.values_list('bucket', flat=True)))
+        if covered:
+            partials.append(rollup_partials(rollups))
+            raw_ranges = uncovered_ranges(covered, rollup_step, window_start, window_stop)
+
+    if raw_ranges:
+        if len(raw_ranges) <= MAX_RAW_RANGES:
+            spans = Q()
+            for range_start, range_stop in raw_ranges:
+                spans |= Q(timestamp__gte=range_start, timestamp__lt=range_stop)
+            partials.append(raw_partials(History.objects.filter(spans, **series)))
+        else:
+            # Patchy rollups: one range scan, then drop the samples of rolled-up buckets
+            raw = History.objects.filter(timestamp__gte=raw_ranges[0][0], timestamp__lt=raw_ranges[-1][1], **series)
+            times, *rest = raw_partials(raw)
+            rolled = np.fromiter((b.timestamp() for b in covered), dtype=np.float64, count=len(covered))
+            keep = ~np.isin(np.floor(times / rollup_step) * rollup_step, rolled)
+            partials.append((times[keep],) + tuple(column[keep] for column in rest))
+
+    if not covered:
+        source = 'raw'
+    else:
+        source = 'mixed' if raw_ranges else 'rollup'
+    return _series(partials, window_start, window_stop, first, step, buckets, agg, source)
+
+
+def uncovered_ranges(covered, rollup_step, window_start, window_stop):
+    """[start, stop) ranges of the window not covered by the sorted rollup buckets `covered`."""
+    width = timedelta(seconds=rollup_step)
+    ranges, cursor = [], window_start
+    for bucket in covered:
+        if bucket > cursor:
+            ranges.append((cursor, bucket))
+        cursor = max(cursor, bucket + width)
+    if cursor < window_stop:
+        ranges.append((cursor, window_stop))
+    return ranges
+
+
+def query_probe_series(device_id, field, start, stop, step, agg):
+    """Same as query_series for one PROBE_SERIES column of the device's ProbeSample rows."""
+    first, buckets = align(start, stop, step)
+    window_start = datetime.fromtimestamp(first, tz=dt_timezone.utc)
+    window_stop = datetime.fromtimestamp(first + buckets * step, tz=dt_timezone.utc)
+    samples = ProbeSample.objects.filter(device_id=device_id, timestamp__gte=window_start, timestamp__lt=window_stop)
+    return _series([raw_partials(samples, field)], window_start, window_stop, first, step, buckets, agg, 'probe')
+
+
+def _series(partials, window_start, window_stop, first, step, buckets, agg, source):
+    merged = [np.concatenate(column) for column in zip(*partials)]
+    values = aggregate(*merged, first=first, step=step, buckets=buckets, agg=agg)
+    timestamps = first + step * np.arange(buckets, dtype=np.int64)
+
+    return {
+        'from': window_start.isoformat(),
+        'to': window_stop.isoformat(),
+        'step': step,
+        'agg': agg,
+        'source': source,
+        'timestamps': timestamps.tolist(),
+        # NaN is not valid JSON; empty buckets are sent as null
+        'values': [None if math.isnan(v) else round(float(v), 6) for v in values],
+    }
+
+
+def status_at(device_id, at, window):
+    """
+    Admin/oper status of each active interface of a device at time `at`.
+
+    The status is the newest History sample at or before `at` (one index seek
+    per interface and metric, as the poller only writes status changes and
+    keep-alives). `flaps` counts the oper status changes in (at - window, at].
+    """
+    metric_ids = dict(Metric.objects.filter(metric_name__in=STATUS_METRICS.values()).values_list('metric_name', 'id'))
+    annotations = {}
+    for kind, name in STATUS_METRICS.items():
+        newest = History.objects.filter(
+            interface=OuterRef('pk'), metric_id=metric_ids.get(name), timestamp__lte=at
+        ).order_by('-timestamp')
+        annotations[kind] = Subquery(newest.values('value')[:1])
+        annotations[f'{kind}_sampled_at'] = Subquery(newest.values('timestamp')[:1])
+    annotations['last_change'] = Subquery(
+        InterfaceStateChange.objects.filter(interface=OuterRef('pk'), changed_at__lte=at)
+        .order_by('-changed_at').values('changed_at')[:1]
+    )
+    interfaces = (
+        Interface.objects.filter(device_id=device_id, is_active=True)
+        .annotate(**annotations).order_by('ifIndex')
+    )
+    flaps = dict(
+        InterfaceStateChange.objects.filter(
+            interface__device_id=device_id, kind=InterfaceStateChange.KIND_OPER,
+            changed_at__gt=at - window, changed_at__lte=at,
+        ).values('interface_id').annotate(count=Count('id')).values_list('interface_id', 'count')
+    )
+    return [
+        {
+            'interface_id': interface.id,
+            'ifIndex': interface.ifIndex,
+            'ifName': interface.ifName,
+            'admin': interface.admin,
+            'admin_sampled_at': interface.admin_sampled_at,
+            'oper': interface.oper,
+            'oper_sampled_at': interface.oper_sampled_at,
+            'last_change': interface.last_change,
+            'flaps': flaps.get(interface.id, 0),
+        }
+        for interface in interfaces
+    ]
+
+
+def prefetch_latest_history(objects, scope):
+    """
+    Fills `history_set` of Device (scope 'device') or Interface ('interface') instances with
+    only the newest row of each metric, so serializers reading obj.history_set.all() do not
+    load the whole history. Returns the objects as a list.
+    """
+    objects = list(objects)
+    field = f'{scope}_id'
+    history = History.objects.all()
+    if scope == 'device':
+        # Device-level rows only: per-port series are neither scanned nor grouped
+        history = history.filter(interface__isnull=True)
+    # MAX(timestamp) per (owner, metric) walks the (owner, metric, timestamp) index: one step per series
+    newest = (history.filter(**{f'{field}__in': [obj.pk for obj in objects]})
+              .values(field, 'metric_id').annotate(last=Max('timestamp')).order_by())
+    # Rows of one poll cycle share the timestamp, so the series fall into a few (metric, timestamp) groups
+    groups = {}
+    for row in newest:
+        groups.setdefault((row['metric_id'], row['last']), []).append(row[field])
+    match = Q()
+    for (metric_id, at), owners in groups.items():
+        match |= Q(metric_id=metric_id, timestamp=at, **{f'{field}__in': owners})
+
+    rows = history.filter(match).select_related('metric') if groups else History.objects.none()
+    prefetch_related_objects(objects, Prefetch('history_set', queryset=rows))
+    return objects
+
+
+def build_rollups(step, start, stop):
+    """
+    Aggregates raw History in [start, stop) into HistoryRollup rows of width `step`.
+    Existing rollups in the window are replaced. Returns the number of rows written.
+
+    The poller stamps samples with the slot of their cycle (History.timestamp), so
+    with a step that is a multiple of its interval a cycle never straddles buckets.
+    """
+    first, buckets = align(start, stop, step)
+    window_start = datetime.fromtimestamp(first, tz=dt_timezone.utc)
+    window_stop = datetime.fromtimestamp(first + buckets * step, tz=dt_timezone.utc)
+
+    rows = list(
+        History.objects.filter(timestamp__gte=window_start, timestamp__lt=window_stop)
+        .values_list('device_id', 'metric_id', 'interface_id', 'timestamp', 'value')
+    )
+    HistoryRollup.objects.filter(step=step, bucket__gte=window_start, bucket__lt=window_stop).delete()
+    if not rows:
+        return 0
+
+    device, metric, interface, times, values = zip(*rows)
+    device = np.asarray(device, dtype=np.int64)
+    metric = np.asarray(metric, dtype=np.int64)
+    # 0 stands in for "no interface" (device-level metrics); real ids start at 1
+    interface = np.asarray([i or 0 for i in interface], dtype=np.int64)
+    times = np.fromiter((ts.timestamp() for ts in times), dtype=np.float64, count=len(rows))
+    values = np.fromiter((to_float(v) for v in values), dtype=np.float64, count=len(rows))
+
+    valid = ~np.isnan(values)
+    device, metric, interface, times, values = device[valid], metric[valid], interface[valid], times[valid], values[valid]
+    bucket = (np.floor((times - first) / step) * step + first).astype(np.int64)
+
+    # Sort by (series, bucket, time) so each group is contiguous and its newest sample is last
+    order = np.lexsort((times, bucket, interface, metric, device))
+    device, metric, interface, bucket, values = device[order], metric[order], interface[order], bucket[order], values[order]
+    boundary = np.ones(values.size, dtype=bool)
+    boundary[1:] = (
+        (device[1:] != device[:-1]) | (metric[1:] != metric[:-1])
+        | (interface[1:] != interface[:-1]) | (bucket[1:] != bucket[:-1])
+    )
+    starts = np.flatnonzero(boundary)
+    ends = np.append(starts[1:], values.size) - 1
+
+    counts = np.diff(np.append(starts, values.size))
+    totals = np.add.reduceat(values, starts)
+    minimums = np.minimum.reduceat(values, starts)
+    maximums = np.maximum.reduceat(values, starts)
+    lasts = values[ends]
+
+    rollups = [
+        HistoryRollup(
+            device_id=int(device[s]),
+            metric_id=int(metric[s]),
+            interface_id=int(interface[s]) or None,
+            step=step,
+            bucket=datetime.fromtimestamp(int(bucket[s]), tz=dt_timezone.utc),
+            count=int(counts[i]),
+            total=float(totals[i]),
+            minimum=float(minimums[i]),
+            maximum=float(maximums[i]),
+            last=float(lasts[i]),
+        )
+        for i, s in enumerate(starts)
+    ]
+    HistoryRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
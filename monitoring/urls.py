@@ -3,10 +3,12 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     DeviceViewSet, DeviceModelViewSet, login_view, 
-    logout_view, UserPreferenceView, DeviceInterfaceListView # Add DeviceInterfaceListView
+    logout_view, UserPreferenceView, DeviceInterfaceListView, # Add DeviceInterfaceListView
+    DeviceMetricSeriesView, DeviceInterfaceStatusView
 )
 from . import views
 from . import api_views
+from . import stream
 
 # ... (router setup is unchanged) ...
 router = DefaultRouter()
@@ -20,19 +22,29 @@ urlpatterns = [
     
     # --- THIS IS THE NEW URL ---
     path('devices/<int:device_id>/interfaces/', DeviceInterfaceListView.as_view(), name='device-interfaces'),
+    path('devices/<int:device_id>/interfaces/status/', DeviceInterfaceStatusView.as_view(), name='device-interface-status'),
+    path('devices/<int:device_id>/metrics/', DeviceMetricSeriesView.as_view(), name='device-metrics'),
     
     # ... (login/logout/preferences paths are unchanged)
     path('login/', login_view, name='login'),
     path('logout/', logout_view, name='logout'),
     path('preferences/', UserPreferenceView.as_view(), name='user-preferences'),
 
+    # Server-Sent Events: live device changes (requires ASGI)
+    path('stream/', stream.device_stream, name='device-stream'),
+
 
 #====================JOSH==========#
     # This path handles the API request from the React frontend
     path('discover/', views.device_discovery_api, name='device_discovery_api'),
+    # Background discovery job: poll for status/result, or follow it over SSE
+    path('discover/jobs/<uuid:job_id>/', views.discovery_job_status, name='discovery_job_status'),
+    path('discover/jobs/<uuid:job_id>/stream/', stream.job_stream, name='discovery_job_stream'),
     # Endpoint for frontend metadata
     path('metadata/', api_views.get_device_metadata, name='get_device_metadata'),
     # Endpoint for confirming and registering the device
     path('device/register/', api_views.confirm_add_device, name='confirm_add_device'),
+    # Endpoint for registering many devices at once (CSV or JSON)
+    path('device/bulk-register/', api_views.bulk_register_devices, name='bulk_register_devices'),
 
 ]
\ No newline at end of file
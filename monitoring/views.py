@@ -14,8 +14,12 @@ from .serializers import (
     UserPreferenceSerializer, InterfaceSerializer # <-- ADD InterfaceSerializer
 )
 from monitoring.models import (
-    Device, DeviceModel, UserPreference, Interface # <-- ADD Interface
+    Device, DeviceModel, UserPreference, Interface, Metric, DeviceChange # <-- ADD Interface
 )
+from . import timeseries
+from .stream import latest_cursor, settled_cursor
+from . import response_cache
+from .response_cache import cached_json_response, user_scope
 
 
 #========
@@ -25,7 +29,10 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
-from .discover_device import discover_device # Import the function from the new script file
+from django.utils import timezone
+from datetime import timedelta
+from django.db.models import Q
+from . import jobs # Discovery runs as a background job (see jobs.py)
 
 
 # READ-ONLY VIEWSET (Dropdown Data)
@@ -34,6 +41,19 @@ class DeviceModelViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = DeviceModelSerializer
     permission_classes = [AllowAny]
 
+    # Both actions are served from the versioned cache until a model changes
+    def list(self, request, *args, **kwargs):
+        return cached_json_response(
+            request, 'model-list', response_cache.METADATA,
+            lambda: super(DeviceModelViewSet, self).list(request, *args, **kwargs).data,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_json_response(
+            request, 'model-detail', response_cache.METADATA,
+            lambda: super(DeviceModelViewSet, self).retrieve(request, *args, **kwargs).data,
+        )
+
 
 # DEVICE CRUD VIEWSET (The Dashboard/Management)
 class DeviceViewSet(viewsets.ModelViewSet):
@@ -57,7 +77,7 @@ class DeviceViewSet(viewsets.ModelViewSet):
         #include_inactive = self.request.query_params.get('include_inactive', 'false').lower() == 'true'
 
         # 2. Define the base query
-        base_qs = Device.objects.all() # Start with all devices
+        base_qs = Device.objects.filter(retired_at__isnull=True) # Start with all devices (not deleted)
         
 # 3. Apply filters based on role
         if user.is_superuser:
@@ -67,18 +87,84 @@ class DeviceViewSet(viewsets.ModelViewSet):
             # Normal user *always* only sees their own devices.
             qs = base_qs.filter(user_id=user.id)
             
-        # --- THIS IS THE NEW, CRITICAL FIX ---
-        # This tells Django to fetch all history for all devices in 
-        # one or two extra queries, INSTEAD of N queries.
-        return qs.prefetch_related(
-            'history_set__metric' 
+        # e.g., /api/devices/?status=down (indexed DeviceState lookup)
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            qs = qs.filter(state__status=status_filter)
+
+        # The newest History rows are attached in get_serializer (prefetch_latest_history)
+        return qs.select_related('state').prefetch_related(
+            'alertstate_set__metric',  # Precomputed threshold states for 'measurements'
         )
+
+    def get_serializer(self, *args, **kwargs):
+        # Only the newest History row per metric is loaded for 'measurements', not the whole history
+        if args and args[0] is not None:
+            many = kwargs.get('many', False)
+            devices = timeseries.prefetch_latest_history(args[0] if many else [args[0]], 'device')
+            args = (devices if many else devices[0], *args[1:])
+        return super().get_serializer(*args, **kwargs)
     
     def get_permissions(self):
         if self.request.method in ['GET', 'HEAD', 'OPTIONS']:
             return [IsAuthenticated()]
         return super().get_permissions()
 
+    def list(self, request, *args, **kwargs):
+        """
+        Full list, or only what changed after a change-feed cursor:
+        e.g., /api/devices/?since=1234
+        -> {"cursor": 1300, "devices": [...changed...], "deleted": [ids]}
+        The cursor for the next call is also sent in the X-Change-Cursor header.
+        It stays below any change id that may still commit, so changes above it
+        can be sent again on the next call.
+        """
+        since = request.query_params.get('since')
+        if since is None:
+            # Served from the versioned cache until a device changes or the poller ingests.
+            # The cursor is read *before* the list so no change can slip in between.
+            return cached_json_response(
+                request, 'device-list', response_cache.DEVICES,
+                lambda: super(DeviceViewSet, self).list(request, *args, **kwargs).data,
+                scope=user_scope(request.user),
+                headers=lambda: {'X-Change-Cursor': str(latest_cursor())},
+            )
+
+        if not since.isdigit():
+            return Response({'detail': "Invalid 'since' cursor."}, status=status.HTTP_400_BAD_REQUEST)
+        since = int(since)
+
+        # One PK range scan: the cursor row itself (to detect a pruned feed)
+        # plus every newer change visible to this user
+        visible = Q(id__gt=since)
+        if not request.user.is_superuser:
+            visible &= Q(owner_id=request.user.id)
+        changes = list(
+            DeviceChange.objects.filter(Q(id=since) | visible)
+            .order_by('id').values_list('id', 'created_at', 'device_id', 'kind')
+        )
+
+        if since and (not changes or changes[0][0] != since):
+            return Response({'detail': 'Cursor expired; refetch the full device list.'}, status=status.HTTP_410_GONE)
+
+        # Another user's rows are hidden here, so gaps are judged on the whole feed
+        newer = changes[1:] if since else changes
+        if not request.user.is_superuser and newer:
+            newer = DeviceChange.objects.filter(id__gt=since, id__lte=newer[-1][0]).order_by('id').values_list('id', 'created_at')
+        new_cursor = settled_cursor(since, newer) if newer else since
+        newest_kind = {device_id: kind for change_id, _, device_id, kind in changes if change_id != since}
+        deleted = [d for d, kind in newest_kind.items() if kind == DeviceChange.KIND_DELETED]
+        changed = [d for d, kind in newest_kind.items() if kind != DeviceChange.KIND_DELETED]
+
+        devices = self.get_queryset().filter(id__in=changed) if changed else []
+        response = Response({
+            'cursor': new_cursor,
+            'devices': self.get_serializer(devices, many=True).data,
+            'deleted': deleted,
+        }, status=status.HTTP_200_OK)
+        response['X-Change-Cursor'] = str(new_cursor)
+        return response
+
 
 # LOGIN VIEW
 @ensure_csrf_cookie
@@ -167,11 +253,143 @@ class DeviceInterfaceListView(ListAPIView):
         
         # This is the "Blueprint": Find all interfaces for this device
         return Interface.objects.filter(
-            device_id=device_id
+            device_id=device_id, is_active=True,  # Retired interfaces keep their history but are hidden
+            device__retired_at__isnull=True,
         ).prefetch_related( # This makes it fast!
-            'history_set__metric'
+            'alertstate_set__metric'
         ).order_by('ifIndex') # Order by interface number
 
+    def get_serializer(self, *args, **kwargs):
+        # Newest History row per metric of each listed interface (not their whole history)
+        if args and kwargs.get('many'):
+            args = (timeseries.prefetch_latest_history(args[0], 'interface'), *args[1:])
+        return super().get_serializer(*args, **kwargs)
+
+
+# --- TIME-SERIES VIEW FOR CHARTS ---
+class DeviceMetricSeriesView(GenericAPIView):
+    """
+    Aggregated time series for one metric of a device (optionally one interface).
+    e.g., /api/devices/12/metrics/?metric=CPU Usage&from=2025-11-01T00:00:00Z&step=5m&agg=avg
+
+    Query parameters:
+    - metric:    Metric name or ID (required); rtt_min, rtt_avg, rtt_max, jitter
+                 and loss read the ICMP probe samples instead of History
+    - interface: Interface ID (optional, for interface metrics)
+    - from / to: ISO-8601 or epoch seconds (default: the last 24 hours)
+    - step:      Bucket width, e.g. 300, 5m, 1h (default: 5m)
+    - agg:       avg | min | max | sum | count | last (default: avg)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, device_id):
+        user = request.user
+        devices = Device.objects.filter(retired_at__isnull=True)
+        if not user.is_superuser:
+            devices = devices.filter(user_id=user.id)
+        device = devices.filter(pk=device_id).first()
+        if device is None:
+            return Response({'detail': 'Device not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        params = request.query_params
+
+        # 1. Resolve the metric (by ID or by name)
+        metric_param = params.get('metric', '').strip()
+        if not metric_param:
+            return Response({'detail': "The 'metric' parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+        probe_field = metric_param if metric_param in timeseries.PROBE_SERIES else None
+        lookup = {'pk': metric_param} if metric_param.isdigit() else {'metric_name': metric_param}
+        metric = Metric.objects.filter(**lookup).first() if probe_field is None else None
+        if metric is None and probe_field is None:
+            return Response({'detail': f'Unknown metric: {metric_param}'}, status=status.HTTP_404_NOT_FOUND)
+
+        # 2. Resolve the optional interface (must belong to this device)
+        interface_id = None
+        if params.get('interface'):
+            interface_param = params.get('interface')
+            interface_id = Interface.objects.filter(
+                device=device, pk=interface_param
+            ).values_list('id', flat=True).first() if interface_param.isdigit() else None
+            if interface_id is None:
+                return Response({'detail': 'Interface not found on this device.'}, status=status.HTTP_404_NOT_FOUND)
+
+        # 3. Parse the window, step and aggregation
+        stop = timeseries.parse_timestamp(params['to']) if params.get('to') else timezone.now()
+        try:
+            start = timeseries.parse_timestamp(params['from']) if params.get('from') else stop - timeseries.DEFAULT_WINDOW
+        except (TypeError, OverflowError):
+            start = None  # invalid 'to', or a 'to' too close to datetime.min for the default window
+        step = timeseries.parse_step(params.get('step', timeseries.DEFAULT_STEP))
+        agg = params.get('agg', timeseries.DEFAULT_AGGREGATION).lower()
+
+        if start is None or stop is None or start >= stop:
+            return Response({'detail': "Invalid 'from'/'to' range."}, status=status.HTTP_400_BAD_REQUEST)
+        if step is None:
+            return Response({'detail': "Invalid 'step' (use seconds or e.g. 5m, 1h)."}, status=status.HTTP_400_BAD_REQUEST)
+        if agg not in timeseries.AGGREGATIONS:
+            return Response({'detail': f"Invalid 'agg'; choose one of {', '.join(timeseries.AGGREGATIONS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if (stop - start).total_seconds() / step > timeseries.MAX_POINTS:
+            return Response({'detail': f'Too many buckets; use a larger step (max {timeseries.MAX_POINTS} points).'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # 4. Aggregate server-side
+        if probe_field is not None:
+            series = timeseries.query_probe_series(device.id, probe_field, start, stop, step, agg)
+            return Response({
+                'device_id': device.id,
+                'metric': probe_field,
+                'unit': timeseries.PROBE_SERIES[probe_field],
+                'interface_id': None,
+                **series,
+            }, status=status.HTTP_200_OK)
+        series = timeseries.query_series(device.id, metric.id, interface_id, start, stop, step, agg)
+        return Response({
+            'device_id': device.id,
+            'metric': metric.metric_name,
+            'unit': metric.unit,
+            'interface_id': interface_id,
+            **series,
+        }, status=status.HTTP_200_OK)
+
+
+# --- INTERFACE STATUS AT A POINT IN TIME ---
+class DeviceInterfaceStatusView(GenericAPIView):
+    """
+    Admin/oper status of every interface of a device at a given time, with flap counts.
+    e.g., /api/devices/12/interfaces/status/?at=2025-11-01T08:00:00Z&window=1d
+
+    Query parameters:
+    - at:     ISO-8601 or epoch seconds (default: now)
+    - window: Period before 'at' in which oper status changes are counted as flaps,
+              e.g. 3600, 1h, 1d (default: 1d)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, device_id):
+        user = request.user
+        devices = Device.objects.filter(retired_at__isnull=True)
+        if not user.is_superuser:
+            devices = devices.filter(user_id=user.id)
+        device = devices.filter(pk=device_id).first()
+        if device is None:
+            return Response({'detail': 'Device not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        params = request.query_params
+        at = timeseries.parse_timestamp(params['at']) if params.get('at') else timezone.now()
+        window = timeseries.parse_step(params.get('window', '1d'))
+        if at is None:
+            return Response({'detail': "Invalid 'at' time."}, status=status.HTTP_400_BAD_REQUEST)
+        if window is None:
+            return Response({'detail': "Invalid 'window' (use seconds or e.g. 1h, 1d)."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'device_id': device.id,
+            'at': at.isoformat(),
+            'window': window,
+            'interfaces': timeseries.status_at(device.id, at, timedelta(seconds=window)),
+        }, status=status.HTTP_200_OK)
+
 
 
 
@@ -181,8 +399,9 @@ class DeviceInterfaceListView(ListAPIView):
 @require_http_methods(["POST"])
 def device_discovery_api(request):
     """
-    Receives SNMPv3 credentials and IP, executes the Python discovery script, 
-    and returns the JSON result.
+    Receives SNMPv3 credentials and IP and queues a background discovery job.
+    A CIDR (or `subnetMask`) queues a subnet sweep instead. Returns 202 with the job id right away; the result is read from
+    `/api/discover/jobs/<job_id>/` (poll) or `.../stream/` (SSE).
     """
     print("Received device discovery request.")
     # 1. Check the request type
@@ -197,6 +416,7 @@ def device_discovery_api(request):
         data = json.loads(request.body.decode('utf-8'))
         
         ip_address = data.get('ipAddress')
+        subnet_mask = data.get('subnetMask')
         username = data.get('username')
         auth_password = data.get('authPassword')
         priv_password = data.get('privPassword')
@@ -208,24 +428,49 @@ def device_discovery_api(request):
                 status=400
             )
 
-        # 3. Execute the discovery script function
-        discovery_results = discover_device(
-            username, 
-            auth_password, 
-            priv_password, 
-            ip_address
-        )
-
-        # 4. Return results to the frontend
-        if discovery_results.get("status") == "error":
-            # If the script returned an error, return a server-side error status
-            return JsonResponse(discovery_results, status=500)
-        
-        return JsonResponse(discovery_results, status=200)
+        # 3. Queue the discovery script function on the job pool
+        if '/' in ip_address or subnet_mask:
+            # Sweep mode: a CIDR (e.g., 10.11.1.0/24) or an IP plus subnet mask
+            try:
+                network = jobs.parse_sweep_network(ip_address, subnet_mask)
+            except ValueError as e:
+                return JsonResponse({"status": "error", "message": f"Invalid subnet: {e}"}, status=400)
+            job = jobs.start_sweep_job(request.user, network, username, auth_password, priv_password)
+        else:
+            job = jobs.start_discovery_job(
+                request.user,
+                ip_address,
+                username, 
+                auth_password, 
+                priv_password
+            )
 
+        # 4. Return the job handle to the frontend
+        return JsonResponse({
+            "status": job.status,
+            "job_id": str(job.pk),
+            "poll_url": f"/api/discover/jobs/{job.pk}/",
+            "stream_url": f"/api/discover/jobs/{job.pk}/stream/",
+        }, status=202)
+
+    except jobs.JobQueueFull as e:
+        response = JsonResponse({"status": "error", "message": str(e)}, status=429)
+        response['Retry-After'] = '5'
+        return response
     except json.JSONDecodeError:
         return JsonResponse({"status": "error", "message": "Invalid JSON format in request body."}, status=400)
     except Exception as e:
-        # Catch any unexpected Python errors during script execution
+        # Catch any unexpected Python errors while queueing the job
         print(f"Error during device discovery: {e}")
         return JsonResponse({"status": "error", "message": f"Server processing error: {e}"}, status=500)
+
+
+@require_http_methods(["GET"])
+def discovery_job_status(request, job_id):
+    """Returns the state, progress events and (when done) the result of a discovery or sweep job."""
+    job = jobs.get_job_for(request, job_id)
+    if job is None:
+        return JsonResponse({"status": "error", "message": "Job not found."}, status=404)
+    response = JsonResponse(jobs.job_payload(job))
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import environ
 import os
 from pathlib import Path
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -187,9 +187,31 @@ if not FERNET_KEY:
         f.write(FERNET_KEY)
     os.chmod(key_path, 0o600)  # secure the file
 
-FERNET = Fernet(FERNET_KEY.encode() if isinstance(FERNET_KEY, str) else FERNET_KEY)
+# Keys replaced by FERNET_KEY (comma separated): still accepted for decryption
+# until `manage.py rotate_fernet_key` has re-encrypted the stored credentials
+FERNET_OLD_KEYS = [key.strip() for key in os.getenv('FERNET_OLD_KEYS', '').split(',') if key.strip()]
 
+# Encrypts with FERNET_KEY, decrypts with any of the keys
+FERNET = MultiFernet([Fernet(key) for key in [FERNET_KEY, *FERNET_OLD_KEYS]])
 
+# Background jobs (monitoring/jobs.py): worker threads per process and max queued + running jobs
+JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', 4))
+JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', 32))
+
+# Alert notifications (monitoring/notifications.py). SMTP uses Django's EMAIL_* settings.
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', '') == '1'
+ALERT_EMAIL_FROM = os.getenv('ALERT_EMAIL_FROM', 'network-monitor@localhost')
+ALERT_EMAIL_OWNERS = os.getenv('ALERT_EMAIL_OWNERS', '1') == '1'     # mail each device owner
+ALERT_EMAIL_TO = [a.strip() for a in os.getenv('ALERT_EMAIL_TO', '').split(',') if a.strip()]        # extra addresses (all alerts)
+ALERT_WEBHOOK_URLS = [u.strip() for u in os.getenv('ALERT_WEBHOOK_URLS', '').split(',') if u.strip()]  # JSON POST (all alerts)
+ALERT_DIGEST_WINDOW = int(os.getenv('ALERT_DIGEST_WINDOW', 60))      # seconds coalesced into one digest
+
+# Anomaly detection baselines (monitoring/anomaly.py), one compact NumPy file for the whole fleet
+ANOMALY_BASELINE_PATH = os.getenv('ANOMALY_BASELINE_PATH', os.path.join(BASE_DIR, 'anomaly_baselines.npz'))
 
 
 
@@ -212,6 +234,8 @@ TRUSTED_ORIGINS = [
     "http://dev.local:5173",
 ]
 CORS_ALLOWED_ORIGINS = TRUSTED_ORIGINS
+# Let the React app read the change-feed cursor and cache validator headers
+CORS_EXPOSE_HEADERS = ['X-Change-Cursor', 'ETag', 'Last-Modified']
 CSRF_TRUSTED_ORIGINS = TRUSTED_ORIGINS
 
 # CRITICAL: These settings allow the cross-port session handshake
@@ -220,7 +244,7 @@ SESSION_COOKIE_SAMESITE = 'None'
 CSRF_COOKIE_SAMESITE = 'None'
 SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SECURE = True
-FERNET = Fernet(FERNET_KEY.encode() if isinstance(FERNET_KEY, str) else FERNET_KEY)
+FERNET = MultiFernet([Fernet(key) for key in [FERNET_KEY, *FERNET_OLD_KEYS]])
 
 
 # KEEP THIS BLOCK
@@ -1,6 +1,6 @@
 // src/DashboardPage.jsx - MODIFIED VERSION
 
-import React, { useState, useEffect, useMemo } from 'react';
+import React, { useState, useEffect, useMemo, useRef } from 'react';
 import { Link } from 'react-router-dom';
 import DeviceTable from './DeviceTable.jsx';
 import { deviceService } from './api/deviceService.js'; 
@@ -22,6 +22,9 @@ function DashboardPage() {
   const [isLoading, setIsLoading] = useState(true); 
   const [error, setError] = useState(null);
 
+  // Change-feed cursor of the last full or incremental fetch
+  const cursorRef = useRef(null);
+
   // --- STATE FOR "SHOW HIDDEN" (REMOVED) ---
   // const [showHidden, setShowHidden] = useState(false);
 
@@ -51,6 +54,7 @@ function DashboardPage() {
       
       const devicesArray = Array.isArray(data.devices) ? data.devices : [];
       setFetchedDevices(devicesArray);
+      cursorRef.current = data.cursor;
       
     } catch (e) {
       setError(e.message);
@@ -61,20 +65,76 @@ function DashboardPage() {
     }
   };
 
-  // 2. Modify your useEffect to use an interval
+  // 2. Fetch once, then apply live changes pushed by the server (SSE)
   useEffect(() => {
+    if (!userId) return;
+
     // Fetch data immediately when the page loads
     fetchDevices(); 
 
-    // Then, set up an interval to re-fetch 1 minute
-    const pollInterval = setInterval(() => {
-      fetchDevices();
+    // Merge a single changed device into the list (or add it if new)
+    const applyDeviceUpdate = (device) => {
+      setFetchedDevices(prevDevices => {
+        const exists = prevDevices.some(d => d.id === device.id);
+        return exists
+          ? prevDevices.map(d => (d.id === device.id ? { ...d, ...device } : d))
+          : [...prevDevices, device];
+      });
+    };
+
+    const stream = deviceService.openDeviceStream();
+    let isStreamOpen = false;
+
+    stream.onopen = () => { isStreamOpen = true; };
+    stream.onerror = () => { isStreamOpen = false; }; // EventSource reconnects by itself
+    stream.addEventListener('device', (e) => applyDeviceUpdate(JSON.parse(e.data)));
+    stream.addEventListener('deleted', (e) => {
+      const { id } = JSON.parse(e.data);
+      setFetchedDevices(prevDevices => prevDevices.filter(d => d.id !== id));
+    });
+    // The server dropped events for us (we were too slow): refetch everything once
+    stream.addEventListener('resync', () => fetchDevices());
+    // 'hello' starts every connection; after a reconnect the changes made during the gap
+    // (including deletions) were never pushed, so refetch the same way as on 'resync'
+    let hasConnected = false;
+    stream.addEventListener('hello', () => {
+      if (hasConnected) {
+        fetchDevices();
+      }
+      hasConnected = true;
+    });
+
+    // Fallback: only poll while the stream is down, and only for what changed
+    const fetchChanges = async () => {
+      if (cursorRef.current === null) {
+        return fetchDevices();
+      }
+      try {
+        const changes = await deviceService.getDeviceChanges(cursorRef.current);
+        if (changes === null) {
+          return fetchDevices(); // Cursor expired
+        }
+        changes.devices.forEach(applyDeviceUpdate);
+        if (changes.deleted.length > 0) {
+          setFetchedDevices(prevDevices => prevDevices.filter(d => !changes.deleted.includes(d.id)));
+        }
+        cursorRef.current = changes.cursor;
+      } catch (e) {
+        setError(e.message);
+      }
+    };
+
+    const fallbackInterval = setInterval(() => {
+      if (!isStreamOpen) {
+        fetchChanges();
+      }
     }, 100000);
 
     // This is CRITICAL: a "cleanup function"
-    // It runs when you leave the page to stop the interval
+    // It runs when you leave the page to close the stream and stop the interval
     return () => {
-      clearInterval(pollInterval);
+      stream.close();
+      clearInterval(fallbackInterval);
     };
 
   }, [userId]); // <-- This effect still only *runs* when userId changes
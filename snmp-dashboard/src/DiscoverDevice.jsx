@@ -34,6 +34,8 @@ const DiscoverDevice = () => {
   });
   const [deviceDetails, setDeviceDetails] = useState(null);
   const [confirmationMessage, setConfirmationMessage] = useState('');
+  // Hosts found by a subnet sweep (IP Address entered as a CIDR, e.g. 10.11.1.0/24)
+  const [sweepHosts, setSweepHosts] = useState([]);
 
   // Brand, Type, Model selection states
   const [brands, setBrands] = useState([]);
@@ -102,6 +104,7 @@ const DiscoverDevice = () => {
   const handleSubmit = async (e) => {
     e.preventDefault();
     setDeviceDetails(null);
+    setSweepHosts([]);
     setSelectedBrandId('');
     setSelectedTypeId('');
     setSelectedModelId('');
@@ -135,21 +138,57 @@ const DiscoverDevice = () => {
         body: JSON.stringify(formData), 
         credentials: 'include',
       });
-    const result = await response.json();
+    const queued = await response.json();
     console.log("Response received");
-    if (!response.ok || result.status === 'error') {
-      // Failure path
-      setConfirmationMessage(`❗ Discovery Failed: ${result.message || "Unknown error."}`);
+    if (!response.ok || queued.status === 'error') {
+      // Failure path (validation error or job queue full)
+      setConfirmationMessage(`❗ Discovery Failed: ${queued.message || "Unknown error."}`);
       setDeviceDetails(null); // Clear previous results on failure
+      return;
+    }
+
+    // Discovery runs as a background job: poll it until it finishes
+    const result = await waitForDiscoveryJob(queued.poll_url, ipAddress);
+    if (!result || result.status === 'failed') {
+      setConfirmationMessage(`❗ Discovery Failed: ${(result && result.error) || "Unknown error."}`);
+      setDeviceDetails(null);
+    } else if (result.kind === 'sweep') {
+      // Sweep path: list the answering hosts; picking one fills in the IP for a full discovery
+      const { hosts, skipped } = result.result.data;
+      setSweepHosts(hosts);
+      setConfirmationMessage(`✅ Sweep of ${ipAddress} finished: ${hosts.length} host(s) reachable, ${skipped.length} already registered.`);
     } else {
       // Success path
       setConfirmationMessage(`✅ Discovery Successful for IP: ${ipAddress}.`);
-      setDeviceDetails(result.data); // Assuming the device details are in result.data
+      setDeviceDetails(result.result.data); // Device details are in the job result
+    }
+  };
+
+  // Polls a discovery job once per second, showing its latest progress message
+  const waitForDiscoveryJob = async (pollUrl, ipAddress) => {
+    const jobUrl = `${DJANGO_API_BASE_URL}${pollUrl.replace(/^\/api/, '')}`;
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, 1000));
+      const response = await fetch(jobUrl, { credentials: 'include' });
+      if (!response.ok) {
+        return null;
+      }
+      const job = await response.json();
+      if (job.status === 'done' || job.status === 'failed') {
+        return job;
+      }
+      if (job.kind === 'sweep') {
+        // Show hosts as soon as they answer
+        setSweepHosts(job.progress.filter(event => event.step === 'host').map(event => event.host));
+      }
+      const latest = job.progress[job.progress.length - 1];
+      setConfirmationMessage(`🔍 ${ipAddress}: ${latest ? latest.message : 'Waiting for a free discovery worker...'}`);
     }
   };
 
   const resetDeviceDetails = () => {
     setDeviceDetails(null);
+    setSweepHosts([]);
     setConfirmationMessage('');
     setSelectedBrandId('');
     setSelectedTypeId('');
@@ -219,7 +258,7 @@ const DiscoverDevice = () => {
 
   // Form input fields configuration
   const inputFields = [
-    { id: 'ipAddress', name: 'ipAddress', label: 'IP Address', type: 'text', placeholder: 'e.g., 192.168.32.2' },
+    { id: 'ipAddress', name: 'ipAddress', label: 'IP Address', type: 'text', placeholder: 'e.g., 192.168.32.2 or 192.168.32.0/24' },
     { id: 'username', name: 'username', label: 'User Name', type: 'text', placeholder: 'e.g., switchB' },
     { id: 'authPassword', name: 'authPassword', label: 'Auth Password', type: 'password', placeholder: 'SHA/MD5 Password' },
     { id: 'privPassword', name: 'privPassword', label: 'Priv Password', type: 'password', placeholder: 'AES/DES Password' },
@@ -322,6 +361,29 @@ const DiscoverDevice = () => {
             Search device
           </button>
         </form>
+
+        {/* Subnet sweep results */}
+        {sweepHosts.length > 0 && (
+          <div className="sweep-results">
+            <h2 className="sweep-results-title">Reachable Hosts ({sweepHosts.length})</h2>
+            <ul className="sweep-host-list">
+              {sweepHosts.map(host => (
+                <li key={host.ip_address}>
+                  <button
+                    type="button"
+                    className="sweep-host-button"
+                    onClick={() => setFormData(prevData => ({ ...prevData, ipAddress: host.ip_address }))}
+                  >
+                    <span>{host.ip_address}</span>
+                    <span className={host.snmp ? '' : 'value-na-note'}>
+                      {host.snmp ? `${host.hostname || 'SNMP'} (${host.model_id_raw})` : 'ICMP only'}
+                    </span>
+                  </button>
+                </li>
+              ))}
+            </ul>
+          </div>
+        )}
       </div>
     );
   }
@@ -78,7 +78,24 @@ export const deviceService = {
     });
     
     const data = await handleResponse(response);
-    return { devices: data }; 
+    // Change-feed cursor to pass to getDeviceChanges() next time
+    const cursor = response.headers.get('X-Change-Cursor');
+    return { devices: data, cursor: cursor !== null ? Number(cursor) : null }; 
+  },
+
+  /**
+   * Fetches only the devices that changed after `cursor`.
+   * Returns { cursor, devices, deleted }, or null if the cursor expired
+   * (the caller should then refetch the full list).
+   */
+  getDeviceChanges: async (cursor) => {
+    const url = new URL(`${API_BASE_URL}/devices/`);
+    url.searchParams.append('since', cursor);
+    const response = await fetch(url.toString(), { credentials: 'include' });
+    if (response.status === 410) {
+      return null;
+    }
+    return await handleResponse(response);
   },
   
   // ... getDeviceById and getDeviceModels omitted for brevity ...
@@ -142,6 +159,31 @@ export const deviceService = {
     return await handleResponse(response);
   },
 
+  /**
+   * Opens the live device change stream (Server-Sent Events).
+   * Events: 'hello', 'device', 'deleted', 'resync'.
+   */
+  openDeviceStream: () => {
+    return new EventSource(`${API_BASE_URL}/stream/`, { withCredentials: true });
+  },
+
+  /**
+   * Fetches an aggregated time series for one metric of a device.
+   * options: { interfaceId, from, to, step, agg } (all optional)
+   */
+  getDeviceMetrics: async (deviceId, metric, options = {}) => {
+    const url = new URL(`${API_BASE_URL}/devices/${deviceId}/metrics/`);
+    url.searchParams.append('metric', metric);
+    if (options.interfaceId) url.searchParams.append('interface', options.interfaceId);
+    if (options.from) url.searchParams.append('from', options.from);
+    if (options.to) url.searchParams.append('to', options.to);
+    if (options.step) url.searchParams.append('step', options.step);
+    if (options.agg) url.searchParams.append('agg', options.agg);
+
+    const response = await fetch(url.toString(), { credentials: 'include' });
+    return await handleResponse(response);
+  },
+
   /**
    * Deletes a device from the REAL backend.
    */